@@ -0,0 +1,93 @@
+"""A small LRU cache, used to share destination lookups across migrators."""
+
+
+from collections import OrderedDict
+from threading import Lock
+
+from . import logger
+
+
+class LRUCache(object):
+    """
+    A thread safe, bounded cache with least-recently-used eviction.
+
+    Misses are not cached, so a resource that doesn't exist yet will be looked
+    up again next time (it may have been created in the meantime).
+    """
+    def __init__(self, size=1000):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        """
+        Retrieve a cached value, marking it as recently used.
+
+        :param object key: The cache key.
+        :rtype: object (or None)
+        :returns: The cached value, or None.
+        """
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            value = self.items.pop(key)
+            self.items[key] = value
+
+            return value
+
+    def set(self, key, value):
+        """
+        Cache a value, evicting the least recently used one if necessary.
+
+        :param object key: The cache key.
+        :param object value: The value to cache.
+        """
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def fetch(self, key, load):
+        """
+        Retrieve a cached value, loading (and caching) it on a miss.
+
+        :param object key: The cache key.
+        :param func load: A function that returns the value to cache.
+        :rtype: object (or None)
+        :returns: The value, or None.
+        """
+        value = self.get(key)
+
+        if value is None:
+            value = load()
+
+            if value is not None:
+                self.set(key, value)
+
+        return value
+
+    @property
+    def hit_rate(self):
+        """
+        The percentage of lookups that were cache hits.
+        """
+        lookups = self.hits + self.misses
+        return 100.0 * self.hits / lookups if lookups else 0.0
+
+    def summarize(self, name):
+        """
+        Log cache statistics.
+
+        :param str name: A human readable name for this cache.
+        """
+        logger.info('{} cache: {} hits, {} misses ({:.1f}% hit rate).'.format(name, self.hits, self.misses, self.hit_rate))
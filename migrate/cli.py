@@ -2,7 +2,9 @@
 stormpath-migrate
 
 Usage:
-  stormpath-migrate <src> <dst> <passwords> [(-f <date> | --from <date>)] [(-v | --verbose)] [(-s <src-url> | --src-url <src-url>)] [(-d <dst-url> | --dst-url <dst-url>)]
+  stormpath-migrate import <snapshot> <dst> <passwords> [(-f <date> | --from <date>)] [(-v | --verbose)] [(-d <dst-url> | --dst-url <dst-url>)] [--disk-index] [--workers <n>] [--account-workers <n>] [--resume <journal>] [--max-attempts <n>] [--write-rate <rps>] [--max-connections <n>] [--timeout <seconds>] [--no-keep-alive] [--no-compression] [--sort-mappings] [--dry-run]
+  stormpath-migrate export <src> <snapshot> [(-v | --verbose)] [(-s <src-url> | --src-url <src-url>)] [--page-size <n>] [--max-attempts <n>] [--read-rate <rps>] [--max-connections <n>] [--timeout <seconds>] [--no-keep-alive] [--no-compression] [--chunk-size <n>]
+  stormpath-migrate <src> <dst> <passwords> [(-f <date> | --from <date>)] [(-v | --verbose)] [(-s <src-url> | --src-url <src-url>)] [(-d <dst-url> | --dst-url <dst-url>)] [--disk-index] [--workers <n>] [--account-workers <n>] [--resume <journal>] [--page-size <n>] [--max-attempts <n>] [--read-rate <rps>] [--write-rate <rps>] [--max-connections <n>] [--timeout <seconds>] [--no-keep-alive] [--no-compression] [--sort-mappings] [--dry-run]
   stormpath-migrate -h | --help
   stormpath-migrate --version
 
@@ -11,12 +13,34 @@ Options:
   -v --verbose                      Show verbose output.
   --version                         Show version.
   -f <date> | --from <date>         Only migrate resources created >= this date.  [ex: 2010-01-03]
+  --disk-index                      Index password hashes and resource mappings on disk instead of in memory (for very large tenants).
+  --workers <n>                     Number of Directories to migrate concurrently.  [default: 1]
+  --account-workers <n>             Number of Accounts to migrate concurrently in each Directory.  [default: 1]
+  --resume <journal>                Record progress in this journal file, skipping any work it lists as finished.
+  --page-size <n>                   Number of resources to fetch per page when walking the source Tenant (max: 100).
+  --max-attempts <n>                Number of times to try a failing API call before giving up on it.  [default: 10]
+  --read-rate <rps>                 Maximum number of requests per second to make to the SOURCE tenant.
+  --write-rate <rps>                Maximum number of requests per second to make to the DESTINATION tenant.
+  --max-connections <n>             Maximum number of HTTP connections to open per tenant (workers wait for a free one).  [default: 10]
+  --timeout <seconds>               HTTP request timeout.
+  --no-keep-alive                   Close HTTP connections after every request (they're kept alive by default).
+  --no-compression                  Don't ask for compressed HTTP responses (they're asked for by default).
+  --sort-mappings                   Sort (and deduplicate) stormpath-mappings.csv by original href when finished.
+  --chunk-size <n>                  Number of resources to store per snapshot file.  [default: 10000]
+  --dry-run                         Don't migrate anything: just report what would be created, updated and skipped, and estimate how long it would take.
 
 Example:
   stormpath-migrate <id:secret> <id:secret>     # Migrate from src tenant to dst tenant.
   stormpath-migrate <id:secret> <id:secret> --from 2010-01-01
                                                 # Migrate only resources from src tenant to dst tenant
                                                 # created on or after 2010-01-01.
+  stormpath-migrate export <id:secret> snapshot/
+                                                # Export the src tenant into a local snapshot.
+  stormpath-migrate import snapshot/ <id:secret> passwords.txt
+                                                # Migrate from a local snapshot to dst tenant.
+  stormpath-migrate <id:secret> <id:secret> passwords.txt --dry-run --write-rate 50
+                                                # Report what a migration would do, and estimate
+                                                # how long it would take at 50 writes per second.
 
 Help:
   For help using this tool, please contact Stormpath support:
@@ -29,20 +53,23 @@ from docopt import docopt
 from stormpath.client import Client
 
 from . import __version__ as VERSION
+from .exporter import TenantExporter
 from .migrators import TenantMigrator
+from .retry import policy
+from .transport import ConnectionPool, TokenBucket, throttle, track_retry_after
 
 
-def validate_credentials(src, dst):
+def validate_credentials(*credentials):
     """
     Validate all user-specified credentials.
 
     Raises an error and stops processing if the credentials are not valid.
 
-    :param str src: The user supplied Stormpath source credentials.
-    :param str dst: The user supplied Stormpath destination credentials.
+    :param str credentials: The user supplied Stormpath source (and
+        destination) credentials.
     :raises: ValueError on invalid credentials.
     """
-    for val in [src, dst]:
+    for val in credentials:
         if len(val.split(':')) != 2:
             raise ValueError('Invalid credentials specified. Use <id:secret> format.')
 
@@ -51,42 +78,153 @@ def validate_credentials(src, dst):
             raise ValueError('Invalid credentials specified. Use <id:secret> format.')
 
 
-def create_clients(src, dst, src_url, dst_url):
+def validate_number(value, name, type=int):
+    """
+    Validate a user-specified number (eg: a page size or a rate), which must
+    be greater than 0.
+
+    :param str value: The user supplied value, or None.
+    :param str name: What the number is, for the error message (eg: 'page
+        size').
+    :param type type: The type of number: int or float.
+    :rtype: int or float (or None)
+    :returns: The number, or None.
+    :raises: ValueError on an invalid number.
+    """
+    if value is None:
+        return None
+
+    try:
+        number = type(value)
+    except ValueError:
+        number = None
+
+    # NOTE: `not number > 0` also catches float('nan').
+    if number is None or not number > 0:
+        raise ValueError('Invalid {} specified. Use a number greater than 0.'.format(name))
+
+    return number
+
+
+def create_client(credentials, url, bucket=None, pool=None):
+    """
+    Create a local Stormpath Client object.
+
+    :param str credentials: The user supplied Stormpath credentials.
+    :param str url: The Stormpath Base URL.
+    :param object bucket: The TokenBucket to rate limit requests with, or None.
+    :param object pool: The shared ConnectionPool, or None.
+    :rtype: object
+    :returns: An initialized Client object.
+    """
+    id, secret = credentials.split(':')
+    client = Client(id=id, secret=secret, base_url=url)
+    track_retry_after(client)
+
+    if pool:
+        pool.mount(client)
+
+    if bucket:
+        throttle(client, bucket)
+
+    return client
+
+
+def create_clients(src, dst, src_url, dst_url, read_bucket=None, write_bucket=None, pool=None):
     """
     Create our local Stormpath Client objects used for the migration.
 
+    Reads (from the source) and writes (to the destination) are budgeted
+    independently: if a TokenBucket is given for either side, every request
+    that Client makes is rate limited through it.  Since all workers share the
+    same Clients, they share the same budgets.
+
+    If a ConnectionPool is given, both Clients send their requests through it.
+
     :param str src: The user supplied Stormpath source credentials.
     :param str dst: The user supplied Stormpath destination credentials.
     :param str src_url: The Stormpath Base URL.
     :param str dst: The Stormpath Base URL.
+    :param object read_bucket: The source TokenBucket, or None.
+    :param object write_bucket: The destination TokenBucket, or None.
+    :param object pool: The shared ConnectionPool, or None.
     :rtype: tuple
     :returns: A tuple consisting of an initialized source Client object, as well
         as an initialized destination Client object.
     """
-    src_id, src_secret = src.split(':')
-    dst_id, dst_secret = dst.split(':')
+    src_client = create_client(src, src_url, bucket=read_bucket, pool=pool)
+    dst_client = create_client(dst, dst_url, bucket=write_bucket, pool=pool)
 
-    return (
-        Client(id=src_id, secret=src_secret, base_url=src_url),
-        Client(id=dst_id, secret=dst_secret, base_url=dst_url),
-    )
+    return (src_client, dst_client)
 
 
 def main():
     """Main CLI entrypoint."""
     args = docopt(__doc__, version=VERSION)
 
+    page_size = validate_number(args['--page-size'], 'page size')
+    max_attempts = validate_number(args['--max-attempts'], 'max attempts')
+    read_rate = validate_number(args['--read-rate'], 'read rate', type=float)
+    write_rate = validate_number(args['--write-rate'], 'write rate', type=float)
     src_url = args['<src-url>'] or 'https://api.stormpath.com/v1'
     dst_url = args['<dst-url>'] or 'https://api.stormpath.com/v1'
 
-    validate_credentials(args['<src>'], args['<dst>'])
-    clients = create_clients(args['<src>'], args['<dst>'], src_url=src_url, dst_url=dst_url)
+    read_bucket = TokenBucket(read_rate) if read_rate else None
+    write_bucket = TokenBucket(write_rate) if write_rate else None
 
-    migrator = TenantMigrator(
-        src = clients[0],
-        dst = clients[1],
-        passwords = args['<passwords>'],
-        from_date = args['--from'],
-        verbose = args['--verbose'],
+    pool = ConnectionPool(
+        max_connections = validate_number(args['--max-connections'], 'max connections'),
+        keep_alive = not args['--no-keep-alive'],
+        timeout = validate_number(args['--timeout'], 'timeout', type=float),
+        compression = not args['--no-compression'],
     )
-    migrator.migrate()
+
+    if args['export']:
+        validate_credentials(args['<src>'])
+
+        policy.max_attempts = max_attempts
+
+        exporter = TenantExporter(
+            src = create_client(args['<src>'], src_url, bucket=read_bucket, pool=pool),
+            path = args['<snapshot>'],
+            page_size = page_size,
+            chunk_size = validate_number(args['--chunk-size'], 'chunk size'),
+        )
+        exporter.export()
+    else:
+        if args['import']:
+            validate_credentials(args['<dst>'])
+            src = None
+            dst = create_client(args['<dst>'], dst_url, bucket=write_bucket, pool=pool)
+        else:
+            validate_credentials(args['<src>'], args['<dst>'])
+            src, dst = create_clients(args['<src>'], args['<dst>'], src_url=src_url, dst_url=dst_url, read_bucket=read_bucket, write_bucket=write_bucket, pool=pool)
+
+        migrator = TenantMigrator(
+            src = src,
+            dst = dst,
+            passwords = args['<passwords>'],
+            from_date = args['--from'],
+            verbose = args['--verbose'],
+            disk_index = args['--disk-index'],
+            workers = validate_number(args['--workers'], 'number of workers'),
+            account_workers = validate_number(args['--account-workers'], 'number of account workers'),
+            journal = args['--resume'],
+            page_size = page_size,
+            max_attempts = max_attempts,
+            sort_mappings = args['--sort-mappings'],
+            snapshot = args['<snapshot>'] if args['import'] else None,
+        )
+
+        if args['--dry-run']:
+            migrator.plan().summarize(read_rate=read_bucket and read_bucket.rate, write_rate=write_bucket and write_bucket.rate)
+        else:
+            migrator.migrate()
+
+    if read_bucket:
+        read_bucket.summarize('Read')
+
+    if write_bucket:
+        write_bucket.summarize('Write')
+
+    pool.summarize()
@@ -12,3 +12,6 @@ STORMPATH_PROVIDER_ID = 'stormpath'
 
 # SAML ID.
 SAML_PROVIDER_ID = 'saml'
+
+# The CSV file migrated resource mappings are written to.
+MAPPINGS_FILE = 'stormpath-mappings.csv'
@@ -0,0 +1,297 @@
+"""Our Tenant exporter."""
+
+
+from . import logger
+from .constants import MIRROR_PROVIDER_IDS, SAML_PROVIDER_ID
+from .mappings import get_base_url
+from .readers import SourceReader
+from .retry import RetryError, policy
+from .snapshot import SnapshotWriter
+from .utils import sanitize
+
+
+# The email templates copied along with each Directory Workflow policy.
+ACCOUNT_CREATION_TEMPLATES = ['verification_email_templates', 'verification_success_email_templates', 'welcome_email_templates']
+PASSWORD_TEMPLATES = ['reset_email_templates', 'reset_success_email_templates']
+
+
+def get_created_at(resource):
+    """
+    Retrieve a resource's creation timestamp, as a string.
+
+    :param object resource: The Stormpath resource.
+    :rtype: str (or None)
+    :returns: The ISO 8601 creation timestamp, or None.
+    """
+    created_at = getattr(resource, 'created_at', None)
+    return created_at.isoformat() if hasattr(created_at, 'isoformat') else created_at
+
+
+def export_policy(resource, templates=()):
+    """
+    Export a Workflow policy (or email template): its writable attributes,
+    along with the first of each of the given email template collections.
+
+    :param object resource: The policy.
+    :param list templates: The names of its template collections.
+    :rtype: dict
+    :returns: The JSON record.
+    """
+    record = dict((attr, getattr(resource, attr)) for attr in resource.writable_attrs)
+    record['writable_attrs'] = list(resource.writable_attrs)
+
+    for name in templates:
+        record[name] = [export_policy(getattr(resource, name)[0])]
+
+    return record
+
+
+def export_account_store_mapping(mapping):
+    """
+    Export an AccountStoreMapping.
+
+    :param object mapping: The AccountStoreMapping, with its AccountStore
+        expanded.
+    :rtype: dict
+    :returns: The JSON record.
+    """
+    account_store = mapping.account_store
+
+    return {
+        'href': mapping.href,
+        'account_store': {
+            'href': account_store.href,
+            'type': account_store.__class__.__name__,
+            'name': account_store.name,
+        },
+        'list_index': mapping.list_index,
+        'is_default_account_store': mapping.is_default_account_store,
+        'is_default_group_store': mapping.is_default_group_store,
+    }
+
+
+class TenantExporter(object):
+    """
+    This class exports a source Tenant into a local snapshot, so that it can
+    be migrated (as many times as necessary) without reading the Tenant again.
+
+    Everything the migrators read is exported: Directories (along with their
+    providers and Workflow policies), Groups, Accounts (along with their
+    GroupMemberships), Organizations and Applications (along with their
+    AccountStoreMappings), and all of their CustomData.  Groups and Accounts
+    that are only mirrored from another system are never migrated, so only
+    what's needed to map them is exported.
+    """
+    def __init__(self, src, path, page_size=None, chunk_size=10000):
+        self.src = src
+        self.path = path
+        self.chunk_size = chunk_size
+        self.reader = SourceReader(src, page_size=page_size)
+
+    def export_directory(self, directory):
+        """
+        Export a Directory.
+
+        :param object directory: The source Directory.
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        provider = sanitize(directory.provider)
+        provider_id = provider.get('provider_id')
+
+        if provider_id in MIRROR_PROVIDER_IDS:
+            provider['agent'] = sanitize(directory.provider.agent)
+            provider['agent']['config'] = sanitize(directory.provider.agent.config)
+            provider['agent']['config']['account_config'] = sanitize(directory.provider.agent.config.account_config)
+            provider['agent']['config']['group_config'] = sanitize(directory.provider.agent.config.group_config)
+        elif provider_id == SAML_PROVIDER_ID:
+            provider['service_provider_metadata'] = sanitize(directory.provider.service_provider_metadata)
+
+        record = {
+            'href': directory.href,
+            'created_at': get_created_at(directory),
+            'name': directory.name,
+            'description': directory.description,
+            'status': directory.status,
+            'custom_data': sanitize(directory.custom_data),
+            'provider': provider,
+        }
+
+        # Mirror Directories don't support Workflows.
+        if provider_id not in MIRROR_PROVIDER_IDS:
+            password_policy = directory.password_policy
+
+            record['account_creation_policy'] = export_policy(directory.account_creation_policy, ACCOUNT_CREATION_TEMPLATES)
+            record['password_policy'] = export_policy(password_policy, PASSWORD_TEMPLATES)
+            record['password_policy']['strength'] = export_policy(password_policy.strength)
+
+        return record
+
+    def export_group(self, group, directory):
+        """
+        Export a Group.
+
+        :param object group: The source Group.
+        :param object directory: The source Directory.
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        return {
+            'href': group.href,
+            'created_at': get_created_at(group),
+            'directory': directory.href,
+            'name': group.name,
+            'description': group.description,
+            'status': group.status,
+            'custom_data': sanitize(group.custom_data),
+        }
+
+    def export_account(self, account, directory):
+        """
+        Export an Account, along with its GroupMemberships.
+
+        :param object account: The source Account.
+        :param object directory: The source Directory.
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        return {
+            'href': account.href,
+            'created_at': get_created_at(account),
+            'directory': directory.href,
+            'username': account.username,
+            'email': account.email,
+            'given_name': account.given_name,
+            'middle_name': account.middle_name,
+            'surname': account.surname,
+            'status': account.status,
+            'custom_data': sanitize(account.custom_data),
+            'provider_data': sanitize(account.provider_data),
+            'group_memberships': [
+                {'href': membership.href, 'group': membership.group.href}
+                for membership in self.reader.group_memberships(account)
+            ],
+        }
+
+    def export_mirrored(self, resource, directory, fields):
+        """
+        Export a Group or Account that's only mirrored from another system
+        (without its CustomData or GroupMemberships), so that it can still be
+        mapped.
+
+        :param object resource: The source Group or Account.
+        :param object directory: The source Directory.
+        :param list fields: The fields it's matched on (eg: ['name']).
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        record = {
+            'href': resource.href,
+            'created_at': get_created_at(resource),
+            'directory': directory.href,
+        }
+
+        for field in fields:
+            record[field] = getattr(resource, field)
+
+        return record
+
+    def export_organization(self, organization):
+        """
+        Export an Organization, along with its AccountStoreMappings.
+
+        :param object organization: The source Organization.
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        return {
+            'href': organization.href,
+            'created_at': get_created_at(organization),
+            'name': organization.name,
+            'name_key': organization.name_key,
+            'description': organization.description,
+            'status': organization.status,
+            'custom_data': sanitize(organization.custom_data),
+            'account_store_mappings': [export_account_store_mapping(mapping) for mapping in self.reader.account_store_mappings(organization)],
+        }
+
+    def export_application(self, application):
+        """
+        Export an Application, along with its OAuthPolicy and
+        AccountStoreMappings.
+
+        :param object application: The source Application.
+        :rtype: dict
+        :returns: The JSON record.
+        """
+        oauth_policy = application.oauth_policy
+
+        return {
+            'href': application.href,
+            'created_at': get_created_at(application),
+            'name': application.name,
+            'description': application.description,
+            'status': application.status,
+            'custom_data': sanitize(application.custom_data),
+            'oauth_policy': {
+                'access_token_ttl': oauth_policy.access_token_ttl,
+                'refresh_token_ttl': oauth_policy.refresh_token_ttl,
+            },
+            'account_store_mappings': [export_account_store_mapping(mapping) for mapping in self.reader.account_store_mappings(application)],
+        }
+
+    def write(self, snapshot, collection, export, message, parent=None):
+        """
+        Export one resource (retrying as necessary) and write it to the
+        snapshot.  Resources that can't be exported are logged, dead lettered,
+        and left out.
+
+        :param object snapshot: The SnapshotWriter.
+        :param str collection: The collection name (eg: 'accounts').
+        :param func export: A function returning the JSON record.
+        :param str message: A description of the failure.
+        :param str parent: The href of the resource's parent, or None.
+        """
+        try:
+            snapshot.write(collection, policy.call(export, message), parent)
+        except RetryError:
+            pass
+
+    def export(self):
+        """
+        Export the whole source Tenant.
+
+        NOTE: This may take a longggg time to run.
+        """
+        snapshot = SnapshotWriter(self.path, base_url=get_base_url(self.src.tenant.href), chunk_size=self.chunk_size)
+
+        logger.info('Starting to export source Tenant into snapshot: {}'.format(self.path))
+
+        for directory in self.reader.directories():
+            name = directory.name.encode('utf-8')
+            self.write(snapshot, 'directories', lambda: self.export_directory(directory), 'Failed to export Directory: {}'.format(name))
+
+            provider_id = dict(directory.provider).get('provider_id')
+            mirrored_groups = provider_id in MIRROR_PROVIDER_IDS
+            mirrored_accounts = provider_id in MIRROR_PROVIDER_IDS or provider_id == SAML_PROVIDER_ID
+
+            for group in self.reader.groups(directory):
+                export = (lambda: self.export_mirrored(group, directory, ['name'])) if mirrored_groups else (lambda: self.export_group(group, directory))
+                self.write(snapshot, 'groups', export, 'Failed to export Group: {} in Directory: {}'.format(group.name.encode('utf-8'), name), directory.href)
+
+            for account in self.reader.accounts(directory):
+                export = (lambda: self.export_mirrored(account, directory, ['username', 'email'])) if mirrored_accounts else (lambda: self.export_account(account, directory))
+                self.write(snapshot, 'accounts', export, 'Failed to export Account: {} in Directory: {}'.format(account.username.encode('utf-8'), name), directory.href)
+
+            logger.info('Successfully exported Directory: {}'.format(name))
+
+        for organization in self.reader.organizations():
+            self.write(snapshot, 'organizations', lambda: self.export_organization(organization), 'Failed to export Organization: {}'.format(organization.name.encode('utf-8')))
+
+        for application in self.reader.applications():
+            self.write(snapshot, 'applications', lambda: self.export_application(application), 'Failed to export Application: {}'.format(application.name.encode('utf-8')))
+
+        snapshot.close()
+
+        self.reader.summarize()
+        policy.summarize()
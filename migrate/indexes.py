@@ -0,0 +1,226 @@
+"""Lookup indexes used to avoid rescanning data during a migration."""
+
+
+from json import loads
+from os import close, remove
+from sqlite3 import connect
+from tempfile import mkstemp
+from threading import Lock
+from time import time
+
+from . import logger
+
+
+class PasswordIndex(object):
+    """
+    An index of exported password hashes, keyed by Account href.
+
+    The password export is read exactly once, in a single streaming pass.  By
+    default the index is held in memory, but exports too big to fit in RAM can
+    be indexed into a temporary SQLite database on disk instead.
+    """
+    def __init__(self, passwords, on_disk=False):
+        self.passwords = passwords
+        self.on_disk = on_disk
+        self.hashes = {}
+        self.db = None
+        self.db_path = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.build_time = 0
+        self.lock = Lock()
+
+    def read(self):
+        """
+        Stream (href, password) pairs out of the password export.
+
+        :rtype: generator
+        :returns: A generator of (href, password) tuples.
+        """
+        with open(self.passwords, 'rb') as f:
+            for raw_data in f:
+                if not raw_data.strip():
+                    continue
+
+                data = loads(raw_data)
+                yield data.get('href'), data.get('password')
+
+    def build(self):
+        """
+        Build the index in a single pass over the password export.
+
+        If an href appears more than once, the first hash wins -- this matches
+        the behavior of scanning the file from the top.
+        """
+        start = time()
+
+        if self.on_disk:
+            fd, self.db_path = mkstemp(prefix='stormpath-passwords-', suffix='.sqlite')
+            close(fd)
+
+            self.db = connect(self.db_path, check_same_thread=False)
+            self.db.execute('CREATE TABLE passwords (href TEXT PRIMARY KEY, password TEXT)')
+            self.db.executemany('INSERT OR IGNORE INTO passwords VALUES (?, ?)', self.read())
+            self.db.commit()
+
+            self.size = self.db.execute('SELECT COUNT(*) FROM passwords').fetchone()[0]
+        else:
+            for href, password in self.read():
+                self.hashes.setdefault(href, password)
+
+            self.size = len(self.hashes)
+
+        self.build_time = time() - start
+        logger.info('Indexed {} password hashes in {:.2f} seconds.'.format(self.size, self.build_time))
+
+        return self
+
+    def get(self, href):
+        """
+        Look up the password hash for the given Account href.
+
+        :param str href: The source Account href.
+        :rtype: str (or None)
+        :returns: The password hash, or None.
+        """
+        with self.lock:
+            if self.db:
+                row = self.db.execute('SELECT password FROM passwords WHERE href = ?', (href,)).fetchone()
+                hash = row[0] if row else None
+            else:
+                hash = self.hashes.get(href)
+
+            if hash:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return hash
+
+    def close(self):
+        """
+        Release the index, removing any on-disk database.
+        """
+        self.hashes = {}
+
+        if self.db:
+            self.db.close()
+            self.db = None
+            remove(self.db_path)
+
+    def summarize(self):
+        """
+        Log index statistics.
+        """
+        logger.info('Password hash index: {} hashes indexed in {:.2f} seconds, {} hits, {} misses.'.format(self.size, self.build_time, self.hits, self.misses))
+
+
+class AccountIndex(object):
+    """
+    An index of a destination Directory's Accounts, keyed by username and by
+    email.
+
+    The index is loaded once, using large pages, and is then kept up to date as
+    new Accounts are created -- this replaces the per-Account searches the
+    migrators would otherwise make.  Like Stormpath searches, lookups are case
+    insensitive.
+    """
+    PAGE_SIZE = 100
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.usernames = {}
+        self.emails = {}
+        self.lock = Lock()
+
+    def build(self):
+        """
+        Load every Account in the Directory into the index.
+        """
+        start = time()
+
+        for account in self.directory.accounts.query(limit=self.PAGE_SIZE):
+            self.add(account)
+
+        logger.info('Indexed {} Accounts in destination Directory: {} in {:.2f} seconds.'.format(len(self.usernames), self.directory.name.encode('utf-8'), time() - start))
+
+        return self
+
+    def add(self, account):
+        """
+        Add an Account to the index.
+
+        :param object account: The destination Account.
+        """
+        with self.lock:
+            if account.username:
+                self.usernames[account.username.lower()] = account
+
+            if account.email:
+                self.emails[account.email.lower()] = account
+
+    def get(self, username=None, email=None):
+        """
+        Look up an Account by username, falling back to email.
+
+        :param str username: The Account username.
+        :param str email: The Account email.
+        :rtype: object (or None)
+        :returns: The Account object, or None.
+        """
+        with self.lock:
+            account = self.usernames.get(username.lower()) if username else None
+
+            if not account and email:
+                account = self.emails.get(email.lower())
+
+            return account
+
+
+def index_memberships(account):
+    """
+    Index an Account's existing GroupMemberships by Group href.
+
+    This walks the Account's memberships exactly once, in large pages -- the
+    Group href is part of each membership, so no Groups are fetched.
+
+    :param object account: The Account.
+    :rtype: dict
+    :returns: A dict mapping Group hrefs to GroupMembership objects.
+    """
+    memberships = account.group_memberships.query(limit=100)
+    return dict((membership.group.href, membership) for membership in memberships)
+
+
+def index_account_store_mappings(owner):
+    """
+    Index an Application's or Organization's existing AccountStoreMappings by
+    (AccountStore href, owner href).
+
+    The mappings are fetched exactly once, in large pages, with their
+    AccountStores expanded so that nothing is lazily loaded per mapping.
+
+    :param object owner: The Application or Organization.
+    :rtype: dict
+    :returns: A dict mapping (AccountStore href, owner href) tuples to
+        AccountStoreMapping objects.
+    """
+    mappings = owner.account_store_mappings.query(expand='accountStore', limit=100)
+    return dict(((mapping.account_store.href, owner.href), mapping) for mapping in mappings)
+
+
+def index_hrefs(collection, key):
+    """
+    Index a collection's resource hrefs by some natural key (eg: name).
+
+    The collection is walked exactly once, in large pages, so that a whole
+    Tenant can be joined against it locally instead of searching it once per
+    resource.
+
+    :param object collection: The Stormpath collection to index.
+    :param func key: A function returning a resource's key.
+    :rtype: dict
+    :returns: A dict mapping keys to resource hrefs.
+    """
+    return dict((key(resource), resource.href) for resource in collection.query(limit=100))
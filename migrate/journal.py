@@ -0,0 +1,126 @@
+"""A durable progress journal, used to resume interrupted migrations."""
+
+
+from os.path import abspath, exists
+from sqlite3 import OperationalError, connect
+from threading import Lock
+from urllib import pathname2url
+
+from . import logger
+
+
+def connect_read_only(path):
+    """
+    Open an existing SQLite database read only.
+
+    The database is opened with a `mode=ro` URI, so nothing (not even a new,
+    empty database) can be written.  Unless a crashed writer left a WAL file
+    behind (which has to be read), it's also opened as immutable: otherwise
+    SQLite would create WAL and shared memory files that a read only
+    connection can't clean up.  SQLite builds that don't understand URI
+    filenames fail to open it, and fall back to a plain connection that
+    refuses writes.
+
+    :param str path: The path of the database.
+    :rtype: object
+    :returns: The sqlite3 Connection.
+    """
+    params = 'mode=ro' if exists(path + '-wal') else 'mode=ro&immutable=1'
+
+    try:
+        db = connect('file:{}?{}'.format(pathname2url(abspath(path)), params), check_same_thread=False)
+    except OperationalError:
+        if not exists(path):
+            raise
+
+        db = connect(path, check_same_thread=False)
+
+    db.execute('PRAGMA query_only = ON')
+    return db
+
+
+class Journal(object):
+    """
+    A record of completed migration work, stored in a local SQLite file.
+
+    Each entry maps a source resource href to its destination href for a given
+    migration phase (eg: 'account').  Entries are committed as soon as they're
+    recorded, so a crashed migration can pick up where it left off.
+
+    If `read_only` is set, an existing journal is opened without ever being
+    written to (eg: for a dry run).
+    """
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.recorded = 0
+        self.skipped = 0
+        self.lock = Lock()
+
+        if read_only:
+            self.db = connect_read_only(path)
+        else:
+            self.db = connect(path, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS resources (phase TEXT NOT NULL, src_href TEXT NOT NULL, dst_href TEXT, PRIMARY KEY (phase, src_href))')
+            self.db.commit()
+
+        count = self.db.execute('SELECT COUNT(*) FROM resources').fetchone()[0]
+        logger.info('Opened migration journal: {} ({} completed resources).'.format(path, count))
+
+    def get(self, phase, src_href):
+        """
+        Look up finished work.  Counts a hit as a skipped resource.
+
+        :param str phase: The migration phase.
+        :param str src_href: The source resource href.
+        :rtype: str (or None)
+        :returns: The destination href if this work is already finished, or
+            None.
+        """
+        with self.lock:
+            row = self.db.execute('SELECT dst_href FROM resources WHERE phase = ? AND src_href = ?', (phase, src_href)).fetchone()
+
+            if row:
+                self.skipped += 1
+                return row[0]
+
+    def record(self, phase, src_href, dst_href):
+        """
+        Record finished work.
+
+        :param str phase: The migration phase.
+        :param str src_href: The source resource href.
+        :param str dst_href: The destination resource href.
+        """
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO resources VALUES (?, ?, ?)', (phase, src_href, dst_href))
+            self.db.commit()
+            self.recorded += 1
+
+    def hrefs(self):
+        """
+        Retrieve every recorded (source href, destination href) pair.
+
+        The pairs are read from the journal as they're iterated over (the
+        journal is locked until then), rather than all loaded at once.
+
+        :rtype: generator
+        :returns: A generator of tuples.
+        """
+        with self.lock:
+            for row in self.db.execute('SELECT src_href, dst_href FROM resources'):
+                yield row
+
+    def close(self):
+        """
+        Close the journal.
+        """
+        with self.lock:
+            self.db.close()
+
+    def summarize(self):
+        """
+        Log journal statistics.
+        """
+        logger.info('Migration journal: {} resources recorded, {} finished resources skipped.'.format(self.recorded, self.skipped))
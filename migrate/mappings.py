@@ -0,0 +1,426 @@
+"""A record of source to destination href mappings, built during migration."""
+
+
+from csv import QUOTE_ALL, reader, writer
+from heapq import merge
+from itertools import groupby, islice
+from json import dumps
+from operator import itemgetter
+from os import close, fdopen, remove, rename
+from re import compile
+from sqlite3 import connect
+from tempfile import mkstemp
+from threading import Lock
+
+from . import logger
+from .utils import sanitize
+
+
+# A marker for hrefs that aren't in an HrefMap at all (as opposed to hrefs
+# that are mapped to None).
+MISSING = object()
+
+# Matches anything that looks like a URL inside a longer string (not
+# including any trailing punctuation).
+URL_PATTERN = compile(r'https?://[^\s"\'<>]*[^\s"\'<>.,;:!?)]')
+
+
+def get_base_url(href):
+    """
+    Retrieve the API base URL of a resource href.
+
+    :param str href: The resource href (eg:
+        https://api.stormpath.com/v1/accounts/xxx).
+    :rtype: str
+    :returns: The base URL (eg: https://api.stormpath.com/v1).
+    """
+    return href.rsplit('/', 2)[0]
+
+
+def contains_hrefs(custom_data, base_url):
+    """
+    Check whether a CustomData document mentions any href under a base URL,
+    anywhere (in keys, values, or nested structures).
+
+    This is a single substring search over the serialized document, so it's
+    cheap enough to run on every resource as it's migrated.
+
+    :param object custom_data: The CustomData.
+    :param str base_url: The API base URL (eg: https://api.stormpath.com/v1).
+    :rtype: bool
+    :returns: True if the document may contain hrefs, False otherwise.
+    """
+    return base_url in dumps(sanitize(custom_data), default=str)
+
+
+def substitute_hrefs(value, hrefs):
+    """
+    Recursively substitute hrefs anywhere inside a JSON value: in dict keys
+    and values, list items, and strings (either whole, or embedded in longer
+    text).
+
+    Unchanged values are returned as is (the same object), so callers can
+    cheaply tell whether anything was substituted.
+
+    :param object value: The JSON value.
+    :param object hrefs: A mapping of source hrefs to destination hrefs (or
+        None, for hrefs that weren't migrated).
+    :rtype: object
+    :returns: The substituted value.
+    """
+    if isinstance(value, dict):
+        changed = False
+        items = {}
+
+        for key, item in value.items():
+            new_key = substitute_hrefs(key, hrefs)
+            new_item = substitute_hrefs(item, hrefs)
+            changed = changed or new_key is not key or new_item is not item
+            items[new_key] = new_item
+
+        return items if changed else value
+
+    if isinstance(value, list):
+        items = [substitute_hrefs(item, hrefs) for item in value]
+        changed = any(new is not old for new, old in zip(items, value))
+
+        return items if changed else value
+
+    if isinstance(value, basestring):
+        href = hrefs.get(value)
+        if href:
+            return href
+
+        if '://' not in value:
+            return value
+
+        substituted = URL_PATTERN.sub(lambda match: hrefs.get(match.group(0)) or match.group(0), value)
+        return value if substituted == value else substituted
+
+    return value
+
+
+def sort_mappings(path, chunk_size=100000):
+    """
+    Sort a mappings CSV file by original href, keeping only the last row
+    written for each href.
+
+    This is an external merge sort: the file is read in chunks of
+    `chunk_size` rows, each chunk is sorted and spilled to a temporary file,
+    and the chunks are then merged -- so memory use stays constant no matter
+    how big the file is.
+
+    :param str path: The CSV file.
+    :param int chunk_size: The number of rows to sort in memory at once.
+    """
+    chunks = []
+
+    try:
+        with open(path, 'rb') as csvfile:
+            rows = reader(csvfile)
+            header = next(rows)
+
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                # Python's sort is stable, so rows for the same href stay in
+                # the order they were written.
+                chunk.sort(key=itemgetter(0))
+
+                fd, chunk_path = mkstemp(suffix='.csv')
+                chunks.append(chunk_path)
+
+                with fdopen(fd, 'wb') as chunk_file:
+                    writer(chunk_file, quoting=QUOTE_ALL).writerows(chunk)
+
+        def read_chunk(index, spilled_path):
+            with open(spilled_path, 'rb') as chunk_file:
+                for position, (old_href, new_href) in enumerate(reader(chunk_file)):
+                    yield old_href, index, position, new_href
+
+        fd, sorted_path = mkstemp(suffix='.csv')
+
+        with fdopen(fd, 'wb') as csvfile:
+            csv_writer = writer(csvfile, quoting=QUOTE_ALL)
+            csv_writer.writerow(header)
+
+            merged = merge(*[read_chunk(index, spilled_path) for index, spilled_path in enumerate(chunks)])
+            for old_href, rows in groupby(merged, key=itemgetter(0)):
+                csv_writer.writerow([old_href, list(rows)[-1][3]])
+
+        rename(sorted_path, path)
+    finally:
+        for chunk_path in chunks:
+            remove(chunk_path)
+
+
+class MappingWriter(object):
+    """
+    An append-only CSV file of (original href, migrated href) rows.
+
+    Rows are written as they're discovered, in batches of `batch_size`, so
+    memory use stays constant, and everything discovered so far survives a
+    crash.  The file is only created once the first row is written.
+
+    If `sort` is set, the file is sorted by original href (and deduplicated)
+    when it's closed.
+    """
+    def __init__(self, path, batch_size=1000, sort=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.sort = sort
+        self.file = None
+        self.rows = []
+        self.written = 0
+        self.lock = Lock()
+
+    def write(self, old_href, new_href):
+        """
+        Write a mapping row.
+
+        :param str old_href: The original (source) href.
+        :param str new_href: The migrated (destination) href, or None.
+        """
+        with self.lock:
+            self.rows.append([old_href, new_href or ''])
+
+            if len(self.rows) >= self.batch_size:
+                self.flush_rows()
+
+    def flush_rows(self):
+        """
+        Write any buffered rows to disk.  The caller must hold the lock.
+        """
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+            writer(self.file, quoting=QUOTE_ALL).writerow(['original_href', 'migrated_href'])
+
+        writer(self.file, quoting=QUOTE_ALL).writerows(self.rows)
+        self.file.flush()
+
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        """
+        Write any buffered rows, close the file, and sort it if asked to.
+        """
+        with self.lock:
+            self.flush_rows()
+            self.file.close()
+
+        if self.sort:
+            logger.info('Sorting CSV file of migrated resource mappings.')
+            sort_mappings(self.path)
+
+
+class HrefMap(object):
+    """
+    A thread safe map of source resource hrefs to destination resource hrefs.
+
+    Migrators record every resource they create or update, so that by the end
+    of a full migration the map already holds every href that needs to be
+    substituted -- no second pass over either Tenant is needed.
+
+    Along the way, each source resource's CustomData (which is already in
+    memory) is checked for source hrefs.  The destination hrefs of the
+    resources whose CustomData does mention any are kept in `flagged`: they're
+    the only ones whose CustomData will need rewriting.
+
+    If a MappingWriter is given, every mapping is also written to it as soon
+    as it's recorded.
+
+    Every href in a Tenant shares the same base URL, so only what follows it
+    is stored: the source key is kept as eg: 'accounts/xxx', and the
+    destination (which is always the same type of resource) as just its ID.
+    By default the map is held in memory, but maps too big to fit in RAM can
+    be kept in a temporary SQLite database on disk instead.
+    """
+    def __init__(self, writer=None, on_disk=False):
+        self.writer = writer
+        self.on_disk = on_disk
+        self.hrefs = {}
+        self.flagged = set()
+        self.src_base = None
+        self.dst_base = None
+        self.db = None
+        self.db_path = None
+        self.lock = Lock()
+
+        if on_disk:
+            fd, self.db_path = mkstemp(prefix='stormpath-hrefs-', suffix='.sqlite')
+            close(fd)
+
+            self.db = connect(self.db_path, check_same_thread=False)
+            self.db.execute('CREATE TABLE hrefs (src TEXT PRIMARY KEY, dst TEXT)')
+
+    def __len__(self):
+        with self.lock:
+            if self.db:
+                return self.db.execute('SELECT COUNT(*) FROM hrefs').fetchone()[0]
+
+            return len(self.hrefs)
+
+    def __contains__(self, href):
+        return self.lookup(href) is not MISSING
+
+    def get_key(self, href):
+        """
+        Compact a source href into a key.  Hrefs that don't share the source
+        base URL (or aren't hrefs at all) are kept whole, but marked, so they
+        can never collide with a compacted key.
+
+        :param str href: The source href.
+        :rtype: str
+        :returns: The key.
+        """
+        if self.src_base and href.startswith(self.src_base):
+            return href[len(self.src_base):]
+
+        return '!' + href
+
+    def pack(self, key, dst_href):
+        """
+        Compact a destination href, given its source key.
+
+        :param str key: The source key.
+        :param str dst_href: The destination href, or None.
+        :rtype: str (or None)
+        :returns: The destination ID, or the whole href if it can't be
+            compacted.
+        """
+        if dst_href and self.dst_base and dst_href.startswith(self.dst_base):
+            kind, _, id = dst_href[len(self.dst_base):].partition('/')
+
+            if key.startswith(kind + '/') and '/' not in id:
+                return id
+
+        return dst_href
+
+    def unpack(self, key, value):
+        """
+        Expand a stored destination value back into an href.
+
+        :param str key: The source key.
+        :param str value: The stored value.
+        :rtype: str (or None)
+        :returns: The destination href, or None.
+        """
+        if not value or '/' in value:
+            return value
+
+        return '{}{}/{}'.format(self.dst_base, key.split('/', 1)[0], value)
+
+    def lookup(self, href):
+        """
+        Look up the stored destination value for a source href.
+
+        :param str href: The source href.
+        :rtype: str (or None, or MISSING)
+        :returns: The destination href, None if the href isn't mapped to
+            anything, or MISSING if the href isn't in the map.
+        """
+        if not self.src_base:
+            return MISSING
+
+        key = self.get_key(href)
+
+        if self.db:
+            with self.lock:
+                row = self.db.execute('SELECT dst FROM hrefs WHERE src = ?', (key,)).fetchone()
+
+            return self.unpack(key, row[0]) if row else MISSING
+
+        value = self.hrefs.get(key, MISSING)
+        return MISSING if value is MISSING else self.unpack(key, value)
+
+    def get(self, href, default=None):
+        """
+        Retrieve the destination href for a source href.
+
+        :param str href: The source resource href.
+        :param object default: The value to return if the href isn't mapped.
+        :rtype: str (or None)
+        :returns: The destination href, or the default.
+        """
+        value = self.lookup(href)
+        return default if value is MISSING else value
+
+    def set(self, src_href, dst_href):
+        """
+        Map a source href to a destination href, and write the mapping out.
+
+        :param str src_href: The source href.
+        :param str dst_href: The destination href, or None if the source
+            resource has no counterpart.
+        """
+        with self.lock:
+            if not self.src_base:
+                self.src_base = get_base_url(src_href) + '/'
+
+            if dst_href and not self.dst_base:
+                self.dst_base = get_base_url(dst_href) + '/'
+
+            key = self.get_key(src_href)
+            value = self.pack(key, dst_href)
+
+            if self.db:
+                self.db.execute('INSERT OR REPLACE INTO hrefs VALUES (?, ?)', (key, value))
+            else:
+                self.hrefs[key] = value
+
+        if self.writer:
+            self.writer.write(src_href, dst_href)
+
+    def items(self):
+        """
+        Retrieve every (source href, destination href) pair.
+
+        :rtype: list
+        :returns: A list of tuples.
+        """
+        with self.lock:
+            rows = self.db.execute('SELECT src, dst FROM hrefs').fetchall() if self.db else list(self.hrefs.items())
+
+        return [(key[1:] if key.startswith('!') else self.src_base + key, self.unpack(key, value)) for key, value in rows]
+
+    def record(self, source, destination):
+        """
+        Record that a source resource was migrated to a destination resource.
+
+        :param object source: The source resource, with its CustomData
+            expanded.
+        :param object destination: The destination resource, or None (in which
+            case nothing is recorded).
+        """
+        if destination is None:
+            return
+
+        if contains_hrefs(source.custom_data, get_base_url(source.href)):
+            with self.lock:
+                self.flagged.add(destination.href)
+
+        self.set(source.href, destination.href)
+
+    def update(self, pairs):
+        """
+        Record (source href, destination href) pairs, eg: from a journal.
+
+        :param iterable pairs: The pairs to record.
+        """
+        for src_href, dst_href in pairs:
+            if dst_href:
+                self.set(src_href, dst_href)
+
+    def close(self):
+        """
+        Release the map, removing any on-disk database.
+        """
+        self.hrefs = {}
+
+        if self.db:
+            self.db.close()
+            self.db = None
+            remove(self.db_path)
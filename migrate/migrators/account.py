@@ -3,11 +3,10 @@
 
 from uuid import uuid4
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
 from ..constants import SOCIAL_PROVIDER_IDS
+from ..retry import RetryError, policy
 from ..utils import sanitize
 
 
@@ -18,32 +17,44 @@ class AccountMigrator(BaseMigrator):
     RESOURCE = 'account'
     COLLECTION_RESOURCE = 'accounts'
 
-    def __init__(self, destination_directory, source_account, source_password, random_password=False):
+    def __init__(self, destination_directory, source_account, source_password, random_password=False, account_index=None, expanded=False, href_map=None):
         self.destination_directory = destination_directory
         self.source_account = source_account
         self.source_password = source_password
         self.random_password = random_password
+        self.account_index = account_index
+        self.expanded = expanded
+        self.href_map = href_map
+        self.created = False
 
     def get_custom_data(self):
         """
         Retrieve the CustomData.
 
+        If the source Account was fetched with its CustomData expanded, it's
+        used as is, rather than being fetched again.
+
         :rtype: object (or None)
         :returns: The CustomData object, or None.
         """
         sa = self.source_account
 
-        while True:
-            try:
-                sa.custom_data.refresh()
-                return sa.custom_data
-            except StormpathError as err:
-                logger.error('Failed to fetch CustomData for source Account: {} ({})'.format(sa.username.encode('utf-8'), err))
+        if self.expanded:
+            return sa.custom_data
+
+        def fetch():
+            sa.custom_data.refresh()
+            return sa.custom_data
+
+        return policy.call(fetch, 'Failed to fetch CustomData for source Account: {}'.format(sa.username.encode('utf-8')))
 
     def get_destination_account(self):
         """
         Retrieve the destination Account.
 
+        If an AccountIndex was given, it's used instead of searching the
+        destination Directory.
+
         :rtype: object (or None)
         :returns: The Account object, or None.
         """
@@ -51,16 +62,18 @@ class AccountMigrator(BaseMigrator):
         username = self.source_account.username
         email = self.source_account.email
 
-        while True:
-            try:
-                matches = directory.accounts.search({'username': username})
+        if self.account_index:
+            return self.account_index.get(username=username, email=email)
 
-                if len(matches) == 0:
-                    matches = directory.accounts.search({'email': email})
+        def search():
+            matches = directory.accounts.search({'username': username})
 
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Account: {} in destination Directory: {} ({})'.format(username.encode('utf-8'), directory.name.encode('utf-8'), err))
+            if len(matches) == 0:
+                matches = directory.accounts.search({'email': email})
+
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for Account: {} in destination Directory: {}'.format(username.encode('utf-8'), directory.name.encode('utf-8')))
 
     def copy_account(self):
         """
@@ -97,48 +110,30 @@ class AccountMigrator(BaseMigrator):
             for key, value in data.items():
                 setattr(da, key, value)
 
-            while True:
-                try:
-                    da.save()
-                    return da
-                except StormpathError as err:
-                    logger.error('Failed to update Account: {} in destination Directory: {} ({})'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8'), err))
+            return policy.save(da, 'Failed to update Account: {} in destination Directory: {}'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8')))
 
         # If we get here, it means the Account needs to be created in the
         # destination Directory.
         if provider_id in SOCIAL_PROVIDER_IDS:
-            while True:
-                try:
-                    da = dd.accounts.create({
-                        'provider_data': {
-                            'provider_id': provider_id,
-                            'access_token': dict(provider_data)['access_token'],
-                        }
-                    })
-                    return da
-                except StormpathError as err:
-                    logger.error('Failed to create {} Account: {} in destination Directory: {} ({})'.format(provider_id.title(), sa.username.encode('utf-8'), dd.name.encode('utf-8'), err))
-                    break
+            try:
+                return policy.call(lambda: dd.accounts.create({
+                    'provider_data': {
+                        'provider_id': provider_id,
+                        'access_token': dict(provider_data)['access_token'],
+                    }
+                }), 'Failed to create {} Account: {} in destination Directory: {}'.format(provider_id.title(), sa.username.encode('utf-8'), dd.name.encode('utf-8')))
+            except RetryError:
+                return None
 
         elif provider_id == 'stormpath':
             if self.random_password:
                 data['password'] = uuid4().hex + uuid4().hex.upper() + '!'
 
-                while True:
-                    try:
-                        da = dd.accounts.create(data, registration_workflow_enabled=False)
-                        return da
-                    except StormpathError as err:
-                        logger.error('Failed to create Account: {} in destination Directory: {} ({})'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8'), err))
+                return policy.call(lambda: dd.accounts.create(data, registration_workflow_enabled=False), 'Failed to create Account: {} in destination Directory: {}'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8')))
 
             # If we get here, if means we're going to use a pre-existing
             # password hash to create this Account.
-            while True:
-                try:
-                    da = dd.accounts.create(data, password_format='mcf', registration_workflow_enabled=False)
-                    return da
-                except StormpathError as err:
-                    logger.error('Failed to create Account: {} in destination Directory: {} ({})'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8'), err))
+            return policy.call(lambda: dd.accounts.create(data, password_format='mcf', registration_workflow_enabled=False), 'Failed to create Account: {} in destination Directory: {}'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8')))
 
         else:
             logger.warning('Skipping {} Account creation for Account: {} in destination Directory: {} because Account is not a Cloud or Social Account.'.format(provider_id.upper(), da.username.encode('utf-8'), dd.name.encode('utf-8')))
@@ -156,12 +151,7 @@ class AccountMigrator(BaseMigrator):
         for key, value in sanitize(self.get_custom_data()).items():
             da.custom_data[key] = value
 
-        while True:
-            try:
-                da.custom_data.save()
-                return da.custom_data
-            except StormpathError as err:
-                logger.error('Failed to copy CustomData for source Account: {} into destination Account: {} ({})'.format(sa.username.encode('utf-8'), da.username.encode('utf-8'), err))
+        return policy.save(da.custom_data, 'Failed to copy CustomData for source Account: {} into destination Account: {}'.format(sa.username.encode('utf-8'), da.username.encode('utf-8')))
 
     def migrate(self):
         """
@@ -175,12 +165,19 @@ class AccountMigrator(BaseMigrator):
         :returns: The migrated Account, or None.
         """
         self.destination_account = self.get_destination_account()
+        self.created = self.destination_account is None
         self.destination_account = self.copy_account()
 
         sa = self.source_account
         dd = self.destination_directory
 
         if self.destination_account:
+            if self.account_index:
+                self.account_index.add(self.destination_account)
+
+            if self.href_map is not None:
+                self.href_map.record(sa, self.destination_account)
+
             self.copy_custom_data()
             logger.info('Successfully copied Account: {} into destination Directory: {}'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8')))
 
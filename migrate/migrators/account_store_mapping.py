@@ -1,10 +1,10 @@
 """Our ApplicationAccountStoreMapping Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..indexes import index_account_store_mappings
+from ..retry import policy
 
 
 class ApplicationAccountStoreMappingMigrator(BaseMigrator):
@@ -14,9 +14,10 @@ class ApplicationAccountStoreMappingMigrator(BaseMigrator):
     RESOURCE = 'account_store_mapping'
     COLLECTION_RESOURCE = 'account_store_mappings'
 
-    def __init__(self, destination_application, source_account_store_mapping):
+    def __init__(self, destination_application, source_account_store_mapping, existing_mappings=None):
         self.destination_application = destination_application
         self.source_account_store_mapping = source_account_store_mapping
+        self.existing_mappings = existing_mappings
 
     def get_destination_account_store(self):
         """
@@ -32,12 +33,11 @@ class ApplicationAccountStoreMappingMigrator(BaseMigrator):
         klass = sas.__class__.__name__
         collection = 'directories' if klass == 'Directory' else klass.lower() + 's'
 
-        while True:
-            try:
-                matches = getattr(tenant, collection).search({'name': sas.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to fetch destination {}: {} ({})'.format(klass, sas.name.encode('utf-8'), err))
+        def search():
+            matches = getattr(tenant, collection).search({'name': sas.name})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to fetch destination {}: {}'.format(klass, sas.name.encode('utf-8')))
 
     def copy_mapping(self):
         """
@@ -51,27 +51,29 @@ class ApplicationAccountStoreMappingMigrator(BaseMigrator):
         sasm = self.source_account_store_mapping
 
         # First, we'll check to see if this mapping already exists.  If it does,
-        # we'll return immediately as there's nothing to do here.
-        for mapping in da.account_store_mappings:
-            if mapping.account_store.href == das.href and mapping.application.href == da.href:
-                return mapping
-
-        while True:
-            try:
-                return da.account_store_mappings.create({
-                    'account_store': das,
-                    'application': da,
-                    'list_index': sasm.list_index,
-                    'is_default_account_store': sasm.is_default_account_store,
-                    'is_default_group_store': sasm.is_default_group_store,
-                })
-            except StormpathError as err:
-                logger.error('Failed to copy AccountStoreMapping from Application: {} to {} {} ({})'.format(
-                    da.name.encode('utf-8'),
-                    das.__class__.__name__,
-                    das.name.encode('utf-8'),
-                    err
-                ))
+        # we'll return immediately as there's nothing to do here.  The index of
+        # existing mappings can be shared by all of the Application's mappings.
+        if self.existing_mappings is None:
+            self.existing_mappings = policy.call(lambda: index_account_store_mappings(da), 'Failed to index AccountStoreMappings for Application: {}'.format(da.name.encode('utf-8')))
+
+        key = (das.href, da.href)
+        if key in self.existing_mappings:
+            return self.existing_mappings[key]
+
+        mapping = policy.call(lambda: da.account_store_mappings.create({
+            'account_store': das,
+            'application': da,
+            'list_index': sasm.list_index,
+            'is_default_account_store': sasm.is_default_account_store,
+            'is_default_group_store': sasm.is_default_group_store,
+        }), 'Failed to copy AccountStoreMapping from Application: {} to {} {}'.format(
+            da.name.encode('utf-8'),
+            das.__class__.__name__,
+            das.name.encode('utf-8')
+        ))
+        self.existing_mappings[key] = mapping
+
+        return mapping
 
     def migrate(self):
         """
@@ -110,9 +112,10 @@ class OrganizationAccountStoreMappingMigrator(BaseMigrator):
     RESOURCE = 'account_store_mapping'
     COLLECTION_RESOURCE = 'account_store_mappings'
 
-    def __init__(self, destination_organization, source_account_store_mapping):
+    def __init__(self, destination_organization, source_account_store_mapping, existing_mappings=None):
         self.destination_organization = destination_organization
         self.source_account_store_mapping = source_account_store_mapping
+        self.existing_mappings = existing_mappings
 
     def get_destination_account_store(self):
         """
@@ -127,12 +130,11 @@ class OrganizationAccountStoreMappingMigrator(BaseMigrator):
         klass = sas.__class__.__name__
         collection = 'directories' if klass == 'Directory' else klass.lower() + 's'
 
-        while True:
-            try:
-                matches = getattr(tenant, collection).search({'name': sas.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to fetch destination {}: {} ({})'.format(klass, sas.name.encode('utf-8'), err))
+        def search():
+            matches = getattr(tenant, collection).search({'name': sas.name})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to fetch destination {}: {}'.format(klass, sas.name.encode('utf-8')))
 
     def copy_mapping(self):
         """
@@ -146,27 +148,29 @@ class OrganizationAccountStoreMappingMigrator(BaseMigrator):
         sasm = self.source_account_store_mapping
 
         # First, we'll check to see if this mapping already exists.  If it does,
-        # we'll return immediately as there's nothing to do here.
-        for mapping in do.account_store_mappings:
-            if mapping.account_store.href == das.href and mapping.organization.href == do.href:
-                return mapping
-
-        while True:
-            try:
-                return do.account_store_mappings._client.organization_account_store_mappings.create({
-                    'account_store': das,
-                    'organization': do,
-                    'list_index': sasm.list_index,
-                    'is_default_account_store': sasm.is_default_account_store,
-                    'is_default_group_store': sasm.is_default_group_store,
-                })
-            except StormpathError as err:
-                logger.error('Failed to copy AccountStoreMapping from Organization: {} to {} {} ({})'.format(
-                    do.name.encode('utf-8'),
-                    das.__class__.__name__,
-                    das.name.encode('utf-8'),
-                    err
-                ))
+        # we'll return immediately as there's nothing to do here.  The index of
+        # existing mappings can be shared by all of the Organization's mappings.
+        if self.existing_mappings is None:
+            self.existing_mappings = policy.call(lambda: index_account_store_mappings(do), 'Failed to index AccountStoreMappings for Organization: {}'.format(do.name.encode('utf-8')))
+
+        key = (das.href, do.href)
+        if key in self.existing_mappings:
+            return self.existing_mappings[key]
+
+        mapping = policy.call(lambda: do.account_store_mappings._client.organization_account_store_mappings.create({
+            'account_store': das,
+            'organization': do,
+            'list_index': sasm.list_index,
+            'is_default_account_store': sasm.is_default_account_store,
+            'is_default_group_store': sasm.is_default_group_store,
+        }), 'Failed to copy AccountStoreMapping from Organization: {} to {} {}'.format(
+            do.name.encode('utf-8'),
+            das.__class__.__name__,
+            das.name.encode('utf-8')
+        ))
+        self.existing_mappings[key] = mapping
+
+        return mapping
 
     def migrate(self):
         """
@@ -1,10 +1,9 @@
 """Our Application Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..retry import policy
 from ..utils import sanitize
 
 
@@ -15,9 +14,11 @@ class ApplicationMigrator(BaseMigrator):
     RESOURCE = 'application'
     COLLECTION_RESOURCE = 'applications'
 
-    def __init__(self, destination_client, source_application):
+    def __init__(self, destination_client, source_application, href_map=None):
         self.destination_client = destination_client
         self.source_application = source_application
+        self.href_map = href_map
+        self.created = False
 
     def get_destination_app(self):
         """
@@ -28,12 +29,11 @@ class ApplicationMigrator(BaseMigrator):
         """
         sa = self.source_application
 
-        while True:
-            try:
-                matches = self.destination_client.applications.search({'name': sa.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Application: {} ({})'.format(sa.name.encode('utf-8'), err))
+        def search():
+            matches = self.destination_client.applications.search({'name': sa.name})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for Application: {}'.format(sa.name.encode('utf-8')))
 
     def copy_app(self):
         """
@@ -56,20 +56,11 @@ class ApplicationMigrator(BaseMigrator):
             for key, value in data.items():
                 setattr(da, key, value)
 
-            while True:
-                try:
-                    da.save()
-                    return da
-                except StormpathError as err:
-                    logger.error('Failed to copy Application: {} ({})'.format(sa.name.encode('utf-8'), err))
+            return policy.save(da, 'Failed to copy Application: {}'.format(sa.name.encode('utf-8')))
 
         # If we get here, it means we need to create the Application from
         # scratch.
-        while True:
-            try:
-                return self.destination_client.applications.create(data)
-            except StormpathError as err:
-                logger.error('Failed to copy Application: {} ({})'.format(sa.name.encode('utf-8'), err))
+        return policy.call(lambda: self.destination_client.applications.create(data), 'Failed to copy Application: {}'.format(sa.name.encode('utf-8')))
 
     def copy_custom_data(self):
         """
@@ -84,12 +75,7 @@ class ApplicationMigrator(BaseMigrator):
         for key, value in sanitize(sa.custom_data).items():
             da.custom_data[key] = value
 
-        while True:
-            try:
-                da.custom_data.save()
-                return da.custom_data
-            except StormpathError as err:
-                logger.error('Failed to copy CustomData for source Application: {} into destination Account: {} ({})'.format(sa.name.encode('utf-8'), da.name.encode('utf-8'), err))
+        return policy.save(da.custom_data, 'Failed to copy CustomData for source Application: {} into destination Account: {}'.format(sa.name.encode('utf-8'), da.name.encode('utf-8')))
 
     def copy_oauth_policy(self):
         """
@@ -107,12 +93,7 @@ class ApplicationMigrator(BaseMigrator):
         dop.access_token_ttl = sop.access_token_ttl
         dop.refresh_token_ttl = sop.refresh_token_ttl
 
-        while True:
-            try:
-                dop.save()
-                return dop
-            except StormpathError as err:
-                logger.error('Failed to copy OAuthPolicy for Application: {} ({})'.format(sa.name.encode('utf-8'), err))
+        return policy.save(dop, 'Failed to copy OAuthPolicy for Application: {}'.format(sa.name.encode('utf-8')))
 
     def migrate(self):
         """
@@ -127,7 +108,12 @@ class ApplicationMigrator(BaseMigrator):
         :returns: The migrated Application, or None.
         """
         self.destination_application = self.get_destination_app()
+        self.created = self.destination_application is None
         self.destination_application = self.copy_app()
+
+        if self.href_map is not None:
+            self.href_map.record(self.source_application, self.destination_application)
+
         self.copy_custom_data()
         self.copy_oauth_policy()
 
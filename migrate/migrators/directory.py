@@ -3,11 +3,10 @@
 
 from uuid import uuid4
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
 from ..constants import MIRROR_PROVIDER_IDS, SAML_PROVIDER_ID, STORMPATH_PROVIDER_ID
+from ..retry import policy
 from ..utils import sanitize
 
 
@@ -18,9 +17,10 @@ class DirectoryMigrator(BaseMigrator):
     RESOURCE = 'directory'
     COLLECTION_RESOURCE = 'directories'
 
-    def __init__(self, destination_client, source_directory):
+    def __init__(self, destination_client, source_directory, href_map=None):
         self.destination_client = destination_client
         self.source_directory = source_directory
+        self.href_map = href_map
         self.provider_id = dict(self.source_directory.provider).get('provider_id')
 
     def get_destination_dir(self):
@@ -32,12 +32,11 @@ class DirectoryMigrator(BaseMigrator):
         """
         sd = self.source_directory
 
-        while True:
-            try:
-                matches = self.destination_client.directories.search({'name': sd.name.encode('utf-8')})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for destination Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        def search():
+            matches = self.destination_client.directories.search({'name': sd.name.encode('utf-8')})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for destination Directory: {}'.format(sd.name.encode('utf-8')))
 
     def copy_dir(self):
         """
@@ -77,12 +76,7 @@ class DirectoryMigrator(BaseMigrator):
             for key, value in data.iteritems():
                 setattr(dd, key, value)
 
-            while True:
-                try:
-                    dd.save()
-                    return dd
-                except StormpathError as err:
-                    logger.error('Failed to copy destination Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+            return policy.save(dd, 'Failed to copy destination Directory: {}'.format(sd.name.encode('utf-8')))
 
         # I'm manually setting the agent_user_dn_password field to a
         # random string here because our API won't export any
@@ -91,11 +85,7 @@ class DirectoryMigrator(BaseMigrator):
             data['provider']['agent']['config']['agent_user_dn_password'] = uuid4().hex
 
         # If we get here, it means we need to create the Directory from scratch.
-        while True:
-            try:
-                return self.destination_client.directories.create(data)
-            except StormpathError as err:
-                logger.error('Failed to copy Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        return policy.call(lambda: self.destination_client.directories.create(data), 'Failed to copy Directory: {}'.format(sd.name.encode('utf-8')))
 
     def copy_custom_data(self):
         """
@@ -110,12 +100,7 @@ class DirectoryMigrator(BaseMigrator):
         for key, value in sanitize(sd.custom_data).items():
             dcd[key] = value
 
-        while True:
-            try:
-                dcd.save()
-                return dcd
-            except StormpathError as err:
-                logger.error('Failed to copy CustomData for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        return policy.save(dcd, 'Failed to copy CustomData for Directory: {}'.format(sd.name.encode('utf-8')))
 
     def copy_strength(self):
         """
@@ -131,12 +116,7 @@ class DirectoryMigrator(BaseMigrator):
         for field in ss.writable_attrs:
             ds[field] = ss[field]
 
-        while True:
-            try:
-                ds.save()
-                return ds
-            except StormpathError as err:
-                logger.error('Failed to copy Strength rules for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        return policy.save(ds, 'Failed to copy Strength rules for Directory: {}'.format(sd.name.encode('utf-8')))
 
     def migrate(self):
         """
@@ -154,6 +134,10 @@ class DirectoryMigrator(BaseMigrator):
         """
         self.destination_directory = self.get_destination_dir()
         self.destination_directory = self.copy_dir()
+
+        if self.href_map is not None:
+            self.href_map.record(self.source_directory, self.destination_directory)
+
         self.copy_custom_data()
 
         # Mirror Directories don't support workflows at all, so this is moot.
@@ -1,10 +1,9 @@
 """Our DirectoryWorkflow Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..retry import policy
 
 
 class DirectoryWorkflowMigrator(BaseMigrator):
@@ -37,12 +36,7 @@ class DirectoryWorkflowMigrator(BaseMigrator):
         for attr in sacp.writable_attrs:
             setattr(dacp, attr, getattr(sacp, attr))
 
-        while True:
-            try:
-                dacp.save()
-                break
-            except StormpathError as err:
-                logger.error('Failed to copy AccountCreationPolicy for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        policy.save(dacp, 'Failed to copy AccountCreationPolicy for Directory: {}'.format(sd.name.encode('utf-8')))
 
         # Once we get here, we're going to copy over all the
         # AccountCreationPolicy email templates.
@@ -59,12 +53,7 @@ class DirectoryWorkflowMigrator(BaseMigrator):
             for attr in sr.writable_attrs:
                 setattr(dr, attr, getattr(sr, attr))
 
-            while True:
-                try:
-                    dr.save()
-                    break
-                except StormpathError as err:
-                    logger.error('Failed to copy {} for Directory: {} ({})'.format(resource, sd.name.encode('utf-8'), err))
+            policy.save(dr, 'Failed to copy {} for Directory: {}'.format(resource, sd.name.encode('utf-8')))
 
     def copy_password_policy(self):
         """
@@ -88,23 +77,13 @@ class DirectoryWorkflowMigrator(BaseMigrator):
         for attr in spp.writable_attrs:
             setattr(dpp, attr, getattr(spp, attr))
 
-        while True:
-            try:
-                dpp.save()
-                break
-            except StormpathError as err:
-                logger.error('Failed to copy PasswordPolicy for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        policy.save(dpp, 'Failed to copy PasswordPolicy for Directory: {}'.format(sd.name.encode('utf-8')))
 
         # Next, we'll copy over the PasswordStrength properties.
         for attr in spsp.writable_attrs:
             setattr(dpsp, attr, getattr(spsp, attr))
 
-        while True:
-            try:
-                dpsp.save()
-                break
-            except StormpathError as err:
-                logger.error('Failed to copy PasswordStrength for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        policy.save(dpsp, 'Failed to copy PasswordStrength for Directory: {}'.format(sd.name.encode('utf-8')))
 
         # Once we get here, we're going to copy over all the
         # AccountCreationPolicy email templates.
@@ -120,12 +99,7 @@ class DirectoryWorkflowMigrator(BaseMigrator):
             for attr in sr.writable_attrs:
                 setattr(dr, attr, getattr(sr, attr))
 
-            while True:
-                try:
-                    dr.save()
-                    break
-                except StormpathError as err:
-                    logger.error('Failed to copy {} for Directory: {} ({})'.format(resource, sd.name.encode('utf-8'), err))
+            policy.save(dr, 'Failed to copy {} for Directory: {}'.format(resource, sd.name.encode('utf-8')))
 
     def migrate(self):
         """
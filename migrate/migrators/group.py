@@ -1,10 +1,9 @@
 """Our Group Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..retry import RetryError, policy
 from ..utils import sanitize
 
 
@@ -15,9 +14,10 @@ class GroupMigrator(BaseMigrator):
     RESOURCE = 'groups'
     COLLECTION_RESOURCE = 'groups'
 
-    def __init__(self, destination_directory, source_group):
+    def __init__(self, destination_directory, source_group, href_map=None):
         self.destination_directory = destination_directory
         self.source_group = source_group
+        self.href_map = href_map
 
     def get_destination_group(self):
         """
@@ -29,12 +29,11 @@ class GroupMigrator(BaseMigrator):
         sg = self.source_group
         dd = self.destination_directory
 
-        while True:
-            try:
-                matches = dd.groups.search({'name': sg.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Group: {} in Directory: {} ({})'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+        def search():
+            matches = dd.groups.search({'name': sg.name})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for Group: {} in Directory: {}'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8')))
 
     def copy_group(self):
         """
@@ -58,19 +57,10 @@ class GroupMigrator(BaseMigrator):
             for key, value in data.items():
                 setattr(dg, key, value)
 
-            while True:
-                try:
-                    dg.save()
-                    return dg
-                except StormpathError as err:
-                    logger.error('Failed to copy Group: {} into Directory: {} ({})'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+            return policy.save(dg, 'Failed to copy Group: {} into Directory: {}'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8')))
 
         # If we get here, it means we need to create the Group from scratch.
-        while True:
-            try:
-                return dd.groups.create(data)
-            except StormpathError as err:
-                logger.error('Failed to copy Group: {} into Directory: {} ({})'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+        return policy.call(lambda: dd.groups.create(data), 'Failed to copy Group: {} into Directory: {}'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8')))
 
     def copy_custom_data(self):
         """
@@ -87,10 +77,9 @@ class GroupMigrator(BaseMigrator):
             dg.custom_data[key] = value
 
         try:
-            dg.custom_data.save()
-            return dg.custom_data
-        except StormpathError as err:
-            logger.error('Failed to copy CustomData for Group: {} in Directory: {} ({})'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+            return policy.save(dg.custom_data, 'Failed to copy CustomData for Group: {} in Directory: {}'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8')))
+        except RetryError:
+            return None
 
     def migrate(self):
         """
@@ -102,6 +91,10 @@ class GroupMigrator(BaseMigrator):
         """
         self.destination_group = self.get_destination_group()
         self.destination_group = self.copy_group()
+
+        if self.href_map is not None:
+            self.href_map.record(self.source_group, self.destination_group)
+
         self.copy_custom_data()
 
         logger.info('Successfully copied Group: {}'.format(self.destination_group.name.encode('utf-8')))
@@ -1,10 +1,10 @@
 """Our GroupMembership Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..indexes import index_memberships
+from ..retry import policy
 
 
 class GroupMembershipMigrator(BaseMigrator):
@@ -14,14 +14,19 @@ class GroupMembershipMigrator(BaseMigrator):
     RESOURCE = 'group_membership'
     COLLECTION_RESOURCE = 'group_memberships'
 
-    def __init__(self, destination_client, source_group_membership):
+    def __init__(self, destination_client, source_group_membership, account_index=None, cache=None, existing_memberships=None):
         self.destination_client = destination_client
         self.source_group_membership = source_group_membership
+        self.account_index = account_index
+        self.cache = cache
+        self.existing_memberships = existing_memberships
 
     def get_destination_directory(self):
         """
         Retrieve the destination Directory.
 
+        If a cache was given, lookups are shared through it.
+
         :rtype: object (or None)
         :returns: The Directory, or None.
         """
@@ -29,51 +34,73 @@ class GroupMembershipMigrator(BaseMigrator):
         sgm = self.source_group_membership
         sd = sgm.group.directory
 
-        while True:
-            try:
-                matches = dc.directories.search({'name': sd.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Directory: {} ({})'.format(sd.name.encode('utf-8'), err))
+        def search():
+            matches = dc.directories.search({'name': sd.name})
+            return matches[0] if len(matches) > 0 else None
+
+        def load():
+            return policy.call(search, 'Failed to search for Directory: {}'.format(sd.name.encode('utf-8')))
+
+        if self.cache is not None:
+            return self.cache.fetch(('directory', sd.href), load)
+
+        return load()
 
     def get_destination_group(self):
         """
         Retrieve the destination Group.
 
+        If a cache was given, lookups are shared through it.
+
         :rtype: object (or None)
         :returns: The Group, or None.
         """
         dd = self.destination_directory
         sg = self.source_group_membership.group
 
-        while True:
-            try:
-                matches = dd.groups.search({'name': sg.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Group: {} in Directory: {} ({})'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+        def search():
+            matches = dd.groups.search({'name': sg.name})
+            return matches[0] if len(matches) > 0 else None
+
+        def load():
+            return policy.call(search, 'Failed to search for Group: {} in Directory: {}'.format(sg.name.encode('utf-8'), dd.name.encode('utf-8')))
+
+        if self.cache is not None:
+            return self.cache.fetch(('group', dd.href, sg.name), load)
+
+        return load()
 
     def get_destination_account(self):
         """
         Retrieve the destination Account.
 
+        If an AccountIndex was given, it's used instead of searching the
+        destination Directory.
+
         :rtype: object (or None)
         :returns: The Account, or None.
         """
         dd = self.destination_directory
         sa = self.source_group_membership.account
 
-        while True:
-            try:
-                matches = dd.accounts.search({'username': sa.username})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Account: {} in Directory: {} ({})'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8'), err))
+        if self.account_index:
+            return self.account_index.get(username=sa.username)
+
+        def search():
+            matches = dd.accounts.search({'username': sa.username})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for Account: {} in Directory: {}'.format(sa.username.encode('utf-8'), dd.name.encode('utf-8')))
 
     def copy_membership(self):
         """
         Copy the source Membership over into the destination Tenant.
 
+        Existing memberships are checked against existing_memberships (a dict
+        of the destination Account's memberships, keyed by Group href), which
+        can be shared across all of an Account's memberships.  If it wasn't
+        given, it's built here.
+
         :rtype: object (or None)
         :returns: The copied Group, or None.
         """
@@ -82,15 +109,16 @@ class GroupMembershipMigrator(BaseMigrator):
         dg = self.destination_group
         dd = self.destination_directory
 
-        for membership in da.group_memberships:
-            if membership.group.href == dg.href:
-                return membership
+        if self.existing_memberships is None:
+            self.existing_memberships = policy.call(lambda: index_memberships(da), 'Failed to index GroupMemberships for Account: {} in Directory: {}'.format(da.username.encode('utf-8'), dd.name.encode('utf-8')))
+
+        if dg.href in self.existing_memberships:
+            return self.existing_memberships[dg.href]
+
+        membership = policy.call(lambda: dc.group_memberships.create({'account': da, 'group': dg}), 'Failed to copy GroupMembership for Account: {} and Group: {} in Directory: {}'.format(da.username.encode('utf-8'), dg.name.encode('utf-8'), dd.name.encode('utf-8')))
+        self.existing_memberships[dg.href] = membership
 
-        while True:
-            try:
-                return dc.group_memberships.create({'account': da, 'group': dg})
-            except StormpathError as err:
-                logger.error('Failed to copy GroupMembership for Account: {} and Group: {} in Directory: {} ({})'.format(da.username.encode('utf-8'), dg.name.encode('utf-8'), dd.name.encode('utf-8'), err))
+        return membership
 
     def migrate(self):
         """
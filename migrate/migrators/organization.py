@@ -1,10 +1,9 @@
 """Our Organization Migrator."""
 
 
-from stormpath.error import Error as StormpathError
-
 from . import BaseMigrator
 from .. import logger
+from ..retry import policy
 from ..utils import sanitize
 
 
@@ -15,9 +14,11 @@ class OrganizationMigrator(BaseMigrator):
     RESOURCE = 'organization'
     COLLECTION_RESOURCE = 'organizations'
 
-    def __init__(self, destination_client, source_organization):
+    def __init__(self, destination_client, source_organization, href_map=None):
         self.destination_client = destination_client
         self.source_organization = source_organization
+        self.href_map = href_map
+        self.created = False
 
     def get_destination_org(self):
         """
@@ -29,12 +30,11 @@ class OrganizationMigrator(BaseMigrator):
         dc = self.destination_client
         so = self.source_organization
 
-        while True:
-            try:
-                matches = dc.organizations.search({'name': so.name})
-                return matches[0] if len(matches) > 0 else None
-            except StormpathError as err:
-                logger.error('Failed to search for Organization: {} ({})'.format(so.name.encode('utf-8'), err))
+        def search():
+            matches = dc.organizations.search({'name': so.name})
+            return matches[0] if len(matches) > 0 else None
+
+        return policy.call(search, 'Failed to search for Organization: {}'.format(so.name.encode('utf-8')))
 
     def copy_org(self):
         """
@@ -59,20 +59,11 @@ class OrganizationMigrator(BaseMigrator):
             for key, value in data.items():
                 setattr(do, key, value)
 
-            while True:
-                try:
-                    do.save()
-                    return do
-                except StormpathError as err:
-                    logger.error('Failed to copy Organization: {} ({})'.format(so.name.encode('utf-8'), err))
+            return policy.save(do, 'Failed to copy Organization: {}'.format(so.name.encode('utf-8')))
 
         # If we get here, it means we need to create the Organization from
         # scratch.
-        while True:
-            try:
-                return dc.tenant.organizations.create(data)
-            except StormpathError as err:
-                logger.error('Failed to copy Organization: {} ({})'.format(so.name.encode('utf-8'), err))
+        return policy.call(lambda: dc.tenant.organizations.create(data), 'Failed to copy Organization: {}'.format(so.name.encode('utf-8')))
 
     def copy_custom_data(self):
         """
@@ -87,12 +78,7 @@ class OrganizationMigrator(BaseMigrator):
         for key, value in sanitize(so.custom_data).items():
             do.custom_data[key] = value
 
-        while True:
-            try:
-                do.custom_data.save()
-                return do.custom_data
-            except StormpathError as err:
-                logger.error('Failed to copy CustomData for Organization: {} ({})'.format(so.name.encode('utf-8'), err))
+        return policy.save(do.custom_data, 'Failed to copy CustomData for Organization: {}'.format(so.name.encode('utf-8')))
 
     def migrate(self):
         """
@@ -103,7 +89,12 @@ class OrganizationMigrator(BaseMigrator):
         :returns: The migrated Organization, or None.
         """
         self.destination_organization = self.get_destination_org()
+        self.created = self.destination_organization is None
         self.destination_organization = self.copy_org()
+
+        if self.href_map is not None:
+            self.href_map.record(self.source_organization, self.destination_organization)
+
         self.copy_custom_data()
 
         logger.info('Successfully copied Organization: {}'.format(self.destination_organization.name.encode('utf-8')))
@@ -1,76 +1,146 @@
 """Our Substitution Migrator."""
 
 
-from csv import QUOTE_ALL, writer
-
-from stormpath.error import Error as StormpathError
+from stormpath.resources.base import Expansion
 
 from . import BaseMigrator
 from .. import logger
+from ..constants import MAPPINGS_FILE, MIRROR_PROVIDER_IDS, SAML_PROVIDER_ID
+from ..indexes import index_hrefs
+from ..mappings import HrefMap, MappingWriter, substitute_hrefs
+from ..readers import SourceReader
+from ..retry import RetryError, policy
+from ..utils import FIELDS
+from ..workers import WorkerPool
 
 
 class SubstitutionMigrator(BaseMigrator):
     """
     This class manages a migration of all HREFs (inside CustomData) from one
     Tenant to Another.
+
+    If an HrefMap recorded during the migration is given, it's used instead
+    of rebuilding one, and only the gaps in it (resources the migration never
+    copies, like the Groups and Accounts of Mirror Directories) are filled in.
+    In that case, the MappingWriter the HrefMap wrote its mappings to should
+    be given too.  Otherwise, a new HrefMap is built (on disk, if
+    `disk_index` is set).
+
+    CustomData is rewritten by a pool of `workers` threads.  If the
+    destination hrefs of the only resources whose CustomData mentions source
+    hrefs are known (`flagged`), every other resource is left alone.
     """
-    def __init__(self, source_client, destination_client):
+    def __init__(self, source_client, destination_client, reader=None, href_map=None, workers=1, flagged=None, writer=None, disk_index=False):
         self.source_client = source_client
         self.destination_client = destination_client
-        self.hrefs = {}
+        self.reader = reader or SourceReader(source_client)
+        self.href_map = href_map
+        self.workers = workers
+        self.flagged = flagged
+        self.writer = writer or MappingWriter(MAPPINGS_FILE)
+        self.hrefs = href_map if href_map is not None else HrefMap(writer=self.writer, on_disk=disk_index)
+
+    def join_directory(self, sd, dir, groups=True, accounts=True):
+        """
+        Map a source Directory's Groups and Accounts, by joining them against
+        the matching destination Directory on Group name and Account email.
+        Resources that are already mapped are left alone; resources with no
+        match are mapped to None.
+
+        :param object sd: The source Directory.
+        :param object dir: The destination Directory, or None.
+        :param bool groups: Whether to map the Groups.
+        :param bool accounts: Whether to map the Accounts.
+        """
+        if groups:
+            index = index_hrefs(dir.groups, lambda group: group.name) if dir else {}
 
-    def build_hrefs(self):
+            for sg in self.reader.groups(sd):
+                if sg.href not in self.hrefs:
+                    self.hrefs.set(sg.href, index.get(sg.name))
+
+        if accounts:
+            index = index_hrefs(dir.accounts, lambda account: account.email.lower()) if dir else {}
+
+            for sa in self.reader.accounts(sd):
+                if sa.href not in self.hrefs:
+                    self.hrefs.set(sa.href, index.get(sa.email.lower()))
+
+    def fill_hrefs(self):
         """
-        Build an index of HREFs that we can use for substitutions later on.
+        Fill in the gaps in an HrefMap recorded during the migration.
+
+        The migration only records the resources it copies (or fails to
+        copy).  The Groups and Accounts of Mirror Directories, the Accounts of
+        SAML Directories, and everything inside the Stormpath Administrators
+        Directory or a Directory that couldn't be copied are never visited, so
+        they're joined against the destination here -- exactly like a full
+        build, but only for those Directories.
         """
-        sc = self.source_client
-        dc = self.destination_client
+        directories = None
 
-        logger.info('Starting to build index of Stormpath Resource HREFs... This may take a while.')
+        for sd in self.reader.directories():
+            provider_id = dict(sd.provider).get('provider_id')
+            visited = bool(self.hrefs.get(sd.href)) and sd.name != 'Stormpath Administrators'
 
-        for sa in sc.applications:
-            self.hrefs[sa.href] = None
+            groups = not visited or provider_id in MIRROR_PROVIDER_IDS
+            accounts = not visited or provider_id in MIRROR_PROVIDER_IDS or provider_id == SAML_PROVIDER_ID
 
-            for app in dc.applications.search({'name': sa.name}):
-                self.hrefs[sa.href] = app.href
+            if not groups and not accounts:
+                continue
 
-        logger.info('Finished building index of Application HREFs.')
+            if directories is None:
+                directories = dict((dir.name, dir) for dir in self.destination_client.directories.query(limit=100))
 
-        for sd in sc.directories:
-            self.hrefs[sd.href] = None
+            dir = directories.get(sd.name)
 
-            for dir in dc.directories.search({'name': sd.name}):
-                self.hrefs[sd.href] = dir.href
+            if sd.href not in self.hrefs:
+                self.hrefs.set(sd.href, dir.href if dir else None)
 
-        logger.info('Finished building index of Directory HREFs.')
+            self.join_directory(sd, dir, groups=groups, accounts=accounts)
 
-        for so in sc.tenant.organizations:
-            self.hrefs[so.href] = None
+        logger.info('Finished filling in {} Stormpath Resource HREFs.'.format(len(self.hrefs)))
 
-            for org in dc.tenant.organizations.search({'name': so.name}):
-                self.hrefs[so.href] = org.href
+    def build_hrefs(self):
+        """
+        Build an index of HREFs that we can use for substitutions later on.
 
-        logger.info('Finished building index of Organization HREFs.')
+        Rather than searching the destination Tenant once per source resource,
+        each destination collection is paged through once and indexed by
+        name (or email), and the source Tenant is joined against those indexes
+        locally.  Groups and Accounts are joined per Directory, on (Directory
+        name, Group name) and (Directory name, Account email).
+        """
+        if self.href_map is not None:
+            logger.info('Using {} Stormpath Resource HREFs recorded during migration.'.format(len(self.href_map)))
+            self.fill_hrefs()
+            return
+
+        dc = self.destination_client
+        reader = self.reader
+        by_name = lambda resource: resource.name
+
+        logger.info('Starting to build index of Stormpath Resource HREFs... This may take a while.')
 
-        for sg in sc.groups:
-            self.hrefs[sg.href] = None
+        applications = index_hrefs(dc.applications, by_name)
+        for sa in reader.applications():
+            self.hrefs.set(sa.href, applications.get(sa.name))
 
-            sd = sg.directory
-            for dir in dc.directories.search({'name': sd.name}):
-                for group in dir.groups.search({'name': sg.name}):
-                    self.hrefs[sg.href] = group.href
+        logger.info('Finished building index of Application HREFs.')
 
-        logger.info('Finished building index of Group HREFs.')
+        organizations = index_hrefs(dc.tenant.organizations, by_name)
+        for so in reader.organizations():
+            self.hrefs.set(so.href, organizations.get(so.name))
 
-        for sd in sc.directories:
-            for sa in sd.accounts:
-                self.hrefs[sa.href] = None
+        logger.info('Finished building index of Organization HREFs.')
 
-                for dir in dc.directories.search({'name': sd.name}):
-                    for account in dir.accounts.search({'email': sa.email}):
-                        self.hrefs[sa.href] = account.href
+        directories = dict((dir.name, dir) for dir in dc.directories.query(limit=100))
+        for sd in reader.directories():
+            dir = directories.get(sd.name)
+            self.hrefs.set(sd.href, dir.href if dir else None)
+            self.join_directory(sd, dir)
 
-        logger.info('Finished building index of Account HREFs.')
+        logger.info('Finished building index of Directory, Group and Account HREFs.')
 
     def output_hrefs(self):
         """
@@ -78,151 +148,136 @@ class SubstitutionMigrator(BaseMigrator):
         HREFs.  This is useful when a client has their database linked to
         Stormpath HREFs, as it gives them a way to pragmatically update their
         database HREFs as necessary.
+
+        Rows are streamed to the CSV file as mappings are discovered, so all
+        that's left to do here is finish it off.
         """
         logger.info('Generating CSV file of migrated resource mappings.')
+        self.writer.close()
+        logger.info('Finished generating CSV file of migrated resource mappings ({} rows).'.format(self.writer.written))
 
-        with open('stormpath-mappings.csv', 'wb') as csvfile:
-            csv_writer = writer(csvfile, delimiter=',', quotechar='"', quoting=QUOTE_ALL)
-            csv_writer.writerow(['original_href', 'migrated_href'])
+    def substitute(self, custom_data):
+        """
+        Apply every HREF substitution to a CustomData document, in memory.
+
+        Known source HREFs are replaced with their destination HREFs wherever
+        they appear: in keys, in values, inside nested objects and lists, and
+        embedded in longer strings.
+
+        :param object custom_data: The CustomData to rewrite.
+        :rtype: bool
+        :returns: True if anything was substituted, False otherwise.
+        """
+        changed = False
 
-            for old_href, new_href in self.hrefs.items():
-                csv_writer.writerow([old_href, new_href])
+        for key, value in dict(custom_data).items():
+            if key in FIELDS:
+                continue
 
-        logger.info('Finished generating CSV file of migrated resource mappings.')
+            new_key = substitute_hrefs(key, self.hrefs)
+            new_value = substitute_hrefs(value, self.hrefs)
+
+            if new_key is key and new_value is value:
+                continue
+
+            if new_key != key:
+                del custom_data[key]
+
+            custom_data[new_key] = new_value
+            changed = True
+
+        return changed
+
+    def rewrite_custom_data(self, resource, description):
+        """
+        Rewrite the HREFs in a resource's CustomData, saving it (at most) once.
+
+        :param object resource: The destination resource.
+        :param str description: A human readable description of the resource
+            (eg: 'Group: admins').
+        """
+        custom_data = resource.custom_data
+
+        if not self.substitute(custom_data):
+            return
+
+        try:
+            policy.save(custom_data, 'Failed to rewrite HREF for {}'.format(description))
+            logger.info('Successfully rewrote HREF for {}'.format(description))
+        except RetryError:
+            pass
+
+    def flagged_resources(self):
+        """
+        Fetch every flagged destination resource, with its CustomData
+        expanded inline.
+
+        :rtype: generator
+        :returns: A generator of (resource, description) tuples.
+        """
+        dc = self.destination_client
+        collections = {
+            'applications': ('Application', dc.applications),
+            'organizations': ('Organization', dc.tenant.organizations),
+            'directories': ('Directory', dc.directories),
+            'groups': ('Group', dc.groups),
+            'accounts': ('Account', dc.accounts),
+        }
+
+        for href in sorted(self.flagged):
+            name, collection = collections[href.rsplit('/', 2)[1]]
+            yield collection.get(href, Expansion('customData')), '{}: {}'.format(name, href)
+
+    def destination_resources(self):
+        """
+        Walk every destination resource that can hold CustomData, with its
+        CustomData expanded inline.
+
+        Directories are walked once: each is followed by its Groups and
+        Accounts.
+
+        :rtype: generator
+        :returns: A generator of (resource, description) tuples.
+        """
+        dc = self.destination_client
+        params = {'expand': 'customData', 'limit': 100}
+
+        for app in dc.applications.query(**params):
+            yield app, 'Application: {}'.format(app.name.encode('utf-8'))
+
+        for org in dc.tenant.organizations.query(**params):
+            yield org, 'Organization: {}'.format(org.name.encode('utf-8'))
+
+        for dir in dc.directories.query(**params):
+            yield dir, 'Directory: {}'.format(dir.name.encode('utf-8'))
+
+            for group in dir.groups.query(**params):
+                yield group, 'Group: {}'.format(group.name.encode('utf-8'))
+
+            for acc in dir.accounts.query(**params):
+                yield acc, 'Account: {}'.format(acc.username.encode('utf-8'))
 
     def rewrite_hrefs(self):
         """
         Rewrite all hrefs.
 
+        Only flagged resources are visited, if they're known.  Otherwise, every
+        destination resource is.  Resources are streamed to a bounded
+        WorkerPool, so several CustomData documents are rewritten at once,
+        while the resource walk never gets more than a page or so ahead of the
+        workers.
+
         :returns: None
         """
-        dc = self.destination_client
+        if self.flagged is not None:
+            logger.info('Rewriting HREFs in the CustomData of {} flagged resources.'.format(len(self.flagged)))
+            resources = self.flagged_resources()
+        else:
+            resources = self.destination_resources()
 
-        for app in dc.applications:
-            custom_data = app.custom_data
-
-            for key, value in dict(custom_data).items():
-                if key in self.hrefs and self.hrefs[key]:
-                    del custom_data[key]
-                    custom_data[self.hrefs[key]] = value
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Application: {}'.format(app.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Application: {} ({})'.format(app.name.encode('utf-8'), err))
-
-                if isinstance(value, str) and value in self.hrefs:
-                    custom_data[key] = self.hrefs[value]
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Application: {}'.format(app.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Application: {} ({})'.format(app.name.encode('utf-8'), err))
-
-        for dir in dc.directories:
-            custom_data = dir.custom_data
-
-            for key, value in dict(custom_data).items():
-                if key in self.hrefs and self.hrefs[key]:
-                    del custom_data[key]
-                    custom_data[self.hrefs[key]] = value
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Directory: {}'.format(dir.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Directory: {} ({})'.format(dir.name.encode('utf-8'), err))
-
-                if isinstance(value, str) and value in self.hrefs:
-                    custom_data[key] = self.hrefs[value]
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Directory: {}'.format(dir.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Directory: {} ({})'.format(dir.name.encode('utf-8'), err))
-
-        for org in dc.tenant.organizations:
-            custom_data = org.custom_data
-
-            for key, value in dict(custom_data).items():
-                if key in self.hrefs and self.hrefs[key]:
-                    del custom_data[key]
-                    custom_data[self.hrefs[key]] = value
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Organization: {}'.format(org.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Organization: {} ({})'.format(org.name.encode('utf-8'), err))
-
-                if isinstance(value, str) and value in self.hrefs:
-                    custom_data[key] = self.hrefs[value]
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Organization: {}'.format(org.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Organization: {} ({})'.format(org.name.encode('utf-8'), err))
-
-        for group in dc.groups:
-            custom_data = group.custom_data
-
-            for key, value in dict(custom_data).items():
-                if key in self.hrefs and self.hrefs[key]:
-                    del custom_data[key]
-                    custom_data[self.hrefs[key]] = value
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Group: {}'.format(group.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Group: {} ({})'.format(group.name.encode('utf-8'), err))
-
-                if isinstance(value, str) and value in self.hrefs:
-                    custom_data[key] = self.hrefs[value]
-
-                    while True:
-                        try:
-                            custom_data.save()
-                            logger.info('Successfully rewrote HREF for Group: {}'.format(group.name.encode('utf-8')))
-                        except StormpathError as err:
-                            logger.error('Failed to rewrite HREF for Group: {} ({})'.format(group.name.encode('utf-8'), err))
-
-        for directory in dc.directories:
-            for acc in directory.accounts:
-                custom_data = acc.custom_data
-
-                for key, value in dict(custom_data).items():
-                    if key in self.hrefs and self.hrefs[key]:
-                        del custom_data[key]
-                        custom_data[self.hrefs[key]] = value
-
-                        while True:
-                            try:
-                                custom_data.save()
-                                logger.info('Successfully rewrote HREF for Account: {}'.format(acc.username.encode('utf-8')))
-                            except StormpathError as err:
-                                logger.error('Failed to rewrite HREF for Account: {} ({})'.format(acc.username.encode('utf-8'), err))
-
-                    if isinstance(value, str) and value in self.hrefs:
-                        custom_data[key] = self.hrefs[value]
-
-                        while True:
-                            try:
-                                custom_data.save()
-                                logger.info('Successfully rewrote HREF for Account: {}'.format(acc.username.encode('utf-8')))
-                            except StormpathError as err:
-                                logger.error('Failed to rewrite HREF for Account: {} ({})'.format(acc.username.encode('utf-8'), err))
+        with WorkerPool(self.workers) as pool:
+            for resource, description in resources:
+                pool.submit(self.rewrite_custom_data, resource, description)
 
     def migrate(self):
         """
@@ -231,3 +286,7 @@ class SubstitutionMigrator(BaseMigrator):
         self.build_hrefs()
         self.output_hrefs()
         self.rewrite_hrefs()
+
+        # An HrefMap built here is ours to release.
+        if self.href_map is None:
+            self.hrefs.close()
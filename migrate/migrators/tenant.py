@@ -1,88 +1,429 @@
 """Our Tenant migrator."""
 
 
-from json import loads
+from os.path import exists
+from threading import Lock
 
 from . import *
 from .. import logger
-from ..constants import MIRROR_PROVIDER_IDS
+from ..cache import LRUCache
+from ..constants import MAPPINGS_FILE, MIRROR_PROVIDER_IDS
+from ..indexes import AccountIndex, PasswordIndex
+from ..journal import Journal
+from ..mappings import HrefMap, MappingWriter
+from ..planner import TenantPlanner
+from ..readers import SourceReader
+from ..snapshot import SnapshotReader
+from ..retry import RetryError, policy
+from ..transport import read_only
+from ..workers import WorkerPool
 
 
 class TenantMigrator(BaseMigrator):
     """
     This class manages a migration from one Stormpath Tenant to another.
+
+    If the path of a snapshot (made by TenantExporter) is given, the source
+    resources are read from it instead of from the source Tenant, and no
+    source Client is needed.
     """
+    def __init__(self, src, dst, passwords, from_date=None, verbose=False, disk_index=False, workers=1, account_workers=1, journal=None, page_size=None, max_attempts=None, sort_mappings=False, snapshot=None):
+        super(TenantMigrator, self).__init__(src, dst, passwords, from_date=from_date, verbose=verbose)
+        self.disk_index = disk_index
+        self.workers = workers
+        self.account_workers = account_workers
+        self.journal_path = journal
+        self.snapshot = snapshot
+        self.reader = SnapshotReader(snapshot, from_date=from_date) if snapshot else SourceReader(src, from_date=from_date, page_size=page_size)
+        self.journal = None
+        self.new_directories = None
+        self.lookup_cache = LRUCache()
+        self.mappings = MappingWriter(MAPPINGS_FILE, sort=sort_mappings)
 
-    def migrate(self):
+        # Delta syncs rebuild the whole map at the end (see migrate()), and
+        # that's what gets written out -- so that every href is written once.
+        self.href_map = HrefMap(writer=None if from_date else self.mappings, on_disk=disk_index)
+
+        if max_attempts:
+            policy.max_attempts = max_attempts
+
+    def summarize(self):
         """
-        Migrates one Tenant to another =)  Won't stop until the migration is
-        complete.
+        Log a summary of the migration.
+        """
+        self.password_index.summarize()
+        self.reader.summarize()
+        self.lookup_cache.summarize('Destination Directory and Group lookup')
+        policy.summarize()
 
-        NOTE: This may take a longggg time to run.
+        if self.journal:
+            self.journal.summarize()
+
+    def attempt(self, func):
         """
-        for directory in self.src.directories:
-            if directory.name == 'Stormpath Administrators':
-                continue
+        Run one unit of work (eg: migrating a Group).  If the retry policy
+        gives up on any of its API calls, the failure has already been logged
+        and dead lettered, so the unit is simply skipped.
+
+        :param func func: The unit of work.
+        :rtype: object (or None)
+        :returns: Whatever func() returns, or None if it was given up on.
+        """
+        try:
+            return func()
+        except RetryError:
+            return None
+
+    def finished(self, phase, resource):
+        """
+        Check the journal (if any) for already finished work.
 
-            migrator = DirectoryMigrator(destination_client=self.dst, source_directory=directory)
-            destination_directory = migrator.migrate()
+        :param str phase: The migration phase.
+        :param object resource: The source resource.
+        :rtype: str (or None)
+        :returns: The destination href, or None if the work isn't finished.
+        """
+        if self.journal:
+            return self.journal.get(phase, resource.href)
 
-            provider_id = dict(directory.provider).get('provider_id')
+    def record(self, phase, resource, destination):
+        """
+        Record finished work in the journal (if any).
 
-            if provider_id not in MIRROR_PROVIDER_IDS or provider_id == 'saml':
-                for group in directory.groups:
-                    migrator = GroupMigrator(destination_directory=destination_directory, source_group=group)
-                    migrator.migrate()
+        :param str phase: The migration phase.
+        :param object resource: The source resource.
+        :param object destination: The destination resource.
+        """
+        if self.journal and destination:
+            self.journal.record(phase, resource.href, destination.href)
 
-            if provider_id not in MIRROR_PROVIDER_IDS and provider_id != 'saml':
-                for account in directory.accounts:
-                    hash = None
-                    random_password = False
+    def map_builtin(self, lookup, resource):
+        """
+        Record the href mapping of a built in resource (eg: the Stormpath
+        Application), which is never migrated, but still exists in both
+        Tenants.
+
+        :param func lookup: A function returning the destination resource.
+        :param object resource: The source resource.
+        """
+        destination = self.attempt(lookup)
 
-                    with open(self.passwords, 'rb') as f:
-                        for raw_data in f:
-                            data = loads(raw_data)
+        if destination:
+            self.href_map.record(resource, destination)
+        else:
+            self.record_unmapped(resource)
+
+    def record_unmapped(self, resource):
+        """
+        Record that a source resource has no counterpart in the destination
+        (eg: it couldn't be copied), so that it still gets a row in the
+        mappings file.  Resources mapped before they failed are left alone.
+
+        :param object resource: The source resource.
+        """
+        if resource.href not in self.href_map:
+            self.href_map.set(resource.href, None)
+
+    def migrate_directory(self, directory):
+        """
+        Migrates one Directory, along with all of its Groups, Accounts,
+        GroupMemberships and Workflows.
 
-                            if data.get('href') == account.href:
-                                hash = data.get('password')
-                                break
+        The Directory is only recorded as finished once everything in it was
+        copied -- otherwise, a resumed migration would skip it, and never
+        retry the work that was given up on.  (Finished Groups and Accounts
+        are recorded individually, so they're still skipped.)
 
-                    if not hash:
-                        random_password = True
-                        logger.warning('No password hash found for Account: {}.  Using random password.'.format(account.username.encode('utf-8')))
+        :param object directory: The source Directory.
+        """
+        is_new = self.new_directories is None or directory.href in self.new_directories
+
+        # Directories created before the --from date only need to be looked
+        # up, not copied, so that their new Groups and Accounts have somewhere
+        # to go.
+        migrator = DirectoryMigrator(destination_client=self.dst, source_directory=directory, href_map=self.href_map)
+        destination_directory = None if is_new else self.attempt(migrator.get_destination_dir)
+        self.href_map.record(directory, destination_directory)
+
+        if not destination_directory:
+            is_new = True
+            destination_directory = self.attempt(migrator.migrate)
+
+        if not destination_directory:
+            logger.warning('Skipping Directory: {} (it could not be copied)'.format(directory.name.encode('utf-8')))
+            self.record_unmapped(directory)
+            return
+
+        provider_id = dict(directory.provider).get('provider_id')
+        failures = []
+        lock = Lock()
+
+        if provider_id not in MIRROR_PROVIDER_IDS or provider_id == 'saml':
+            for group in self.reader.groups(directory):
+                if self.finished('group', group):
+                    continue
+
+                migrator = GroupMigrator(destination_directory=destination_directory, source_group=group, href_map=self.href_map)
+                destination_group = self.attempt(migrator.migrate)
+                self.record('group', group, destination_group)
+
+                if not destination_group:
+                    failures.append(group.href)
+                    self.record_unmapped(group)
+
+        # Accounts are fanned out to their own bounded pool.  Since submit()
+        # blocks while the pool is busy, the source Account paginator never
+        # gets more than a page or so ahead of the workers.
+        #
+        # For full migrations, the destination Accounts are indexed up front,
+        # which is far cheaper than searching for each one.  Delta syncs only
+        # touch a handful of Accounts, so they search instead.
+        if provider_id not in MIRROR_PROVIDER_IDS and provider_id != 'saml':
+            account_index = None if self.from_date else self.index_accounts(destination_directory)
+
+            def migrate_account(account):
+                if not self.migrate_account(account, destination_directory, account_index):
+                    with lock:
+                        failures.append(account.href)
+
+            with WorkerPool(self.account_workers) as pool:
+                for account in self.reader.accounts(directory):
+                    pool.submit(migrate_account, account)
+
+        if provider_id not in MIRROR_PROVIDER_IDS and is_new:
+            migrator = DirectoryWorkflowMigrator(destination_directory=destination_directory, source_directory=directory)
+
+            if not self.attempt(migrator.migrate):
+                failures.append(directory.href)
+
+        if failures:
+            logger.warning('Not recording Directory: {} as finished ({} of its resources could not be copied).'.format(directory.name.encode('utf-8'), len(failures)))
+            return
+
+        self.record('directory', directory, destination_directory)
+
+    def index_accounts(self, destination_directory):
+        """
+        Index a destination Directory's Accounts (retrying as necessary).
+
+        If the index can't be built, the Directory's Accounts are searched for
+        one at a time instead.
+
+        :param object destination_directory: The destination Directory.
+        :rtype: object (or None)
+        :returns: The AccountIndex, or None.
+        """
+        name = destination_directory.name.encode('utf-8')
+
+        try:
+            return policy.call(lambda: AccountIndex(destination_directory).build(), 'Failed to index Accounts in destination Directory: {}'.format(name))
+        except RetryError:
+            logger.warning('Searching for each Account in destination Directory: {} instead.'.format(name))
+            return None
+
+    def migrate_account(self, account, destination_directory, account_index=None):
+        """
+        Migrates one Account, along with all of its GroupMemberships.
+
+        :param object account: The source Account.
+        :param object destination_directory: The destination Directory.
+        :param object account_index: The destination Directory's AccountIndex,
+            or None.
+        :rtype: bool
+        :returns: True if the Account and all of its GroupMemberships were
+            copied (or already finished), False otherwise.
+        """
+        if self.finished('account', account):
+            return True
 
-                    migrator = AccountMigrator(destination_directory=destination_directory, source_account=account, source_password=hash, random_password=random_password)
-                    migrated_account = migrator.migrate()
+        hash = self.password_index.get(account.href)
+        random_password = False
 
-                    if not migrated_account:
-                        continue
+        if not hash:
+            random_password = True
+            logger.warning('No password hash found for Account: {}.  Using random password.'.format(account.username.encode('utf-8')))
 
-                    for membership in account.group_memberships:
-                        migrator = GroupMembershipMigrator(destination_client=self.dst, source_group_membership=membership)
-                        migrator.migrate()
+        migrator = AccountMigrator(destination_directory=destination_directory, source_account=account, source_password=hash, random_password=random_password, account_index=account_index, expanded=True, href_map=self.href_map)
+        migrated_account = self.attempt(migrator.migrate)
 
-            if provider_id not in MIRROR_PROVIDER_IDS:
-                migrator = DirectoryWorkflowMigrator(destination_directory=destination_directory, source_directory=directory)
-                migrator.migrate()
+        if not migrated_account:
+            self.record_unmapped(account)
+            return False
 
-        for organization in self.src.tenant.organizations:
-            migrator = OrganizationMigrator(destination_client=self.dst, source_organization=organization)
-            destination_organization = migrator.migrate()
+        # The destination Account's memberships are indexed once (by the first
+        # GroupMembershipMigrator that needs them), then shared.  A freshly
+        # created Account can't have any memberships, so nothing is fetched.
+        existing_memberships = {} if migrator.created else None
+        complete = True
 
-            for mapping in organization.account_store_mappings:
-                migrator = OrganizationAccountStoreMappingMigrator(destination_organization=destination_organization, source_account_store_mapping=mapping)
-                migrator.migrate()
+        for membership in self.reader.group_memberships(account):
+            migrator = GroupMembershipMigrator(destination_client=self.dst, source_group_membership=membership, account_index=account_index, cache=self.lookup_cache, existing_memberships=existing_memberships)
+            complete = bool(self.attempt(migrator.migrate)) and complete
+            existing_memberships = migrator.existing_memberships
 
-        for application in self.src.applications:
+        # An Account with missing memberships isn't finished, so a resumed
+        # migration will retry them.
+        if complete:
+            self.record('account', account, migrated_account)
+
+        return complete
+
+    def migrate_organizations(self):
+        """
+        Migrates all Organizations, along with their AccountStoreMappings.
+        """
+        for organization in self.reader.organizations():
+            if self.finished('organization', organization):
+                continue
+
+            migrator = OrganizationMigrator(destination_client=self.dst, source_organization=organization, href_map=self.href_map)
+            destination_organization = self.attempt(migrator.migrate)
+
+            if not destination_organization:
+                self.record_unmapped(organization)
+                continue
+
+            # The destination Organization's existing mappings are indexed
+            # once, then shared by all of its mappings.
+            existing_mappings = {} if migrator.created else None
+            complete = True
+
+            for mapping in self.reader.account_store_mappings(organization):
+                migrator = OrganizationAccountStoreMappingMigrator(destination_organization=destination_organization, source_account_store_mapping=mapping, existing_mappings=existing_mappings)
+                complete = bool(self.attempt(migrator.migrate)) and complete
+                existing_mappings = migrator.existing_mappings
+
+            if complete:
+                self.record('organization', organization, destination_organization)
+
+    def migrate_applications(self):
+        """
+        Migrates all Applications, along with their AccountStoreMappings.
+        """
+        for application in self.reader.applications():
             if application.name == 'Stormpath':
+                self.map_builtin(ApplicationMigrator(destination_client=self.dst, source_application=application).get_destination_app, application)
+                continue
+
+            if self.finished('application', application):
+                continue
+
+            migrator = ApplicationMigrator(destination_client=self.dst, source_application=application, href_map=self.href_map)
+            destination_application = self.attempt(migrator.migrate)
+
+            if not destination_application:
+                self.record_unmapped(application)
                 continue
 
-            migrator = ApplicationMigrator(destination_client=self.dst, source_application=application)
-            destination_application = migrator.migrate()
+            # The destination Application's existing mappings are indexed
+            # once, then shared by all of its mappings.
+            existing_mappings = {} if migrator.created else None
+            complete = True
+
+            for mapping in self.reader.account_store_mappings(application):
+                migrator = ApplicationAccountStoreMappingMigrator(destination_application=destination_application, source_account_store_mapping=mapping, existing_mappings=existing_mappings)
+                complete = bool(self.attempt(migrator.migrate)) and complete
+                existing_mappings = migrator.existing_mappings
+
+            if complete:
+                self.record('application', application, destination_application)
+
+    def plan(self):
+        """
+        Work out what a migration would do (what it would create, update and
+        skip, and how many API calls that takes) without doing any of it.
+
+        The destination Client is made read only first, so nothing can
+        possibly be written.  If a journal is given and exists, the work it
+        lists as finished is planned as skipped; it's opened read only, so
+        it's never written to (or created).
+
+        :rtype: object
+        :returns: The Plan.
+        """
+        read_only(self.dst)
+
+        if self.journal_path and exists(self.journal_path):
+            self.journal = Journal(self.journal_path, read_only=True)
+
+        try:
+            return TenantPlanner(self.dst, self.reader, finished=self.finished, from_date=self.from_date).build()
+        finally:
+            self.href_map.close()
+
+            if self.snapshot:
+                self.reader.close()
 
-            for mapping in application.account_store_mappings:
-                migrator = ApplicationAccountStoreMappingMigrator(destination_application=destination_application, source_account_store_mapping=mapping)
-                migrator.migrate()
+            if self.journal:
+                self.journal.close()
 
-        migrator = SubstitutionMigrator(source_client=self.src, destination_client=self.dst)
+    def migrate(self):
+        """
+        Migrates one Tenant to another =)  Won't stop until the migration is
+        complete.
+
+        Directories are independent of each other, so they're migrated
+        concurrently when more than one worker is configured.  Organizations
+        and Applications are only migrated once all Directory work is done,
+        since their AccountStoreMappings depend on it.
+
+        If a journal is given, every finished Directory, Group, Account,
+        Organization and Application is recorded in it, and anything it
+        already lists is skipped without making any API calls for it.  A
+        resource with children is only finished once all of them are.
+
+        If a from_date is given, only resources created on or after that date
+        are fetched and copied.  Every Directory is still visited (it's cheap)
+        so that new Groups and Accounts in older Directories are picked up.
+
+        NOTE: This may take a longggg time to run.
+        """
+        self.password_index = PasswordIndex(self.passwords, on_disk=self.disk_index).build()
+
+        if self.journal_path:
+            self.journal = Journal(self.journal_path)
+            self.href_map.update(self.journal.hrefs())
+
+        if self.from_date:
+            self.new_directories = set(directory.href for directory in self.reader.directories(created_since=self.from_date))
+
+        with WorkerPool(self.workers) as pool:
+            for directory in self.reader.directories():
+                if directory.name == 'Stormpath Administrators':
+                    self.map_builtin(DirectoryMigrator(destination_client=self.dst, source_directory=directory).get_destination_dir, directory)
+                    continue
+
+                if self.finished('directory', directory):
+                    continue
+
+                pool.submit(self.migrate_directory, directory)
+
+        self.migrate_organizations()
+        self.migrate_applications()
+
+        # Every resource we copied (or failed to copy) has recorded its href
+        # mapping along the way, and a journal supplies the mappings of
+        # anything it skipped.  So the map only needs rebuilding when older
+        # resources were never visited.  Otherwise, only the resources we never
+        # copy (eg: the Groups and Accounts of Mirror Directories) are filled
+        # in.
+        #
+        # Likewise, only the resources flagged as mentioning source hrefs need
+        # their CustomData rewritten -- unless some resources were never
+        # inspected, because they were skipped.
+        href_map = None if self.from_date else self.href_map
+        inspected = not self.from_date and not (self.journal and self.journal.skipped)
+        flagged = self.href_map.flagged if inspected else None
+
+        migrator = SubstitutionMigrator(source_client=self.src, destination_client=self.dst, reader=self.reader.unfiltered(), href_map=href_map, workers=self.workers, flagged=flagged, writer=self.mappings, disk_index=self.disk_index)
         migrator.migrate()
+
+        self.summarize()
+        self.password_index.close()
+        self.href_map.close()
+
+        if self.snapshot:
+            self.reader.close()
+
+        if self.journal:
+            self.journal.close()
@@ -0,0 +1,332 @@
+"""Dry run planning: what a migration would do, without doing any of it."""
+
+
+from collections import defaultdict
+
+from . import logger
+from .constants import MIRROR_PROVIDER_IDS, SAML_PROVIDER_ID, SOCIAL_PROVIDER_IDS, STORMPATH_PROVIDER_ID
+from .indexes import AccountIndex, index_hrefs, index_memberships
+from .mappings import contains_hrefs, get_base_url
+
+
+# The resource types a plan covers, in the order they're migrated.
+RESOURCE_TYPES = ['directory', 'mirror_directory', 'group', 'account', 'group_membership', 'organization', 'application', 'account_store_mapping', 'custom_data']
+
+# Roughly how many destination lookups (reads) and writes the migrators make
+# to create or update one resource of each type.  Directory writes include
+# their CustomData, Strength, and Workflow policies and templates -- except
+# for Mirror Directories, which only have CustomData.  These are estimates,
+# and tests/test_planner.py checks them against the migrators.
+LOOKUPS = {
+    'directory': 1,
+    'mirror_directory': 1,
+    'group': 1,
+    'account': 0,
+    'group_membership': 1,
+    'organization': 1,
+    'application': 1,
+    'account_store_mapping': 1,
+    'custom_data': 1,
+}
+WRITES = {
+    'directory': 11,
+    'mirror_directory': 2,
+    'group': 2,
+    'account': 2,
+    'group_membership': 1,
+    'organization': 2,
+    'application': 3,
+    'account_store_mapping': 1,
+    'custom_data': 1,
+}
+
+# The request rate assumed for estimates, when none is given.
+DEFAULT_RATE = 10.0
+
+
+class Plan(object):
+    """
+    The number of resources of each type a migration would create, update or
+    skip, along with the API requests that implies.
+    """
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.source_reads = 0
+        self.destination_reads = 0
+
+    def add(self, type, action):
+        """
+        Plan an action for one resource.
+
+        :param str type: The resource type (eg: 'account').
+        :param str action: 'create', 'update' or 'skip'.
+        """
+        self.counts[(type, action)] += 1
+
+        if action != 'skip':
+            self.destination_reads += LOOKUPS[type]
+
+    @property
+    def writes(self):
+        """
+        The estimated number of write requests.
+        """
+        return sum(WRITES[type] * count for (type, action), count in self.counts.items() if action != 'skip')
+
+    @property
+    def reads(self):
+        """
+        The estimated number of read requests, to both Tenants.
+        """
+        return self.source_reads + self.destination_reads
+
+    def estimate_time(self, read_rate=None, write_rate=None):
+        """
+        Estimate how long the migration would take, if every request were
+        made at the given rates.
+
+        Like the --read-rate and --write-rate budgets, the read rate covers
+        requests to the source Tenant, and the write rate covers all requests
+        (lookups included) to the destination Tenant.
+
+        :param float read_rate: Source requests per second (or None, for the
+            default).
+        :param float write_rate: Destination requests per second (or None,
+            for the default).
+        :rtype: float
+        :returns: The estimated number of seconds.
+        """
+        read_rate = float(read_rate or DEFAULT_RATE)
+        write_rate = float(write_rate or DEFAULT_RATE)
+
+        return self.source_reads / read_rate + (self.destination_reads + self.writes) / write_rate
+
+    def summarize(self, read_rate=None, write_rate=None):
+        """
+        Log the plan.
+
+        :param float read_rate: Source requests per second (or None, for the
+            default).
+        :param float write_rate: Destination requests per second (or None,
+            for the default).
+        """
+        logger.info('Estimated migration plan (dry run -- nothing was written):')
+
+        for type in RESOURCE_TYPES:
+            counts = [self.counts[(type, action)] for action in ['create', 'update', 'skip']]
+
+            if any(counts):
+                logger.info('  {}: {} to create, {} to update, {} to skip.'.format(type.replace('_', ' ').title(), *counts))
+
+        logger.info('Estimated API requests: {} reads ({} source, {} destination), {} writes.'.format(self.reads, self.source_reads, self.destination_reads, self.writes))
+        logger.info('Estimated time: {:.1f} minutes at {:g} source and {:g} destination requests per second.'.format(self.estimate_time(read_rate, write_rate) / 60, read_rate or DEFAULT_RATE, write_rate or DEFAULT_RATE))
+
+
+class TenantPlanner(object):
+    """
+    This class walks a source (Tenant or snapshot) and the destination Tenant,
+    and works out what a migration would do to each resource.
+
+    Resources are matched exactly the way the migrators match them (by name,
+    username or email), but destination collections are indexed in bulk
+    rather than searched.  Nothing is ever written.
+
+    If a from_date is given, Directories created before it are only looked
+    up (and skipped), just like a delta sync does.
+    """
+    def __init__(self, dst, reader, finished=None, from_date=None):
+        self.dst = dst
+        self.reader = reader
+        self.finished = finished or (lambda phase, resource: None)
+        self.from_date = from_date
+        self.plan = Plan()
+
+    def plan_custom_data(self, resource):
+        """
+        Plan the HREF rewrite of a resource's CustomData.
+
+        :param object resource: The source resource, with its CustomData
+            expanded.
+        """
+        if contains_hrefs(resource.custom_data, get_base_url(resource.href)):
+            self.plan.add('custom_data', 'update')
+
+    def get_destination_account(self, account, destination_directory, account_index=None):
+        """
+        Match a source Account in the destination Directory: through its
+        AccountIndex, if there is one, or else by searching on username and
+        then email (exactly like an AccountMigrator does).
+
+        :param object account: The source Account.
+        :param object destination_directory: The destination Directory, or
+            None.
+        :param object account_index: The destination Directory's AccountIndex,
+            or None.
+        :rtype: object (or None)
+        :returns: The destination Account, or None.
+        """
+        if account_index:
+            return account_index.get(username=account.username, email=account.email)
+
+        if not destination_directory:
+            return None
+
+        for params in [{'username': account.username}, {'email': account.email}]:
+            matches = destination_directory.accounts.search(params)
+            self.plan.destination_reads += 1
+
+            if len(matches) > 0:
+                return matches[0]
+
+    def plan_directory(self, directory, destination_directory, copy=True):
+        """
+        Plan the migration of one Directory, along with all of its Groups,
+        Accounts and GroupMemberships.
+
+        :param object directory: The source Directory.
+        :param object destination_directory: The matching destination
+            Directory, or None.
+        :param bool copy: Whether the Directory itself is copied, or only
+            looked up (for delta syncs).
+        """
+        plan = self.plan
+        provider_id = dict(directory.provider).get('provider_id')
+        type = 'mirror_directory' if provider_id in MIRROR_PROVIDER_IDS else 'directory'
+
+        if copy:
+            plan.add(type, 'update' if destination_directory else 'create')
+            self.plan_custom_data(directory)
+        else:
+            plan.add(type, 'skip')
+            plan.destination_reads += LOOKUPS[type]
+
+        groups = index_hrefs(destination_directory.groups, lambda group: group.name) if destination_directory else {}
+
+        if provider_id not in MIRROR_PROVIDER_IDS or provider_id == SAML_PROVIDER_ID:
+            for group in self.reader.groups(directory):
+                if self.finished('group', group):
+                    plan.add('group', 'skip')
+                    continue
+
+                plan.add('group', 'update' if group.name in groups else 'create')
+                self.plan_custom_data(group)
+
+        if provider_id in MIRROR_PROVIDER_IDS or provider_id == SAML_PROVIDER_ID:
+            return
+
+        account_index = None
+
+        # Full migrations index the destination Accounts up front, but delta
+        # syncs search for each Account instead.
+        if destination_directory and not self.from_date:
+            account_index = AccountIndex(destination_directory).build()
+            plan.destination_reads += len(account_index.usernames) // AccountIndex.PAGE_SIZE + 1
+
+        for account in self.reader.accounts(directory):
+            if self.finished('account', account):
+                plan.add('account', 'skip')
+                continue
+
+            destination_account = self.get_destination_account(account, destination_directory, account_index)
+            account_provider_id = dict(account.provider_data).get('provider_id')
+
+            # Accounts that are neither Cloud nor Social Accounts are never
+            # created.
+            if not destination_account and account_provider_id not in SOCIAL_PROVIDER_IDS + [STORMPATH_PROVIDER_ID]:
+                plan.add('account', 'skip')
+                continue
+
+            plan.add('account', 'update' if destination_account else 'create')
+            self.plan_custom_data(account)
+
+            memberships = {}
+            if destination_account:
+                memberships = index_memberships(destination_account)
+                plan.destination_reads += 1
+
+            for membership in self.reader.group_memberships(account):
+                exists = groups.get(membership.group.name) in memberships
+                plan.add('group_membership', 'skip' if exists else 'create')
+
+    def plan_account_store_mappings(self, owner, destination_owner):
+        """
+        Plan the migration of an Application's or Organization's
+        AccountStoreMappings.
+
+        :param object owner: The source Application or Organization.
+        :param object destination_owner: The matching destination Application
+            or Organization, or None.
+        """
+        existing = set()
+
+        if destination_owner:
+            for mapping in destination_owner.account_store_mappings.query(expand='accountStore', limit=100):
+                existing.add((mapping.account_store.__class__.__name__, mapping.account_store.name))
+
+            self.plan.destination_reads += 1
+
+        for mapping in self.reader.account_store_mappings(owner):
+            account_store = mapping.account_store
+            exists = (account_store.__class__.__name__, account_store.name) in existing
+
+            self.plan.add('account_store_mapping', 'skip' if exists else 'create')
+
+    def plan_owners(self, type, sources, destinations, builtin=None):
+        """
+        Plan the migration of all Organizations or Applications, along with
+        their AccountStoreMappings.
+
+        :param str type: 'organization' or 'application'.
+        :param iterable sources: The source resources.
+        :param iterable destinations: The destination resources.
+        :param str builtin: The name of a built in resource that is never
+            migrated, or None.
+        """
+        destinations = dict((resource.name, resource) for resource in destinations)
+        self.plan.destination_reads += len(destinations) // 100 + 1
+
+        for resource in sources:
+            if resource.name == builtin or self.finished(type, resource):
+                self.plan.add(type, 'skip')
+                continue
+
+            destination = destinations.get(resource.name)
+
+            self.plan.add(type, 'update' if destination else 'create')
+            self.plan_custom_data(resource)
+            self.plan_account_store_mappings(resource, destination)
+
+    def build(self):
+        """
+        Work out the whole migration plan.
+
+        :rtype: object
+        :returns: The Plan.
+        """
+        dc = self.dst
+
+        directories = dict((directory.name, directory) for directory in dc.directories.query(limit=100))
+        self.plan.destination_reads += len(directories) // 100 + 1
+
+        new_directories = None
+        if self.from_date:
+            new_directories = set(directory.href for directory in self.reader.directories(created_since=self.from_date))
+
+        for directory in self.reader.directories():
+            if directory.name == 'Stormpath Administrators' or self.finished('directory', directory):
+                self.plan.add('directory', 'skip')
+                continue
+
+            # Directories that already existed before the --from date are
+            # only copied if they're missing from the destination.
+            destination_directory = directories.get(directory.name)
+            is_new = new_directories is None or directory.href in new_directories
+
+            self.plan_directory(directory, destination_directory, copy=is_new or not destination_directory)
+
+        self.plan_owners('organization', self.reader.organizations(), dc.tenant.organizations.query(limit=100))
+        self.plan_owners('application', self.reader.applications(), dc.applications.query(limit=100), builtin='Stormpath')
+
+        self.plan.source_reads = sum(getattr(self.reader, 'pages', {}).values())
+
+        return self.plan
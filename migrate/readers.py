@@ -0,0 +1,152 @@
+"""Readers, used to walk the resources of a source Tenant."""
+
+
+from collections import defaultdict
+from math import ceil
+from threading import Lock
+
+from . import logger
+from .retry import policy
+
+
+class SourceReader(object):
+    """
+    This class walks the collections of a source Tenant.
+
+    Every walk asks Stormpath to expand the linked resources the migrators are
+    going to read (CustomData, ProviderData, etc.), so they arrive inline with
+    each page instead of being lazily fetched one at a time.
+
+    If a page_size is given, every walk uses it (up to the API maximum of 100)
+    instead of Stormpath's default.  The number of pages fetched is estimated
+    per collection (from the number of resources walked, since the SDK pages
+    through collections by itself).
+
+    If a from_date is given, Groups, Accounts, Organizations and Applications
+    are filtered down (server side) to those created on or after that date.
+
+    Every page fetch is retried by the shared retry policy: a walk that fails
+    part way through picks up where it left off.
+    """
+    DEFAULT_PAGE_SIZE = 25
+    MAX_PAGE_SIZE = 100
+
+    DIRECTORY_EXPANSION = 'customData'
+    GROUP_EXPANSION = 'customData'
+    ACCOUNT_EXPANSION = 'customData,providerData'
+    GROUP_MEMBERSHIP_EXPANSION = 'account,group'
+    ORGANIZATION_EXPANSION = 'customData'
+    APPLICATION_EXPANSION = 'customData'
+    ACCOUNT_STORE_MAPPING_EXPANSION = 'accountStore'
+
+    def __init__(self, client, from_date=None, page_size=None):
+        self.client = client
+        self.from_date = from_date
+        self.page_size = min(page_size, self.MAX_PAGE_SIZE) if page_size else None
+        self.pages = defaultdict(int)
+        self.lock = Lock()
+
+    def unfiltered(self):
+        """
+        Create a reader for the same Tenant that ignores the from_date.  Page
+        counts are shared with this reader.
+
+        :rtype: object
+        :returns: A SourceReader.
+        """
+        reader = SourceReader(self.client, page_size=self.page_size)
+        reader.pages = self.pages
+        reader.lock = self.lock
+
+        return reader
+
+    def walk(self, name, collection, expand=None, created_since=None):
+        """
+        Query a collection, and iterate over it.
+
+        :param str name: The collection name, used for page counts.
+        :param object collection: The Stormpath collection to walk.
+        :param str expand: The linked resources to expand, or None.
+        :param str created_since: The earliest creation date (eg: 2010-01-03)
+            to include, or None.
+        :rtype: generator
+        :returns: A generator of resources.
+        """
+        params = {}
+
+        if expand:
+            params['expand'] = expand
+
+        if created_since:
+            params['createdAt'] = '[{},]'.format(created_since)
+
+        if self.page_size:
+            params['limit'] = self.page_size
+
+        def query(offset):
+            if offset:
+                return collection.query(offset=offset, **params)
+
+            return collection.query(**params) if params else collection
+
+        items = 0
+        for resource in policy.walk(query, 'Failed to fetch source {}'.format(name.replace('_', ' ').title())):
+            items += 1
+            yield resource
+
+        # Every walk fetches at least one page, even if it's empty.
+        with self.lock:
+            self.pages[name] += max(int(ceil(items / float(self.page_size or self.DEFAULT_PAGE_SIZE))), 1)
+
+    def directories(self, created_since=None):
+        """
+        Walk the Tenant's Directories.  Directories are only filtered by date
+        when explicitly asked to.
+        """
+        return self.walk('directories', self.client.directories, self.DIRECTORY_EXPANSION, created_since)
+
+    def groups(self, directory=None):
+        """
+        Walk a Directory's Groups (or the whole Tenant's Groups).
+        """
+        groups = directory.groups if directory else self.client.groups
+        return self.walk('groups', groups, self.GROUP_EXPANSION, self.from_date)
+
+    def accounts(self, directory):
+        """
+        Walk a Directory's Accounts.
+        """
+        return self.walk('accounts', directory.accounts, self.ACCOUNT_EXPANSION, self.from_date)
+
+    def group_memberships(self, account):
+        """
+        Walk an Account's GroupMemberships.
+        """
+        return self.walk('group_memberships', account.group_memberships, self.GROUP_MEMBERSHIP_EXPANSION)
+
+    def organizations(self):
+        """
+        Walk the Tenant's Organizations.
+        """
+        return self.walk('organizations', self.client.tenant.organizations, self.ORGANIZATION_EXPANSION, self.from_date)
+
+    def applications(self):
+        """
+        Walk the Tenant's Applications.
+        """
+        return self.walk('applications', self.client.applications, self.APPLICATION_EXPANSION, self.from_date)
+
+    def account_store_mappings(self, owner):
+        """
+        Walk an Application's or Organization's AccountStoreMappings.
+        """
+        return self.walk('account_store_mappings', owner.account_store_mappings, self.ACCOUNT_STORE_MAPPING_EXPANSION)
+
+    def summarize(self):
+        """
+        Log estimated page counts.
+        """
+        page_size = self.page_size or self.DEFAULT_PAGE_SIZE
+
+        for name, pages in sorted(self.pages.items()):
+            logger.info('Fetched an estimated {} pages of source {} ({} per page).'.format(pages, name.replace('_', ' ').title(), page_size))
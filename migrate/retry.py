@@ -0,0 +1,200 @@
+"""A retry policy, shared by all migrators, for Stormpath API calls."""
+
+
+from random import uniform
+from threading import Lock, local
+from time import sleep
+
+from stormpath.error import Error as StormpathError
+
+from . import logger
+
+
+# The Retry-After header of the last HTTP response each thread received (see
+# transport.track_retry_after).  Stormpath errors don't carry their response's
+# headers, so this is the only way to see it.
+responses = local()
+
+
+class RetryError(Exception):
+    """
+    Raised when a call has been given up on (and dead lettered).
+    """
+    pass
+
+
+def get_retry_after(err):
+    """
+    Retrieve the number of seconds the API asked us to wait before retrying.
+
+    Only throttling (429) and unavailable (503) errors are checked, since only
+    they send Retry-After -- and since they came with a response, the last
+    response this thread received is the one that failed.
+
+    :param object err: The Stormpath error.
+    :rtype: float (or None)
+    :returns: The number of seconds to wait, or None if the API didn't say.
+    """
+    if getattr(err, 'status', None) not in [429, 503]:
+        return None
+
+    value = getattr(responses, 'retry_after', None)
+
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy(object):
+    """
+    This class retries failed Stormpath API calls.
+
+    Throttling (429), timeouts (408), server errors (5xx) and network errors
+    (no status) are retried with capped exponential backoff and full jitter,
+    honouring Retry-After when the API sends it (and the Client's responses
+    are tracked with transport.track_retry_after).  Any other 4xx error will
+    never succeed, so it's dead lettered right away, as is any call that runs
+    out of attempts.
+
+    NOTE: The Stormpath SDK already retries throttling and server errors a few
+    times on its own before raising them, so these retries (and their delays)
+    come on top of the SDK's.
+    """
+    RETRYABLE_STATUSES = [408, 429]
+
+    def __init__(self, max_attempts=10, base_delay=0.5, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.dead_letters = []
+        self.lock = Lock()
+
+    def is_retryable(self, err):
+        """
+        Check whether a failed call is worth retrying.
+
+        :param object err: The Stormpath error.
+        :rtype: bool
+        :returns: True if the call should be retried, False otherwise.
+        """
+        status = getattr(err, 'status', None)
+        return not status or status in self.RETRYABLE_STATUSES or status >= 500
+
+    def get_delay(self, err, attempt):
+        """
+        Compute how long to wait before the next attempt.
+
+        :param object err: The Stormpath error.
+        :param int attempt: The number of attempts made so far.
+        :rtype: float
+        :returns: The number of seconds to wait.
+        """
+        retry_after = get_retry_after(err)
+        if retry_after is not None:
+            return retry_after
+
+        return uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def backoff(self, err, attempt, message):
+        """
+        Deal with a failed attempt: wait before the next one, or give up on
+        the call (dead lettering it) if it can't succeed.
+
+        :param object err: The Stormpath error.
+        :param int attempt: The number of attempts made so far.
+        :param str message: A description of the failure.
+        :raises: RetryError if the call was given up on.
+        """
+        if not self.is_retryable(err) or attempt >= self.max_attempts:
+            logger.error('{} ({}).  Giving up after {} attempt(s).'.format(message, err, attempt))
+
+            with self.lock:
+                self.dead_letters.append((message, err))
+
+            raise RetryError(message)
+
+        delay = self.get_delay(err, attempt)
+        logger.error('{} ({}).  Retrying in {:.1f} seconds.'.format(message, err, delay))
+
+        with self.lock:
+            self.retries += 1
+
+        sleep(delay)
+
+    def call(self, func, message):
+        """
+        Call func(), retrying it as necessary.
+
+        :param func func: The function making the API call.
+        :param str message: A description of the failure, logged (along with
+            the error) whenever the call fails.
+        :rtype: object
+        :returns: Whatever func() returns.
+        :raises: RetryError if the call was given up on.
+        """
+        attempt = 0
+
+        while True:
+            try:
+                return func()
+            except StormpathError as err:
+                attempt += 1
+                self.backoff(err, attempt, message)
+
+    def walk(self, query, message):
+        """
+        Iterate over a paginated collection, retrying as necessary.
+
+        Pages are fetched lazily while iterating, so a fetch can fail part way
+        through a walk.  When it does, the walk is resumed from the first
+        resource that wasn't yielded yet, rather than started over.
+
+        :param func query: A function taking an offset, and returning an
+            iterable of the collection's resources from that offset on.
+        :param str message: A description of the failure.
+        :rtype: generator
+        :returns: A generator of resources.
+        :raises: RetryError if the walk was given up on.
+        """
+        offset = 0
+        attempt = 0
+
+        while True:
+            try:
+                for resource in query(offset):
+                    offset += 1
+                    attempt = 0
+                    yield resource
+
+                return
+            except StormpathError as err:
+                attempt += 1
+                self.backoff(err, attempt, message)
+
+    def save(self, resource, message):
+        """
+        Save a resource, retrying as necessary.
+
+        :param object resource: The resource to save.
+        :param str message: A description of the failure.
+        :rtype: object
+        :returns: The saved resource.
+        :raises: RetryError if the save was given up on.
+        """
+        self.call(resource.save, message)
+        return resource
+
+    def summarize(self):
+        """
+        Log retry statistics, along with every dead lettered call.
+        """
+        logger.info('Retried {} failed API calls, gave up on {}.'.format(self.retries, len(self.dead_letters)))
+
+        for message, err in self.dead_letters:
+            logger.warning('Dead letter: {} ({})'.format(message, err))
+
+
+# The retry policy shared by all migrators.
+policy = RetryPolicy()
@@ -0,0 +1,461 @@
+"""Local snapshots of a source Tenant, stored as chunked, gzipped NDJSON."""
+
+
+from collections import defaultdict
+from datetime import datetime
+from glob import glob
+from gzip import open as gzip_open
+from json import dump, dumps, load, loads
+from mmap import ACCESS_READ, mmap
+from os import fdopen, makedirs, remove
+from os.path import exists, join
+from tempfile import mkstemp
+from threading import Lock
+
+from . import logger
+
+
+# The snapshot format version, recorded in every manifest.
+SNAPSHOT_VERSION = 1
+
+# The name of the file describing a snapshot's contents.
+MANIFEST_FILE = 'manifest.json'
+
+# The collections stored in a snapshot, in the order they're written.
+COLLECTIONS = ['directories', 'groups', 'accounts', 'organizations', 'applications']
+
+
+class ChunkWriter(object):
+    """
+    Writes one collection of a snapshot as a series of gzipped NDJSON files,
+    each holding at most `chunk_size` records.
+
+    Every chunk also remembers which parents (eg: Directories, for Accounts)
+    its records belong to, so that a reader can find all of a parent's
+    children without scanning the whole collection.
+    """
+    def __init__(self, path, name, chunk_size=10000):
+        self.path = path
+        self.name = name
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.file = None
+        self.count = 0
+
+    def open_chunk(self):
+        """
+        Start a new chunk file.
+        """
+        filename = '{}-{:04d}.ndjson.gz'.format(self.name, len(self.chunks))
+
+        self.file = gzip_open(join(self.path, filename), 'wb')
+        self.chunks.append({'file': filename, 'count': 0, 'parents': []})
+
+    def close_chunk(self):
+        """
+        Finish the current chunk file, if any.
+        """
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def write(self, record, parent=None):
+        """
+        Write a record.
+
+        :param dict record: The JSON record.
+        :param str parent: The href of the record's parent, or None.
+        """
+        if not self.file or self.chunks[-1]['count'] >= self.chunk_size:
+            self.close_chunk()
+            self.open_chunk()
+
+        chunk = self.chunks[-1]
+        if parent and parent not in chunk['parents'][-1:]:
+            chunk['parents'].append(parent)
+
+        self.file.write(dumps(record, default=str) + '\n')
+        chunk['count'] += 1
+        self.count += 1
+
+    def close(self):
+        """
+        Finish writing the collection.
+
+        :rtype: list
+        :returns: A list of chunk descriptions, for the manifest.
+        """
+        self.close_chunk()
+        return self.chunks
+
+
+class SnapshotWriter(object):
+    """
+    Writes a snapshot of a Tenant into a local directory.
+
+    Each collection is split into compressed chunks, and a manifest describing
+    them (and the Tenant they came from) is written last -- so a snapshot with
+    no manifest is an incomplete one.  Exporting into an existing snapshot
+    removes its manifest (and chunks) first, so that an interrupted re-export
+    can't leave a manifest pointing at half-overwritten chunks.
+    """
+    def __init__(self, path, base_url=None, chunk_size=10000):
+        self.path = path
+        self.base_url = base_url
+
+        if not exists(path):
+            makedirs(path)
+
+        if exists(join(path, MANIFEST_FILE)):
+            remove(join(path, MANIFEST_FILE))
+
+        for name in COLLECTIONS:
+            for chunk in glob(join(path, '{}-*.ndjson.gz'.format(name))):
+                remove(chunk)
+
+        self.writers = dict((name, ChunkWriter(path, name, chunk_size)) for name in COLLECTIONS)
+
+    def write(self, collection, record, parent=None):
+        """
+        Write a record to one of the snapshot's collections.
+
+        :param str collection: The collection name (eg: 'accounts').
+        :param dict record: The JSON record.
+        :param str parent: The href of the record's parent, or None.
+        """
+        self.writers[collection].write(record, parent)
+
+    def close(self):
+        """
+        Finish every collection, and write the manifest.
+        """
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'base_url': self.base_url,
+            'exported_at': datetime.utcnow().isoformat(),
+            'collections': dict((name, writer.close()) for name, writer in self.writers.items()),
+        }
+
+        with open(join(self.path, MANIFEST_FILE), 'wb') as f:
+            dump(manifest, f, indent=2)
+
+        for name in COLLECTIONS:
+            logger.info('Wrote {} {} to snapshot: {}'.format(self.writers[name].count, name, self.path))
+
+
+def wrap(value):
+    """
+    Wrap a JSON value read from a snapshot, so that (nested) objects can be
+    read like Stormpath resources.
+
+    :param object value: The JSON value.
+    :rtype: object
+    :returns: The wrapped value.
+    """
+    if isinstance(value, SnapshotResource):
+        return value
+
+    if isinstance(value, dict):
+        return SnapshotResource(value)
+
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+
+    return value
+
+
+class SnapshotResource(dict):
+    """
+    A read only resource loaded from a snapshot.
+
+    It behaves like the Stormpath resource it was exported from, as far as
+    the migrators are concerned: fields can be read as attributes or items,
+    and dict() turns it back into plain data.
+    """
+    def __init__(self, data, reader=None):
+        super(SnapshotResource, self).__init__(data)
+        self.reader = reader
+
+    def __getattr__(self, name):
+        try:
+            return wrap(self[name])
+        except KeyError:
+            raise AttributeError(name)
+
+
+class Directory(SnapshotResource):
+    pass
+
+
+class Organization(SnapshotResource):
+    pass
+
+
+class Application(SnapshotResource):
+    pass
+
+
+class Group(SnapshotResource):
+    @property
+    def directory(self):
+        return self.reader.get_directory(self['directory'])
+
+
+class Account(SnapshotResource):
+    @property
+    def directory(self):
+        return self.reader.get_directory(self['directory'])
+
+
+class GroupMembership(SnapshotResource):
+    pass
+
+
+class AccountStoreMapping(SnapshotResource):
+    pass
+
+
+# The resource classes AccountStores are loaded as, by type.
+ACCOUNT_STORE_TYPES = {
+    'Directory': Directory,
+    'Group': Group,
+    'Organization': Organization,
+}
+
+
+class RecordIndex(object):
+    """
+    A random access index over one collection of a snapshot.
+
+    The collection's (compressed) chunks are unpacked once into a temporary
+    file, which is memory mapped, and only each record's offset is kept in
+    memory.  Records are parsed on demand.
+    """
+    def __init__(self, paths):
+        self.offsets = {}
+
+        fd, self.path = mkstemp(prefix='stormpath-snapshot-', suffix='.ndjson')
+        offset = 0
+
+        with fdopen(fd, 'wb') as f:
+            for path in paths:
+                with gzip_open(path, 'rb') as chunk:
+                    for line in chunk:
+                        self.offsets[loads(line)['href']] = offset
+                        f.write(line)
+                        offset += len(line)
+
+        with open(self.path, 'rb') as f:
+            self.map = mmap(f.fileno(), 0, access=ACCESS_READ) if offset else None
+
+    def get(self, href):
+        """
+        Load a record.
+
+        :param str href: The record's href.
+        :rtype: dict (or None)
+        :returns: The record, or None.
+        """
+        offset = self.offsets.get(href)
+
+        if offset is None:
+            return None
+
+        return loads(self.map[offset:self.map.find('\n', offset)])
+
+    def close(self):
+        """
+        Release the index, removing its temporary file.
+        """
+        if self.map:
+            self.map.close()
+
+        remove(self.path)
+
+
+class SnapshotReader(object):
+    """
+    This class walks the collections of a snapshot, exactly like a
+    SourceReader walks a live source Tenant.
+
+    Collections are streamed straight from their compressed chunks; only the
+    chunks holding a given parent's children are read.  Directories and Groups
+    (which Accounts and GroupMemberships link to) are also indexed for random
+    access.
+
+    If a from_date is given, Groups, Accounts, Organizations and Applications
+    are filtered down to those created on or after that date.
+    """
+    def __init__(self, path, from_date=None):
+        self.path = path
+        self.from_date = from_date
+        self.records = defaultdict(int)
+        self.indexes = {}
+        self.lock = Lock()
+
+        manifest_path = join(path, MANIFEST_FILE)
+        if not exists(manifest_path):
+            raise ValueError('No manifest found in snapshot: {} (was the export finished?)'.format(path))
+
+        with open(manifest_path, 'rb') as f:
+            self.manifest = load(f)
+
+        if self.manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version: {}'.format(self.manifest.get('version')))
+
+        logger.info('Opened snapshot: {} (exported at {}).'.format(path, self.manifest['exported_at']))
+
+    def unfiltered(self):
+        """
+        Create a reader for the same snapshot that ignores the from_date.
+        Record counts and indexes are shared with this reader.
+
+        :rtype: object
+        :returns: A SnapshotReader.
+        """
+        reader = SnapshotReader.__new__(SnapshotReader)
+        reader.__dict__.update(self.__dict__)
+        reader.from_date = None
+
+        return reader
+
+    def read(self, name, parent=None):
+        """
+        Stream the records of a collection.
+
+        :param str name: The collection name.
+        :param str parent: Only read the chunks holding children of this
+            parent href, or None.
+        :rtype: generator
+        :returns: A generator of records.
+        """
+        for chunk in self.manifest['collections'][name]:
+            if parent and parent not in chunk['parents']:
+                continue
+
+            with gzip_open(join(self.path, chunk['file']), 'rb') as f:
+                for line in f:
+                    yield loads(line)
+
+    def walk(self, name, klass, parent=None, created_since=None):
+        """
+        Iterate over a collection's resources.
+
+        :param str name: The collection name, used for record counts.
+        :param class klass: The resource class to load records as.
+        :param str parent: Only include children of this Directory href, or
+            None.
+        :param str created_since: The earliest creation date (eg: 2010-01-03)
+            to include, or None.
+        :rtype: generator
+        :returns: A generator of resources.
+        """
+        items = 0
+
+        for record in self.read(name, parent):
+            if parent and record.get('directory') != parent:
+                continue
+
+            if created_since and (record.get('created_at') or '') < created_since:
+                continue
+
+            items += 1
+            yield klass(record, self)
+
+        with self.lock:
+            self.records[name] += items
+
+    def get_index(self, name):
+        """
+        Retrieve (building it, if necessary) a collection's RecordIndex.
+
+        :param str name: The collection name.
+        :rtype: object
+        :returns: A RecordIndex.
+        """
+        with self.lock:
+            if name not in self.indexes:
+                self.indexes[name] = RecordIndex([join(self.path, chunk['file']) for chunk in self.manifest['collections'][name]])
+
+            return self.indexes[name]
+
+    def get_directory(self, href):
+        """
+        Look up a Directory by href.
+        """
+        record = self.get_index('directories').get(href)
+        return Directory(record, self) if record else None
+
+    def get_group(self, href):
+        """
+        Look up a Group by href.
+        """
+        record = self.get_index('groups').get(href)
+        return Group(record, self) if record else None
+
+    def directories(self, created_since=None):
+        """
+        Walk the snapshot's Directories.  Directories are only filtered by
+        date when explicitly asked to.
+        """
+        return self.walk('directories', Directory, created_since=created_since)
+
+    def groups(self, directory=None):
+        """
+        Walk a Directory's Groups (or the whole snapshot's Groups).
+        """
+        return self.walk('groups', Group, directory.href if directory else None, self.from_date)
+
+    def accounts(self, directory):
+        """
+        Walk a Directory's Accounts.
+        """
+        return self.walk('accounts', Account, directory.href, self.from_date)
+
+    def group_memberships(self, account):
+        """
+        Walk an Account's GroupMemberships.
+        """
+        for record in account['group_memberships']:
+            group = self.get_group(record['group'])
+
+            if group:
+                yield GroupMembership({'href': record['href'], 'account': account, 'group': group}, self)
+
+    def organizations(self):
+        """
+        Walk the snapshot's Organizations.
+        """
+        return self.walk('organizations', Organization, created_since=self.from_date)
+
+    def applications(self):
+        """
+        Walk the snapshot's Applications.
+        """
+        return self.walk('applications', Application, created_since=self.from_date)
+
+    def account_store_mappings(self, owner):
+        """
+        Walk an Application's or Organization's AccountStoreMappings.
+        """
+        for record in owner['account_store_mappings']:
+            account_store = record['account_store']
+            klass = ACCOUNT_STORE_TYPES[account_store['type']]
+
+            yield AccountStoreMapping(dict(record, account_store=klass(account_store, self)), self)
+
+    def close(self):
+        """
+        Release the snapshot's indexes.
+        """
+        for index in self.indexes.values():
+            index.close()
+
+        self.indexes = {}
+
+    def summarize(self):
+        """
+        Log record counts.
+        """
+        for name, records in sorted(self.records.items()):
+            logger.info('Read {} {} from snapshot.'.format(records, name.replace('_', ' ').title()))
@@ -0,0 +1,190 @@
+"""Transport level tuning for the Stormpath Clients used in a migration."""
+
+
+from threading import Lock
+from time import sleep, time
+
+from requests.adapters import HTTPAdapter
+
+from . import logger
+from .retry import responses
+
+
+class TokenBucket(object):
+    """
+    A thread safe token bucket, used to cap a request rate.
+
+    Every request takes one token.  Tokens refill continuously at `rate` per
+    second, up to `burst` tokens.  A caller that finds the bucket empty
+    reserves the next free token and sleeps until it's due -- so concurrent
+    callers are served in order, and the overall rate never exceeds the
+    budget.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, 1))
+        self.tokens = self.burst
+        self.updated = time()
+        self.requests = 0
+        self.waited = 0.0
+        self.lock = Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if necessary.
+
+        :rtype: float
+        :returns: The number of seconds spent waiting.
+        """
+        with self.lock:
+            now = time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.requests += 1
+            self.waited += delay
+
+        if delay:
+            sleep(delay)
+
+        return delay
+
+    def summarize(self, name):
+        """
+        Log rate limiting statistics.
+
+        :param str name: A human readable name for this budget.
+        """
+        logger.info('{} budget ({:g} requests per second): {} requests, {:.1f} seconds spent waiting.'.format(name, self.rate, self.requests, self.waited))
+
+
+def throttle(client, bucket):
+    """
+    Make every HTTP request issued by a Stormpath Client take a token from the
+    given bucket first.
+
+    :param object client: The Stormpath Client.
+    :param object bucket: The TokenBucket.
+    :rtype: object
+    :returns: The Client.
+    """
+    executor = client.data_store.executor
+    request = executor.request
+
+    def throttled_request(*args, **kwargs):
+        bucket.acquire()
+        return request(*args, **kwargs)
+
+    executor.request = throttled_request
+    return client
+
+
+def track_retry_after(client):
+    """
+    Remember the Retry-After header of every HTTP response a Stormpath Client
+    receives (per thread), so that the retry policy can honour it.
+
+    :param object client: The Stormpath Client.
+    :rtype: object
+    :returns: The Client.
+    """
+    def hook(response, *args, **kwargs):
+        responses.retry_after = response.headers.get('Retry-After')
+
+    client.data_store.executor.session.hooks['response'].append(hook)
+    return client
+
+
+def read_only(client):
+    """
+    Make a Stormpath Client refuse to issue any HTTP request other than a GET,
+    so that it can't possibly write anything.
+
+    :param object client: The Stormpath Client.
+    :rtype: object
+    :returns: The Client.
+    """
+    executor = client.data_store.executor
+    request = executor.request
+
+    def read_only_request(method, *args, **kwargs):
+        if method.upper() != 'GET':
+            raise RuntimeError('Refusing to make a {} request with a read only Client.'.format(method.upper()))
+
+        return request(method, *args, **kwargs)
+
+    executor.request = read_only_request
+    return client
+
+
+class ConnectionPool(object):
+    """
+    Sized HTTP connection pools for Stormpath Clients.
+
+    Every Client mounted on this gets its own pool of at most
+    `max_connections` kept-alive connections, so each tenant has its own cap,
+    shared by every worker using that Client.  A worker that finds all of its
+    Client's connections busy blocks until one is free, rather than opening
+    (and then throwing away) an extra one -- so running more concurrent
+    workers than that just makes the extra ones wait.
+
+    Keep-alive and compressed responses are already what requests does by
+    default; `keep_alive` and `compression` only exist to turn them off.
+    """
+    def __init__(self, max_connections=10, keep_alive=True, timeout=None, compression=True):
+        self.max_connections = max_connections
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.compression = compression
+        self.adapters = []
+
+    def mount(self, client):
+        """
+        Route all of a Stormpath Client's requests through a new pool.
+
+        :param object client: The Stormpath Client.
+        :rtype: object
+        :returns: The Client.
+        """
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections, pool_block=True)
+        self.adapters.append(adapter)
+
+        session = client.data_store.executor.session
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        if not self.compression:
+            session.headers['Accept-Encoding'] = 'identity'
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        if self.timeout:
+            request = session.request
+
+            def timed_request(*args, **kwargs):
+                kwargs.setdefault('timeout', self.timeout)
+                return request(*args, **kwargs)
+
+            session.request = timed_request
+
+        return client
+
+    def summarize(self):
+        """
+        Log connection reuse statistics.
+        """
+        connections = 0
+        requests = 0
+
+        for adapter in self.adapters:
+            pools = adapter.poolmanager.pools
+
+            for key in pools.keys():
+                pool = pools[key]
+                connections += pool.num_connections
+                requests += pool.num_requests
+
+        logger.info('Connection pools: {} requests over {} new connections ({} reused).'.format(requests, connections, max(requests - connections, 0)))
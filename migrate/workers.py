@@ -0,0 +1,96 @@
+"""Worker pools used to run migrations concurrently."""
+
+
+from Queue import Queue
+from threading import Lock, Thread
+
+from . import logger
+
+
+class WorkerPool(object):
+    """
+    A bounded pool of worker threads.
+
+    Work is handed to the pool with submit().  The queue feeding the workers is
+    bounded, so submit() blocks once the workers fall behind -- this keeps
+    producers (like paginated collection walks) from racing ahead of them.
+
+    A pool with a single worker runs everything inline in the calling thread,
+    which behaves exactly like a plain loop.
+    """
+    def __init__(self, workers=1, backlog=None):
+        self.workers = workers
+        self.queue = Queue(maxsize=backlog or workers * 2)
+        self.threads = []
+        self.errors = []
+        self.lock = Lock()
+
+        if self.workers > 1:
+            for _ in range(self.workers):
+                thread = Thread(target=self.run)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        # If the producer itself blew up, shut down quietly and let its
+        # exception propagate instead of one raised by a worker.
+        self.join(raise_errors=type is None)
+
+    def run(self):
+        """
+        Worker thread main loop.  Pulls work off the queue until told to stop.
+        """
+        while True:
+            work = self.queue.get()
+
+            try:
+                if work is None:
+                    return
+
+                func, args, kwargs = work
+                func(*args, **kwargs)
+            except Exception as err:
+                logger.exception('Worker failed: {}'.format(err))
+
+                with self.lock:
+                    self.errors.append(err)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedule func(*args, **kwargs) to run on the pool.  Blocks while the
+        queue is full.
+
+        :raises: The first error raised by a worker, if any.
+        """
+        if self.workers <= 1:
+            func(*args, **kwargs)
+            return
+
+        if self.errors:
+            raise self.errors[0]
+
+        self.queue.put((func, args, kwargs))
+
+    def join(self, raise_errors=True):
+        """
+        Wait for all submitted work to finish, then stop the workers.
+
+        :param bool raise_errors: Whether to re-raise the first worker error.
+        :raises: The first error raised by a worker, if any.
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+
+        if raise_errors and self.errors:
+            raise self.errors[0]
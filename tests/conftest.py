@@ -0,0 +1,10 @@
+"""Our test configuration."""
+
+
+from os.path import abspath, dirname
+from sys import path
+
+
+# Make our shared fakes importable from every test module (including those in
+# sub-directories).
+path.insert(0, dirname(abspath(__file__)))
@@ -0,0 +1,46 @@
+"""Fake Stormpath resources and collections, shared by our tests."""
+
+
+from stormpath.error import Error as StormpathError
+
+
+class FakeResource(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeCollection(list):
+    params = None
+    searches = 0
+
+    def query(self, **kwargs):
+        self.params = kwargs
+        return self
+
+    def search(self, params):
+        self.searches += 1
+        return [resource for resource in self if all(getattr(resource, key) == value for key, value in params.items())]
+
+
+class FlakyCollection(FakeCollection):
+    """
+    A FakeCollection whose first `failures` queries fail with a 503.
+    """
+    def __init__(self, items=(), failures=1):
+        super(FlakyCollection, self).__init__(items)
+        self.failures = failures
+
+    def query(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise StormpathError({'status': 503, 'message': 'Unavailable.'})
+
+        return super(FlakyCollection, self).query(**kwargs)
+
+
+class Directory(FakeResource):
+    pass
+
+
+class Group(FakeResource):
+    pass
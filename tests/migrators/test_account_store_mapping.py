@@ -7,7 +7,10 @@ from uuid import uuid4
 
 from stormpath.client import Client
 
-from migrate.migrators import ApplicationMigrator, ApplicationAccountStoreMappingMigrator, DirectoryMigrator, GroupMigrator, OrganizationAccountStoreMappingMigrator, OrganizationMigrator
+from migrate.migrators import ApplicationMigrator, ApplicationAccountStoreMappingMigrator, DirectoryMigrator, GroupMigrator, OrganizationAccountStoreMappingMigrator, OrganizationMigrator, account_store_mapping
+from migrate.retry import RetryPolicy
+
+from fakes import Directory, FakeResource, FlakyCollection
 
 
 # Necessary environment variables.
@@ -292,3 +295,27 @@ class OrganizationAccountStoreMappingMigratorTest(TestCase):
         self.assertEqual(dst_mapping.account_store.description, self.src_group.description)
         self.assertEqual(dst_mapping.list_index, self.src_mapping_2.list_index)
         self.assertEqual(dst_mapping.is_default_account_store, self.src_mapping_2.is_default_account_store)
+
+
+class AccountStoreMappingIndexRetryTest(TestCase):
+    def setUp(self):
+        self.original = account_store_mapping.policy
+        account_store_mapping.policy = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0)
+
+        self.account_store = Directory(href='dst/directories/a', name='users')
+        self.existing = FakeResource(account_store=self.account_store)
+
+    def tearDown(self):
+        account_store_mapping.policy = self.original
+
+    def test_retries_application_mappings_index(self):
+        migrator = ApplicationAccountStoreMappingMigrator(destination_application=FakeResource(href='dst/applications/a', name='app', account_store_mappings=FlakyCollection([self.existing])), source_account_store_mapping=None)
+        migrator.destination_account_store = self.account_store
+
+        self.assertEqual(migrator.copy_mapping(), self.existing)
+
+    def test_retries_organization_mappings_index(self):
+        migrator = OrganizationAccountStoreMappingMigrator(destination_organization=FakeResource(href='dst/organizations/a', name='org', account_store_mappings=FlakyCollection([self.existing])), source_account_store_mapping=None)
+        migrator.destination_account_store = self.account_store
+
+        self.assertEqual(migrator.copy_mapping(), self.existing)
@@ -7,7 +7,11 @@ from uuid import uuid4
 
 from stormpath.client import Client
 
-from migrate.migrators import AccountMigrator, DirectoryMigrator, GroupMembershipMigrator, GroupMigrator
+from migrate.cache import LRUCache
+from migrate.migrators import AccountMigrator, DirectoryMigrator, GroupMembershipMigrator, GroupMigrator, group_membership
+from migrate.retry import RetryPolicy
+
+from fakes import Directory, FakeCollection, FakeResource, FlakyCollection, Group
 
 
 # Necessary environment variables.
@@ -76,3 +80,46 @@ class GroupMembershipMigratorTest(TestCase):
         self.assertEqual(membership.group.description, self.src_membership.group.description)
         self.assertEqual(membership.account.username, self.src_membership.account.username)
         self.assertEqual(membership.account.email, self.src_membership.account.email)
+
+
+class GroupMembershipLookupCacheTest(TestCase):
+    def test_repeated_lookups_search_once(self):
+        dst_group = Group(href='dst/groups/a', name='admins')
+        dst_dir = Directory(href='dst/directories/a', name='users', groups=FakeCollection([dst_group]))
+        dst = FakeResource(directories=FakeCollection([dst_dir]))
+
+        src_dir = Directory(href='src/directories/a', name='users')
+        src_membership = FakeResource(group=Group(href='src/groups/a', name='admins', directory=src_dir))
+
+        cache = LRUCache()
+
+        for _ in range(3):
+            migrator = GroupMembershipMigrator(destination_client=dst, source_group_membership=src_membership, cache=cache)
+            migrator.destination_directory = migrator.get_destination_directory()
+
+            self.assertEqual(migrator.destination_directory, dst_dir)
+            self.assertEqual(migrator.get_destination_group(), dst_group)
+
+        self.assertEqual(dst.directories.searches, 1)
+        self.assertEqual(dst_dir.groups.searches, 1)
+        self.assertEqual(cache.hits, 4)
+
+
+class GroupMembershipIndexRetryTest(TestCase):
+    def setUp(self):
+        self.original = group_membership.policy
+        group_membership.policy = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0)
+
+    def tearDown(self):
+        group_membership.policy = self.original
+
+    def test_retries_existing_memberships_index(self):
+        dst_group = Group(href='dst/groups/a', name='admins')
+        existing = FakeResource(group=dst_group)
+
+        migrator = GroupMembershipMigrator(destination_client=None, source_group_membership=None)
+        migrator.destination_directory = Directory(name='users')
+        migrator.destination_group = dst_group
+        migrator.destination_account = FakeResource(username='jdoe', group_memberships=FlakyCollection([existing]))
+
+        self.assertEqual(migrator.copy_membership(), existing)
@@ -0,0 +1,220 @@
+"""Tests for our SubstitutionMigrator class."""
+
+
+from csv import reader as csv_reader
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from migrate.mappings import HrefMap, MappingWriter
+from migrate.migrators import SubstitutionMigrator
+from migrate.snapshot import SnapshotReader, SnapshotWriter
+
+from fakes import Directory, FakeCollection, FakeResource, Group
+
+
+class FakeCustomData(dict):
+    def __init__(self, *args, **kwargs):
+        super(FakeCustomData, self).__init__(*args, **kwargs)
+        self.saves = 0
+
+    def save(self):
+        self.saves += 1
+
+
+class FakeReader(object):
+    def __init__(self, directories=(), groups=None, accounts=None):
+        self.directories_ = directories
+        self.groups_ = groups or {}
+        self.accounts_ = accounts or {}
+
+    def directories(self):
+        return self.directories_
+
+    def groups(self, directory):
+        return self.groups_.get(directory.href, [])
+
+    def accounts(self, directory):
+        return self.accounts_.get(directory.href, [])
+
+
+class SubstitutionMigratorTest(TestCase):
+    def setUp(self):
+        self.migrator = SubstitutionMigrator(source_client=None, destination_client=None, reader=object())
+        self.migrator.hrefs = {
+            'https://src/accounts/a': 'https://dst/accounts/x',
+            'https://src/groups/b': 'https://dst/groups/y',
+            'https://src/groups/c': None,
+        }
+
+    def test_rewrites_keys_and_values_with_one_save(self):
+        custom_data = FakeCustomData({
+            'https://src/accounts/a': 'https://src/groups/b',
+            'group': 'https://src/groups/b',
+            'missing': 'https://src/groups/c',
+            'other': 'value',
+        })
+
+        self.migrator.rewrite_custom_data(FakeResource(custom_data=custom_data), 'Account: a')
+
+        self.assertEqual(custom_data, {
+            'https://dst/accounts/x': 'https://dst/groups/y',
+            'group': 'https://dst/groups/y',
+            'missing': 'https://src/groups/c',
+            'other': 'value',
+        })
+        self.assertEqual(custom_data.saves, 1)
+
+    def test_rewrites_nested_values(self):
+        custom_data = FakeCustomData({
+            'href': 'https://dst/accounts/x/customData',
+            'groups': {'admins': [u'https://src/groups/b']},
+        })
+
+        self.migrator.rewrite_custom_data(FakeResource(custom_data=custom_data), 'Account: a')
+
+        self.assertEqual(custom_data['groups'], {'admins': ['https://dst/groups/y']})
+        self.assertEqual(custom_data.saves, 1)
+
+    def test_does_not_save_unchanged(self):
+        custom_data = FakeCustomData({'other': 'value'})
+
+        self.migrator.rewrite_custom_data(FakeResource(custom_data=custom_data), 'Account: a')
+
+        self.assertEqual(custom_data.saves, 0)
+
+    def test_uses_recorded_hrefs(self):
+        href_map = HrefMap()
+        href_map.record(FakeResource(href='https://src/accounts/a', custom_data={}), FakeResource(href='https://dst/accounts/x'))
+
+        migrator = SubstitutionMigrator(source_client=None, destination_client=None, reader=FakeReader(), href_map=href_map)
+        migrator.build_hrefs()
+
+        self.assertEqual(migrator.hrefs.get('https://src/accounts/a'), 'https://dst/accounts/x')
+
+    def test_fills_in_mirror_directories(self):
+        cloud = Directory(href='https://src/v1/directories/a', name='users', provider={'provider_id': 'stormpath'})
+        mirror = Directory(href='https://src/v1/directories/b', name='ldap', provider={'provider_id': 'ldap'})
+
+        dst_cloud = Directory(href='https://dst/v1/directories/x', name='users', groups=FakeCollection(), accounts=FakeCollection())
+        dst_mirror = Directory(
+            href='https://dst/v1/directories/y',
+            name='ldap',
+            groups=FakeCollection([Group(href='https://dst/v1/groups/y', name='engineers')]),
+            accounts=FakeCollection([FakeResource(href='https://dst/v1/accounts/y', email='JDoe@example.com')]),
+        )
+
+        href_map = HrefMap()
+        href_map.set(cloud.href, dst_cloud.href)
+        href_map.set(mirror.href, dst_mirror.href)
+
+        reader = FakeReader(
+            directories=[cloud, mirror],
+            groups={mirror.href: [Group(href='https://src/v1/groups/b', name='engineers')]},
+            accounts={mirror.href: [
+                FakeResource(href='https://src/v1/accounts/b', email='jdoe@example.com'),
+                FakeResource(href='https://src/v1/accounts/c', email='gone@example.com'),
+            ]},
+        )
+
+        client = FakeResource(directories=FakeCollection([dst_cloud, dst_mirror]))
+        migrator = SubstitutionMigrator(source_client=None, destination_client=client, reader=reader, href_map=href_map)
+        migrator.build_hrefs()
+
+        self.assertEqual(href_map.get('https://src/v1/groups/b'), 'https://dst/v1/groups/y')
+        self.assertEqual(href_map.get('https://src/v1/accounts/b'), 'https://dst/v1/accounts/y')
+        self.assertTrue('https://src/v1/accounts/c' in href_map)
+        self.assertEqual(href_map.get('https://src/v1/accounts/c'), None)
+
+        # The Cloud Directory's Groups and Accounts were recorded during the
+        # migration, so it isn't joined again.
+        self.assertEqual(dst_cloud.groups.params, None)
+        self.assertEqual(dst_cloud.accounts.params, None)
+
+    def test_fills_in_snapshot_mirror_and_saml_directories(self):
+        path = mkdtemp()
+        self.addCleanup(rmtree, path)
+
+        # An exported snapshot: mirrored Groups and Accounts (and SAML
+        # Accounts) are only exported for mapping.
+        snapshot = SnapshotWriter(join(path, 'snapshot'), base_url='https://src/v1')
+        snapshot.write('directories', {'href': 'https://src/v1/directories/l', 'name': 'ldap', 'provider': {'provider_id': 'ldap'}})
+        snapshot.write('directories', {'href': 'https://src/v1/directories/s', 'name': 'saml', 'provider': {'provider_id': 'saml'}})
+        snapshot.write('groups', {'href': 'https://src/v1/groups/l', 'directory': 'https://src/v1/directories/l', 'name': 'engineers'}, 'https://src/v1/directories/l')
+        snapshot.write('groups', {'href': 'https://src/v1/groups/s', 'directory': 'https://src/v1/directories/s', 'name': 'admins', 'custom_data': {}}, 'https://src/v1/directories/s')
+        snapshot.write('accounts', {'href': 'https://src/v1/accounts/l', 'directory': 'https://src/v1/directories/l', 'username': 'jdoe', 'email': 'jdoe@example.com'}, 'https://src/v1/directories/l')
+        snapshot.write('accounts', {'href': 'https://src/v1/accounts/s', 'directory': 'https://src/v1/directories/s', 'username': 'jsmith', 'email': 'jsmith@example.com'}, 'https://src/v1/directories/s')
+        snapshot.close()
+
+        client = FakeResource(directories=FakeCollection([
+            Directory(
+                href='https://dst/v1/directories/l',
+                name='ldap',
+                groups=FakeCollection([Group(href='https://dst/v1/groups/l', name='engineers')]),
+                accounts=FakeCollection([FakeResource(href='https://dst/v1/accounts/l', email='jdoe@example.com')]),
+            ),
+            Directory(
+                href='https://dst/v1/directories/s',
+                name='saml',
+                groups=FakeCollection([Group(href='https://dst/v1/groups/s', name='admins')]),
+                accounts=FakeCollection([FakeResource(href='https://dst/v1/accounts/s', email='jsmith@example.com')]),
+            ),
+        ]))
+
+        # What the import itself recorded: both Directories, and the SAML
+        # Directory's Group.
+        writer = MappingWriter(join(path, 'mappings.csv'))
+        href_map = HrefMap(writer=writer)
+        href_map.set('https://src/v1/directories/l', 'https://dst/v1/directories/l')
+        href_map.set('https://src/v1/directories/s', 'https://dst/v1/directories/s')
+        href_map.set('https://src/v1/groups/s', 'https://dst/v1/groups/s')
+
+        reader = SnapshotReader(join(path, 'snapshot'))
+        migrator = SubstitutionMigrator(source_client=None, destination_client=client, reader=reader, href_map=href_map, writer=writer)
+        migrator.build_hrefs()
+        writer.close()
+        reader.close()
+
+        expected = {
+            'https://src/v1/directories/l': 'https://dst/v1/directories/l',
+            'https://src/v1/directories/s': 'https://dst/v1/directories/s',
+            'https://src/v1/groups/l': 'https://dst/v1/groups/l',
+            'https://src/v1/groups/s': 'https://dst/v1/groups/s',
+            'https://src/v1/accounts/l': 'https://dst/v1/accounts/l',
+            'https://src/v1/accounts/s': 'https://dst/v1/accounts/s',
+        }
+
+        self.assertEqual(dict(href_map.items()), expected)
+
+        with open(join(path, 'mappings.csv'), 'rb') as f:
+            rows = list(csv_reader(f))[1:]
+
+        self.assertEqual(sorted(rows), sorted([list(row) for row in expected.items()]))
+
+    def test_rewrites_concurrently(self):
+        documents = [FakeCustomData({'group': 'https://src/groups/b'}) for _ in range(10)]
+        resources = [(FakeResource(custom_data=custom_data), 'Group: b') for custom_data in documents]
+
+        migrator = SubstitutionMigrator(source_client=None, destination_client=None, reader=object(), workers=4)
+        migrator.hrefs = self.migrator.hrefs
+        migrator.destination_resources = lambda: iter(resources)
+        migrator.rewrite_hrefs()
+
+        self.assertEqual([custom_data.saves for custom_data in documents], [1] * 10)
+        self.assertEqual(documents[0], {'group': 'https://dst/groups/y'})
+
+    def test_rewrites_only_flagged(self):
+        fetched = []
+
+        def get(href, expand=None):
+            fetched.append((href, sorted(expand.items)))
+            return FakeResource(custom_data=FakeCustomData())
+
+        collection = FakeResource(get=get)
+        client = FakeResource(applications=collection, directories=collection, groups=collection, accounts=collection, tenant=FakeResource(organizations=collection))
+
+        migrator = SubstitutionMigrator(source_client=None, destination_client=client, reader=object(), flagged=set(['https://dst/v1/groups/y']))
+        migrator.rewrite_hrefs()
+
+        self.assertEqual(fetched, [('https://dst/v1/groups/y', ['customData'])])
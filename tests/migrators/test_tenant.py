@@ -0,0 +1,315 @@
+"""Tests for our TenantMigrator class."""
+
+
+from os import close, remove
+from os.path import exists
+from shutil import rmtree
+from tempfile import mkdtemp, mkstemp
+from unittest import TestCase
+
+from stormpath.error import Error as StormpathError
+
+from migrate.journal import Journal
+from migrate.migrators import TenantMigrator, tenant
+from migrate.retry import RetryPolicy
+from migrate.snapshot import SnapshotWriter
+
+from fakes import Directory, FakeResource, Group
+
+
+class FakeMigrator(object):
+    """
+    Stands in for a resource migrator: migrate() returns whatever the source
+    resource's `result` is.
+    """
+    created = True
+    existing_memberships = None
+    existing_mappings = None
+
+    def __init__(self, **kwargs):
+        self.source = [value for key, value in kwargs.items() if key.startswith('source_')][0]
+
+    def migrate(self):
+        return self.source.result
+
+
+class FakeDirectoryMigrator(object):
+    """
+    Stands in for a DirectoryMigrator, recording whether the Directory was
+    looked up or copied (along with its Strength rules).
+    """
+    found = None
+    calls = []
+
+    def __init__(self, destination_client, source_directory, href_map=None):
+        self.source_directory = source_directory
+
+    def get_destination_dir(self):
+        FakeDirectoryMigrator.calls.append('lookup')
+        return FakeDirectoryMigrator.found
+
+    def migrate(self):
+        FakeDirectoryMigrator.calls.append('copy')
+        return Directory(href='https://dst/v1/directories/y', name=self.source_directory.name)
+
+
+class FakeWorkflowMigrator(object):
+    def __init__(self, destination_directory, source_directory):
+        self.destination_directory = destination_directory
+
+    def migrate(self):
+        FakeDirectoryMigrator.calls.append('workflow')
+        return self.destination_directory
+
+
+class CopyingMigrator(FakeMigrator):
+    """
+    Stands in for a Group, Account or GroupMembership migrator, recording the
+    href of every resource it copies.
+    """
+    copied = []
+
+    def migrate(self):
+        CopyingMigrator.copied.append(self.source.href)
+        return FakeResource(href=self.source.href.replace('https://src/', 'https://dst/'))
+
+
+class FakeReader(object):
+    def __init__(self, groups=(), memberships=()):
+        self.groups_ = groups
+        self.memberships_ = memberships
+
+    def groups(self, directory):
+        return self.groups_
+
+    def group_memberships(self, account):
+        return self.memberships_
+
+
+class TenantMigratorJournalTest(TestCase):
+    PATCHED = ['AccountMigrator', 'DirectoryMigrator', 'DirectoryWorkflowMigrator', 'GroupMembershipMigrator', 'GroupMigrator']
+
+    def setUp(self):
+        self.originals = dict((name, getattr(tenant, name)) for name in self.PATCHED)
+
+        for name in self.PATCHED:
+            setattr(tenant, name, FakeMigrator)
+
+        fd, self.path = mkstemp()
+        close(fd)
+
+        self.migrator = TenantMigrator(src=None, dst=None, passwords=None)
+        self.migrator.journal = Journal(self.path)
+        self.migrator.password_index = FakeResource(get=lambda href: 'hash')
+
+        self.account = FakeResource(href='src/accounts/a', username='jdoe', result=FakeResource(href='dst/accounts/a'))
+
+    def tearDown(self):
+        for name, value in self.originals.items():
+            setattr(tenant, name, value)
+
+        self.migrator.journal.close()
+        self.migrator.href_map.close()
+        remove(self.path)
+
+    def test_records_complete_account(self):
+        self.migrator.reader = FakeReader(memberships=[FakeResource(result=FakeResource(href='dst/groupMemberships/a'))])
+
+        self.assertTrue(self.migrator.migrate_account(self.account, None))
+        self.assertEqual(self.migrator.journal.get('account', 'src/accounts/a'), 'dst/accounts/a')
+
+    def test_does_not_record_account_with_failed_memberships(self):
+        self.migrator.reader = FakeReader(memberships=[FakeResource(result=None), FakeResource(result=FakeResource(href='dst/groupMemberships/a'))])
+
+        self.assertFalse(self.migrator.migrate_account(self.account, None))
+        self.assertEqual(self.migrator.journal.get('account', 'src/accounts/a'), None)
+
+    def test_does_not_record_directory_with_failed_groups(self):
+        destination_directory = Directory(href='dst/directories/a', name='users')
+        directory = Directory(href='src/directories/a', name='users', provider={'provider_id': 'saml'}, custom_data={}, result=destination_directory)
+        self.migrator.reader = FakeReader(groups=[
+            Group(href='src/groups/a', name='admins', custom_data={}, result=Group(href='dst/groups/a')),
+            Group(href='src/groups/b', name='staff', custom_data={}, result=None),
+        ])
+
+        self.migrator.migrate_directory(directory)
+
+        self.assertEqual(self.migrator.journal.get('group', 'src/groups/a'), 'dst/groups/a')
+        self.assertEqual(self.migrator.journal.get('group', 'src/groups/b'), None)
+        self.assertEqual(self.migrator.journal.get('directory', 'src/directories/a'), None)
+
+
+class TenantMigratorMappingsTest(TestCase):
+    def test_delta_syncs_write_mappings_once(self):
+        full = TenantMigrator(src=None, dst=None, passwords=None)
+        delta = TenantMigrator(src=None, dst=None, passwords=None, from_date='2010-01-03')
+
+        # A delta sync's mappings are all written by the rebuilt map, so the
+        # map recorded during the migration mustn't write them too.
+        self.assertTrue(full.href_map.writer is full.mappings)
+        self.assertEqual(delta.href_map.writer, None)
+
+
+class FlakyAccountIndex(object):
+    """
+    Stands in for an AccountIndex whose walk fails the first `failures`
+    times it's built.
+    """
+    failures = 0
+    builds = 0
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def build(self):
+        FlakyAccountIndex.builds += 1
+
+        if FlakyAccountIndex.builds <= FlakyAccountIndex.failures:
+            raise StormpathError({'status': 503, 'message': 'Unavailable.'})
+
+        return self
+
+
+class TenantMigratorIndexTest(TestCase):
+    def setUp(self):
+        self.originals = tenant.AccountIndex, tenant.policy
+        tenant.AccountIndex = FlakyAccountIndex
+        tenant.policy = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0)
+        FlakyAccountIndex.builds = 0
+
+        self.migrator = TenantMigrator(src=None, dst=None, passwords=None)
+        self.directory = Directory(name='users')
+
+    def tearDown(self):
+        tenant.AccountIndex, tenant.policy = self.originals
+        self.migrator.href_map.close()
+
+    def test_retries_index(self):
+        FlakyAccountIndex.failures = 1
+        index = self.migrator.index_accounts(self.directory)
+
+        self.assertEqual(index.directory, self.directory)
+        self.assertEqual(FlakyAccountIndex.builds, 2)
+
+    def test_falls_back_to_searches(self):
+        FlakyAccountIndex.failures = 2
+
+        self.assertEqual(self.migrator.index_accounts(self.directory), None)
+
+
+class TenantMigratorDeltaSyncTest(TestCase):
+    PATCHED = {
+        'AccountMigrator': CopyingMigrator,
+        'DirectoryMigrator': FakeDirectoryMigrator,
+        'DirectoryWorkflowMigrator': FakeWorkflowMigrator,
+        'GroupMembershipMigrator': CopyingMigrator,
+        'GroupMigrator': CopyingMigrator,
+    }
+
+    def setUp(self):
+        self.originals = dict((name, getattr(tenant, name)) for name in self.PATCHED)
+
+        for name, value in self.PATCHED.items():
+            setattr(tenant, name, value)
+
+        FakeDirectoryMigrator.found = None
+        FakeDirectoryMigrator.calls = []
+        CopyingMigrator.copied = []
+
+        # A Directory created before the --from date, holding one old and one
+        # new Group and Account.
+        self.path = mkdtemp()
+        directory = 'https://src/v1/directories/a'
+
+        snapshot = SnapshotWriter(self.path, base_url='https://src/v1')
+        snapshot.write('directories', {'href': directory, 'created_at': '2010-01-01', 'name': 'users', 'provider': {'provider_id': 'stormpath'}, 'custom_data': {}})
+
+        for name, created_at in [('old', '2010-01-01'), ('new', '2010-01-05')]:
+            snapshot.write('groups', {'href': 'https://src/v1/groups/' + name, 'created_at': created_at, 'directory': directory, 'name': name, 'custom_data': {}}, directory)
+            snapshot.write('accounts', {'href': 'https://src/v1/accounts/' + name, 'created_at': created_at, 'directory': directory, 'username': name, 'custom_data': {}, 'group_memberships': []}, directory)
+
+        snapshot.close()
+
+        self.migrator = TenantMigrator(src=None, dst=None, passwords=None, from_date='2010-01-03', snapshot=self.path)
+        self.migrator.password_index = FakeResource(get=lambda href: 'hash')
+        self.directory = list(self.migrator.reader.directories())[0]
+
+        # This is what migrate() works out: the Directory isn't new.
+        self.migrator.new_directories = set(directory.href for directory in self.migrator.reader.directories(created_since='2010-01-03'))
+
+    def tearDown(self):
+        for name, value in self.originals.items():
+            setattr(tenant, name, value)
+
+        self.migrator.reader.close()
+        self.migrator.href_map.close()
+        rmtree(self.path)
+
+    def test_looks_up_existing_directories(self):
+        FakeDirectoryMigrator.found = Directory(href='https://dst/v1/directories/x', name='users')
+        self.migrator.migrate_directory(self.directory)
+
+        # The Directory isn't copied, so neither its Strength rules nor its
+        # Workflows are written.
+        self.assertEqual(self.migrator.new_directories, set())
+        self.assertEqual(FakeDirectoryMigrator.calls, ['lookup'])
+        self.assertEqual(self.migrator.href_map.get(self.directory.href), 'https://dst/v1/directories/x')
+
+    def test_creates_missing_directories(self):
+        self.migrator.migrate_directory(self.directory)
+
+        self.assertEqual(FakeDirectoryMigrator.calls, ['lookup', 'copy', 'workflow'])
+
+    def test_copies_new_directories(self):
+        self.migrator.new_directories = set([self.directory.href])
+        self.migrator.migrate_directory(self.directory)
+
+        self.assertEqual(FakeDirectoryMigrator.calls, ['copy', 'workflow'])
+
+    def test_only_copies_new_groups_and_accounts(self):
+        FakeDirectoryMigrator.found = Directory(href='https://dst/v1/directories/x', name='users')
+        self.migrator.migrate_directory(self.directory)
+
+        self.assertEqual(CopyingMigrator.copied, ['https://src/v1/groups/new', 'https://src/v1/accounts/new'])
+
+
+class TenantMigratorPlanTest(TestCase):
+    def setUp(self):
+        self.originals = tenant.TenantPlanner, tenant.read_only
+        tenant.read_only = lambda client: None
+
+        def plan(dst, reader, finished=None, from_date=None):
+            return FakeResource(build=lambda: finished('directory', FakeResource(href='src/directories/a')))
+
+        tenant.TenantPlanner = plan
+
+        fd, self.path = mkstemp()
+        close(fd)
+        remove(self.path)
+
+    def tearDown(self):
+        tenant.TenantPlanner, tenant.read_only = self.originals
+
+        if exists(self.path):
+            remove(self.path)
+
+    def test_does_not_create_journal(self):
+        migrator = TenantMigrator(src=None, dst=None, passwords=None, journal=self.path)
+
+        # A missing journal means nothing is finished.
+        self.assertEqual(migrator.plan(), None)
+        self.assertFalse(exists(self.path))
+
+    def test_does_not_write_journal(self):
+        journal = Journal(self.path)
+        journal.record('directory', 'src/directories/a', 'dst/directories/a')
+        journal.close()
+
+        with open(self.path, 'rb') as f:
+            contents = f.read()
+
+        migrator = TenantMigrator(src=None, dst=None, passwords=None, journal=self.path)
+        self.assertEqual(migrator.plan(), 'dst/directories/a')
+
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), contents)
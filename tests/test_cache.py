@@ -0,0 +1,41 @@
+"""Our cache tests."""
+
+
+from unittest import TestCase
+
+from migrate.cache import LRUCache
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_fetch(self):
+        cache = LRUCache()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return 'value'
+
+        self.assertEqual(cache.fetch('key', load), 'value')
+        self.assertEqual(cache.fetch('key', load), 'value')
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hit_rate, 50.0)
+
+    def test_fetch_does_not_cache_misses(self):
+        cache = LRUCache()
+        cache.fetch('key', lambda: None)
+
+        self.assertEqual(len(cache), 0)
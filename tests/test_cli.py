@@ -6,7 +6,7 @@ from unittest import TestCase
 
 from stormpath.client import Client
 
-from migrate.cli import create_clients, validate_credentials
+from migrate.cli import create_clients, validate_credentials, validate_number
 
 
 # Necessary environment variables.
@@ -36,3 +36,19 @@ class ValidateCredentialsTest(TestCase):
 
     def test_works_with_valid_credentials(self):
         validate_credentials(SRC_CLIENT_ID + ':' + SRC_CLIENT_SECRET, DST_CLIENT_ID + ':' + DST_CLIENT_SECRET)
+
+
+class ValidateNumberTest(TestCase):
+    def test_raises_error_on_invalid_number(self):
+        for value in ['0', '-5', 'ten', '1.5']:
+            with self.assertRaises(ValueError):
+                validate_number(value, 'page size')
+
+        for value in ['0', '-0.5', 'nan', 'fast']:
+            with self.assertRaises(ValueError):
+                validate_number(value, 'read rate', type=float)
+
+    def test_works_with_valid_number(self):
+        self.assertEqual(validate_number('100', 'page size'), 100)
+        self.assertEqual(validate_number('0.5', 'read rate', type=float), 0.5)
+        self.assertEqual(validate_number(None, 'page size'), None)
@@ -0,0 +1,107 @@
+"""Our exporter tests."""
+
+
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from migrate.exporter import TenantExporter, export_account_store_mapping, export_policy, get_created_at
+from migrate.snapshot import SnapshotReader
+
+from fakes import Directory, FakeResource, Group
+
+
+class FakeReader(object):
+    def __init__(self, directories, groups, accounts):
+        self.directories_ = directories
+        self.groups_ = groups
+        self.accounts_ = accounts
+
+    def directories(self):
+        return self.directories_
+
+    def groups(self, directory):
+        return self.groups_.get(directory.href, [])
+
+    def accounts(self, directory):
+        return self.accounts_.get(directory.href, [])
+
+    def group_memberships(self, account):
+        return []
+
+    def organizations(self):
+        return []
+
+    def applications(self):
+        return []
+
+    def summarize(self):
+        pass
+
+
+class ExportTest(TestCase):
+    def test_get_created_at(self):
+        self.assertEqual(get_created_at(FakeResource(created_at=datetime(2016, 1, 2))), '2016-01-02T00:00:00')
+        self.assertEqual(get_created_at(FakeResource()), None)
+
+    def test_export_policy(self):
+        template = FakeResource(writable_attrs=('subject',), subject='Welcome!')
+        policy = FakeResource(writable_attrs=('welcome_email_status',), welcome_email_status='ENABLED', welcome_email_templates=[template, None])
+
+        self.assertEqual(export_policy(policy, ['welcome_email_templates']), {
+            'writable_attrs': ['welcome_email_status'],
+            'welcome_email_status': 'ENABLED',
+            'welcome_email_templates': [{'writable_attrs': ['subject'], 'subject': 'Welcome!'}],
+        })
+
+    def test_export_account_store_mapping(self):
+        mapping = FakeResource(
+            href='accountStoreMappings/a',
+            account_store=Directory(href='directories/a', name='users'),
+            list_index=0,
+            is_default_account_store=True,
+            is_default_group_store=False,
+        )
+
+        self.assertEqual(export_account_store_mapping(mapping)['account_store'], {'href': 'directories/a', 'type': 'Directory', 'name': 'users'})
+
+
+class TenantExporterTest(TestCase):
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def test_exports_mirrored_resources_for_mapping(self):
+        ldap = Directory(href='directories/ldap', name='ldap', provider={'provider_id': 'ldap'})
+        saml = Directory(href='directories/saml', name='saml', provider={'provider_id': 'saml'})
+
+        def account(username):
+            return FakeResource(href='accounts/' + username, username=username, email=username + '@example.com', custom_data={'a': 1})
+
+        exporter = TenantExporter(FakeResource(tenant=FakeResource(href='https://api.stormpath.com/v1/tenants/t')), self.path)
+        exporter.export_directory = lambda directory: {'href': directory.href, 'name': directory.name, 'provider': directory.provider}
+        exporter.reader = FakeReader(
+            directories=[ldap, saml],
+            groups={
+                'directories/ldap': [Group(href='groups/engineers', name='engineers', custom_data={'a': 1})],
+                'directories/saml': [Group(href='groups/admins', name='admins', description='', status='ENABLED', custom_data={'a': 1})],
+            },
+            accounts={
+                'directories/ldap': [account('jdoe')],
+                'directories/saml': [account('jsmith')],
+            },
+        )
+        exporter.export()
+
+        # Mirrored Groups and Accounts (and SAML Accounts) are exported without
+        # their CustomData, but SAML Groups are migrated, so they're complete.
+        reader = SnapshotReader(self.path)
+        records = lambda walk: dict((record['href'], dict(record)) for record in walk)
+
+        self.assertEqual(records(reader.groups(ldap)), {'groups/engineers': {'href': 'groups/engineers', 'created_at': None, 'directory': 'directories/ldap', 'name': 'engineers'}})
+        self.assertEqual(records(reader.groups(saml))['groups/admins']['custom_data'], {'a': 1})
+        self.assertEqual(records(reader.accounts(ldap)), {'accounts/jdoe': {'href': 'accounts/jdoe', 'created_at': None, 'directory': 'directories/ldap', 'username': 'jdoe', 'email': 'jdoe@example.com'}})
+        self.assertEqual(records(reader.accounts(saml)), {'accounts/jsmith': {'href': 'accounts/jsmith', 'created_at': None, 'directory': 'directories/saml', 'username': 'jsmith', 'email': 'jsmith@example.com'}})
@@ -0,0 +1,102 @@
+"""Our index tests."""
+
+
+from json import dumps
+from os import close, remove
+from os.path import exists
+from tempfile import mkstemp
+from unittest import TestCase
+
+from migrate.indexes import AccountIndex, PasswordIndex, index_account_store_mappings, index_hrefs, index_memberships
+
+from fakes import FakeCollection, FakeResource
+
+
+class PasswordIndexTest(TestCase):
+    def setUp(self):
+        fd, self.passwords = mkstemp()
+        close(fd)
+
+        with open(self.passwords, 'w') as f:
+            f.write(dumps({'href': 'https://api.stormpath.com/v1/accounts/a', 'password': 'hash-a'}) + '\n')
+            f.write('\n')
+            f.write(dumps({'href': 'https://api.stormpath.com/v1/accounts/b', 'password': 'hash-b'}) + '\n')
+            f.write(dumps({'href': 'https://api.stormpath.com/v1/accounts/a', 'password': 'duplicate'}) + '\n')
+
+    def tearDown(self):
+        remove(self.passwords)
+
+    def test_in_memory(self):
+        index = PasswordIndex(self.passwords).build()
+
+        self.assertEqual(index.size, 2)
+        self.assertEqual(index.get('https://api.stormpath.com/v1/accounts/a'), 'hash-a')
+        self.assertEqual(index.get('https://api.stormpath.com/v1/accounts/b'), 'hash-b')
+        self.assertEqual(index.get('https://api.stormpath.com/v1/accounts/c'), None)
+        self.assertEqual(index.hits, 2)
+        self.assertEqual(index.misses, 1)
+
+    def test_on_disk(self):
+        index = PasswordIndex(self.passwords, on_disk=True).build()
+        db_path = index.db_path
+
+        self.assertEqual(index.size, 2)
+        self.assertEqual(index.get('https://api.stormpath.com/v1/accounts/a'), 'hash-a')
+        self.assertEqual(index.get('https://api.stormpath.com/v1/accounts/c'), None)
+        self.assertEqual(index.hits, 1)
+        self.assertEqual(index.misses, 1)
+
+        index.close()
+        self.assertFalse(exists(db_path))
+
+
+class AccountIndexTest(TestCase):
+    def setUp(self):
+        self.account = FakeResource(username='Randall', email='r@rdegges.com')
+        self.directory = FakeResource(name=u'dir', accounts=FakeCollection([self.account]))
+
+    def test_build_uses_large_pages(self):
+        AccountIndex(self.directory).build()
+        self.assertEqual(self.directory.accounts.params, {'limit': 100})
+
+    def test_get(self):
+        index = AccountIndex(self.directory).build()
+
+        self.assertEqual(index.get(username='randall'), self.account)
+        self.assertEqual(index.get(username='nope', email='R@rdegges.com'), self.account)
+        self.assertEqual(index.get(username='nope', email='nope@test.com'), None)
+
+    def test_add(self):
+        index = AccountIndex(self.directory).build()
+        account = FakeResource(username='new', email='new@test.com')
+        index.add(account)
+
+        self.assertEqual(index.get(email='new@test.com'), account)
+
+
+class IndexMembershipsTest(TestCase):
+    def test_index_memberships(self):
+        membership = FakeResource(group=FakeResource(href='groups/a'))
+        account = FakeResource(group_memberships=FakeCollection([membership]))
+
+        self.assertEqual(index_memberships(account), {'groups/a': membership})
+
+
+class IndexAccountStoreMappingsTest(TestCase):
+    def test_index_account_store_mappings(self):
+        mapping = FakeResource(account_store=FakeResource(href='directories/a'))
+        application = FakeResource(href='applications/a', account_store_mappings=FakeCollection([mapping]))
+
+        self.assertEqual(index_account_store_mappings(application), {('directories/a', 'applications/a'): mapping})
+        self.assertEqual(application.account_store_mappings.params, {'expand': 'accountStore', 'limit': 100})
+
+
+class IndexHrefsTest(TestCase):
+    def test_index_hrefs(self):
+        collection = FakeCollection([
+            FakeResource(href='groups/a', name='a'),
+            FakeResource(href='groups/b', name='b'),
+        ])
+
+        self.assertEqual(index_hrefs(collection, lambda group: group.name), {'a': 'groups/a', 'b': 'groups/b'})
+        self.assertEqual(collection.params, {'limit': 100})
@@ -0,0 +1,89 @@
+"""Our journal tests."""
+
+
+from os import close, remove
+from os.path import exists
+from sqlite3 import OperationalError
+from tempfile import mkstemp
+from unittest import TestCase
+
+from migrate.journal import Journal
+
+
+class JournalTest(TestCase):
+    def setUp(self):
+        fd, self.path = mkstemp(suffix='.db')
+        close(fd)
+
+    def tearDown(self):
+        remove(self.path)
+
+    def test_record_and_get(self):
+        journal = Journal(self.path)
+        journal.record('account', 'src/accounts/a', 'dst/accounts/a')
+
+        self.assertEqual(journal.get('account', 'src/accounts/a'), 'dst/accounts/a')
+        self.assertEqual(journal.get('group', 'src/accounts/a'), None)
+        self.assertEqual(journal.recorded, 1)
+        self.assertEqual(journal.skipped, 1)
+
+        journal.close()
+
+    def test_survives_reopening(self):
+        journal = Journal(self.path)
+        journal.record('directory', 'src/directories/a', 'dst/directories/a')
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertEqual(journal.get('directory', 'src/directories/a'), 'dst/directories/a')
+        journal.close()
+
+    def test_hrefs(self):
+        journal = Journal(self.path)
+        journal.record('group', 'src/groups/a', 'dst/groups/a')
+        journal.record('account', 'src/accounts/a', 'dst/accounts/a')
+
+        self.assertEqual(sorted(journal.hrefs()), [('src/accounts/a', 'dst/accounts/a'), ('src/groups/a', 'dst/groups/a')])
+        journal.close()
+
+    def test_hrefs_are_streamed(self):
+        journal = Journal(self.path)
+        journal.record('group', 'src/groups/a', 'dst/groups/a')
+        journal.record('account', 'src/accounts/a', 'dst/accounts/a')
+
+        hrefs = journal.hrefs()
+        self.assertFalse(isinstance(hrefs, list))
+        self.assertEqual(len(list(hrefs)), 2)
+        journal.close()
+
+    def test_read_only(self):
+        journal = Journal(self.path)
+        journal.record('account', 'src/accounts/a', 'dst/accounts/a')
+        journal.close()
+
+        with open(self.path, 'rb') as f:
+            contents = f.read()
+
+        journal = Journal(self.path, read_only=True)
+        self.assertEqual(journal.get('account', 'src/accounts/a'), 'dst/accounts/a')
+
+        with self.assertRaises(OperationalError):
+            journal.record('account', 'src/accounts/b', 'dst/accounts/b')
+
+        journal.close()
+
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), contents)
+
+        self.assertFalse(exists(self.path + '-wal'))
+
+    def test_read_only_never_creates(self):
+        remove(self.path)
+
+        with self.assertRaises(OperationalError):
+            Journal(self.path, read_only=True)
+
+        self.assertFalse(exists(self.path))
+
+        # tearDown() removes it.
+        open(self.path, 'w').close()
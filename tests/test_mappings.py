@@ -0,0 +1,157 @@
+"""Our href mapping tests."""
+
+
+from csv import reader
+from os import close, remove
+from os.path import exists
+from tempfile import mkstemp
+from unittest import TestCase
+
+from migrate.mappings import HrefMap, MappingWriter, contains_hrefs, get_base_url, sort_mappings, substitute_hrefs
+
+from fakes import FakeResource
+
+
+class HrefMapTest(TestCase):
+    def test_record(self):
+        href_map = HrefMap()
+        href_map.record(FakeResource(href='https://src/v1/accounts/a', custom_data={}), FakeResource(href='https://dst/v1/accounts/a'))
+        href_map.record(FakeResource(href='https://src/v1/accounts/b', custom_data={}), None)
+
+        self.assertEqual(len(href_map), 1)
+        self.assertEqual(href_map.get('https://src/v1/accounts/a'), 'https://dst/v1/accounts/a')
+        self.assertTrue('https://src/v1/accounts/b' not in href_map)
+        self.assertEqual(href_map.flagged, set())
+
+    def test_flags_custom_data_with_hrefs(self):
+        href_map = HrefMap()
+        custom_data = {'href': 'https://src/v1/accounts/a/customData', 'friends': ['https://src/v1/accounts/b']}
+        href_map.record(FakeResource(href='https://src/v1/accounts/a', custom_data=custom_data), FakeResource(href='https://dst/v1/accounts/a'))
+
+        self.assertEqual(href_map.flagged, set(['https://dst/v1/accounts/a']))
+
+    def test_stores_compact_keys(self):
+        href_map = HrefMap()
+        href_map.set('https://src/v1/accounts/a', 'https://dst/v1/accounts/x')
+        href_map.set('https://src/v1/groups/b', None)
+        href_map.set('https://other/v1/groups/c', 'https://dst/v1/groups/z')
+
+        self.assertEqual(href_map.hrefs, {'accounts/a': 'x', 'groups/b': None, '!https://other/v1/groups/c': 'https://dst/v1/groups/z'})
+        self.assertEqual(href_map.get('https://src/v1/accounts/a'), 'https://dst/v1/accounts/x')
+        self.assertEqual(href_map.get('https://other/v1/groups/c'), 'https://dst/v1/groups/z')
+        self.assertEqual(href_map.get('accounts/a'), None)
+        self.assertTrue('https://src/v1/groups/b' in href_map)
+        self.assertEqual(href_map.get('https://src/v1/groups/b', 'default'), None)
+
+    def test_on_disk(self):
+        href_map = HrefMap(on_disk=True)
+        href_map.set('https://src/v1/accounts/a', 'https://dst/v1/accounts/x')
+        href_map.set('https://src/v1/groups/b', None)
+
+        self.assertTrue(exists(href_map.db_path))
+        self.assertEqual(len(href_map), 2)
+        self.assertEqual(href_map.get('https://src/v1/accounts/a'), 'https://dst/v1/accounts/x')
+        self.assertEqual(href_map.get('https://src/v1/groups/b', 'default'), None)
+        self.assertEqual(href_map.get('https://src/v1/groups/c', 'default'), 'default')
+
+        db_path = href_map.db_path
+        href_map.close()
+        self.assertFalse(exists(db_path))
+
+    def test_update(self):
+        href_map = HrefMap()
+        href_map.update([('https://src/v1/groups/a', 'https://dst/v1/groups/x'), ('https://src/v1/groups/b', None)])
+
+        self.assertEqual(href_map.items(), [('https://src/v1/groups/a', 'https://dst/v1/groups/x')])
+
+
+class ContainsHrefsTest(TestCase):
+    def test_get_base_url(self):
+        self.assertEqual(get_base_url('https://api.stormpath.com/v1/accounts/a'), 'https://api.stormpath.com/v1')
+
+    def test_contains_hrefs(self):
+        base_url = 'https://api.stormpath.com/v1'
+
+        self.assertTrue(contains_hrefs({'a': {'b': 'https://api.stormpath.com/v1/groups/c'}}, base_url))
+        self.assertTrue(contains_hrefs({'https://api.stormpath.com/v1/groups/c': True}, base_url))
+        self.assertFalse(contains_hrefs({'href': 'https://api.stormpath.com/v1/accounts/a/customData', 'a': 1}, base_url))
+
+
+class SubstituteHrefsTest(TestCase):
+    def setUp(self):
+        self.hrefs = {
+            'https://src/v1/accounts/a': 'https://dst/v1/accounts/x',
+            'https://src/v1/groups/b': None,
+        }
+
+    def test_substitutes_nested(self):
+        value = {
+            'https://src/v1/accounts/a': 1,
+            'friends': [u'https://src/v1/accounts/a', 'https://src/v1/groups/b'],
+            'profile': {'note': 'See https://src/v1/accounts/a.'},
+        }
+
+        self.assertEqual(substitute_hrefs(value, self.hrefs), {
+            'https://dst/v1/accounts/x': 1,
+            'friends': ['https://dst/v1/accounts/x', 'https://src/v1/groups/b'],
+            'profile': {'note': 'See https://dst/v1/accounts/x.'},
+        })
+
+    def test_returns_unchanged_values_as_is(self):
+        value = {'friends': ['https://src/v1/groups/b', 'text', 1, None]}
+        self.assertTrue(substitute_hrefs(value, self.hrefs) is value)
+
+
+class MappingWriterTest(TestCase):
+    def setUp(self):
+        fd, self.path = mkstemp()
+        close(fd)
+
+    def tearDown(self):
+        remove(self.path)
+
+    def read(self):
+        with open(self.path, 'rb') as csvfile:
+            return list(reader(csvfile))
+
+    def test_writes_in_batches(self):
+        writer = MappingWriter(self.path, batch_size=2)
+        writer.write('src/a', 'dst/a')
+        self.assertEqual(writer.written, 0)
+
+        writer.write('src/b', None)
+        self.assertEqual(self.read(), [['original_href', 'migrated_href'], ['src/a', 'dst/a'], ['src/b', '']])
+
+        writer.write('src/c', 'dst/c')
+        writer.close()
+        self.assertEqual(writer.written, 3)
+        self.assertEqual(self.read()[-1], ['src/c', 'dst/c'])
+
+    def test_sorts_and_dedupes(self):
+        writer = MappingWriter(self.path, batch_size=1, sort=True)
+
+        for old_href, new_href in [('src/c', 'dst/c'), ('src/a', ''), ('src/b', 'dst/b'), ('src/a', 'dst/a')]:
+            writer.write(old_href, new_href)
+
+        writer.close()
+
+        self.assertEqual(self.read(), [
+            ['original_href', 'migrated_href'],
+            ['src/a', 'dst/a'],
+            ['src/b', 'dst/b'],
+            ['src/c', 'dst/c'],
+        ])
+
+    def test_sorts_across_chunks(self):
+        writer = MappingWriter(self.path)
+
+        for i in reversed(range(10)):
+            writer.write('src/{}'.format(i), 'dst/{}'.format(i))
+        writer.write('src/5', 'dst/new')
+        writer.close()
+
+        sort_mappings(self.path, chunk_size=3)
+        rows = self.read()[1:]
+
+        self.assertEqual([row[0] for row in rows], ['src/{}'.format(i) for i in range(10)])
+        self.assertEqual(rows[5], ['src/5', 'dst/new'])
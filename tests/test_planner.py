@@ -0,0 +1,293 @@
+"""Our planner tests."""
+
+
+from unittest import TestCase
+
+from migrate.migrators import AccountMigrator, ApplicationAccountStoreMappingMigrator, ApplicationMigrator, DirectoryMigrator, DirectoryWorkflowMigrator, GroupMembershipMigrator, GroupMigrator, OrganizationMigrator
+from migrate.planner import LOOKUPS, Plan, TenantPlanner, WRITES
+from migrate.retry import policy
+from migrate.snapshot import SnapshotResource
+
+from fakes import Directory, FakeCollection, FakeResource
+
+
+BASE_URL = 'https://api.stormpath.com/v1'
+
+
+class FakeReader(object):
+    def __init__(self, directories, groups, accounts, memberships):
+        self.directories_ = directories
+        self.groups_ = groups
+        self.accounts_ = accounts
+        self.memberships_ = memberships
+        self.pages = {'directories': 1, 'accounts': 2}
+
+    def directories(self, created_since=None):
+        if created_since:
+            return [directory for directory in self.directories_ if directory.created_at >= created_since]
+
+        return self.directories_
+
+    def groups(self, directory):
+        return self.groups_
+
+    def accounts(self, directory):
+        return self.accounts_
+
+    def group_memberships(self, account):
+        return self.memberships_.get(account.username, [])
+
+    def organizations(self):
+        return []
+
+    def applications(self):
+        return [FakeResource(name='Stormpath')]
+
+    def account_store_mappings(self, owner):
+        return []
+
+
+class Stub(object):
+    """
+    A destination resource: any attribute (or item) it doesn't have is
+    another Stub, and saving it does nothing.
+    """
+    name = u'stub'
+    username = u'stub'
+    writable_attrs = []
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        value = Stub()
+        setattr(self, name, value)
+        return value
+
+    def __getitem__(self, key):
+        return self
+
+    def __setitem__(self, key, value):
+        pass
+
+    def save(self):
+        pass
+
+
+class CountingPolicy(object):
+    """
+    Stands in for the retry policy: it counts the migrators' searches
+    (lookups) and every other call (writes) without making any of them.
+    """
+    def __init__(self, found):
+        self.found = found
+        self.lookups = 0
+        self.writes = 0
+
+    def call(self, func, message):
+        if func.__name__ == 'search':
+            self.lookups += 1
+            return Stub() if self.found else None
+
+        self.writes += 1
+        return getattr(func, '__self__', None) or Stub()
+
+
+class PlanTest(TestCase):
+    def test_add(self):
+        plan = Plan()
+        plan.add('account', 'create')
+        plan.add('account', 'create')
+        plan.add('group', 'skip')
+
+        self.assertEqual(plan.counts[('account', 'create')], 2)
+        self.assertEqual(plan.counts[('group', 'skip')], 1)
+        self.assertEqual(plan.writes, 2 * WRITES['account'])
+
+    def test_skips_make_no_requests(self):
+        plan = Plan()
+        plan.add('directory', 'skip')
+
+        self.assertEqual(plan.reads, 0)
+        self.assertEqual(plan.writes, 0)
+
+    def test_estimate_time(self):
+        plan = Plan()
+        plan.source_reads = 20
+        plan.add('group_membership', 'create')
+
+        # 20 source reads at 10/s, then 1 lookup and 1 write at 2/s.
+        self.assertEqual(plan.estimate_time(read_rate=10, write_rate=2), 3.0)
+        self.assertEqual(plan.estimate_time(), 2.2)
+
+
+class TenantPlannerTest(TestCase):
+    def setUp(self):
+        existing_group = FakeResource(href='groups/b', name='admins')
+        existing_account = FakeResource(href='accounts/b', username='jdoe', email='jdoe@example.com', group_memberships=FakeCollection([FakeResource(group=existing_group)]))
+
+        self.dst = FakeResource(
+            directories=FakeCollection([Directory(name='users', groups=FakeCollection([existing_group]), accounts=FakeCollection([existing_account]))]),
+            applications=FakeCollection([]),
+            tenant=FakeResource(organizations=FakeCollection([])),
+        )
+
+        def account(username, provider_id, custom_data):
+            return FakeResource(href=BASE_URL + '/accounts/' + username, username=username, email=username + '@example.com', provider_data={'provider_id': provider_id}, custom_data=custom_data)
+
+        self.reader = FakeReader(
+            directories=[
+                FakeResource(href=BASE_URL + '/directories/a', name='users', provider={'provider_id': 'stormpath'}, custom_data={}, created_at='2010-01-01'),
+                FakeResource(href=BASE_URL + '/directories/b', name='Stormpath Administrators', created_at='2010-01-01'),
+            ],
+            groups=[
+                FakeResource(href=BASE_URL + '/groups/a', name='admins', custom_data={}),
+                FakeResource(href=BASE_URL + '/groups/c', name='staff', custom_data={'manager': BASE_URL + '/accounts/a'}),
+            ],
+            accounts=[
+                account('jdoe', 'stormpath', {}),
+                account('new', 'stormpath', {}),
+                account('ldap', 'ldap', {}),
+            ],
+            memberships={
+                'jdoe': [FakeResource(group=FakeResource(name='admins')), FakeResource(group=FakeResource(name='staff'))],
+            },
+        )
+
+    def test_build(self):
+        plan = TenantPlanner(self.dst, self.reader).build()
+
+        self.assertEqual(plan.counts[('directory', 'update')], 1)
+        self.assertEqual(plan.counts[('directory', 'skip')], 1)
+        self.assertEqual(plan.counts[('group', 'update')], 1)
+        self.assertEqual(plan.counts[('group', 'create')], 1)
+        self.assertEqual(plan.counts[('account', 'update')], 1)
+        self.assertEqual(plan.counts[('account', 'create')], 1)
+        self.assertEqual(plan.counts[('account', 'skip')], 1)
+        self.assertEqual(plan.counts[('group_membership', 'skip')], 1)
+        self.assertEqual(plan.counts[('group_membership', 'create')], 1)
+        self.assertEqual(plan.counts[('custom_data', 'update')], 1)
+        self.assertEqual(plan.counts[('application', 'skip')], 1)
+        self.assertEqual(plan.source_reads, 3)
+
+    def test_build_skips_finished_work(self):
+        plan = TenantPlanner(self.dst, self.reader, finished=lambda phase, resource: phase == 'account').build()
+
+        self.assertEqual(plan.counts[('account', 'skip')], 3)
+        self.assertEqual(plan.counts[('group_membership', 'create')], 0)
+
+    def test_build_from_date_looks_up_existing_directories(self):
+        full = TenantPlanner(self.dst, self.reader).build()
+        delta = TenantPlanner(self.dst, self.reader, from_date='2010-01-03').build()
+
+        # The existing Directory is only looked up, not copied.
+        self.assertEqual(delta.counts[('directory', 'update')], 0)
+        self.assertEqual(delta.counts[('directory', 'skip')], 2)
+        self.assertEqual(delta.counts[('account', 'create')], 1)
+        self.assertEqual(delta.writes, full.writes - WRITES['directory'])
+
+        # Rather than indexing the destination Accounts (one page), each
+        # Account is searched for by username, and then by email if that
+        # finds nothing: once for jdoe, and twice each for new and ldap.
+        self.assertEqual(delta.destination_reads, full.destination_reads - 1 + 5)
+        self.assertEqual(self.dst.directories[0].accounts.searches, 5)
+
+    def test_build_from_date_never_indexes_accounts(self):
+        self.dst.directories[0].accounts.query = None
+        plan = TenantPlanner(self.dst, self.reader, from_date='2010-01-03').build()
+
+        self.assertEqual(plan.counts[('account', 'update')], 1)
+        self.assertEqual(plan.counts[('account', 'create')], 1)
+
+    def test_build_mirror_directories(self):
+        self.reader.directories_[0].provider = {'provider_id': 'ldap'}
+        plan = TenantPlanner(self.dst, self.reader).build()
+
+        self.assertEqual(plan.counts[('directory', 'update')], 0)
+        self.assertEqual(plan.counts[('mirror_directory', 'update')], 1)
+
+    def test_build_from_date_copies_missing_directories(self):
+        self.dst.directories = FakeCollection([])
+        plan = TenantPlanner(self.dst, self.reader, from_date='2010-01-03').build()
+
+        self.assertEqual(plan.counts[('directory', 'create')], 1)
+
+
+class RequestCountTest(TestCase):
+    """
+    The planner's per-resource request counts are estimates, but they must
+    match what the migrators actually do.
+    """
+    def count(self, found, *migrators):
+        counter = CountingPolicy(found)
+        policy.call = counter.call
+
+        try:
+            for migrator in migrators:
+                migrator().migrate()
+        finally:
+            del policy.call
+
+        return counter.lookups, counter.writes
+
+    def assertCounts(self, type, *migrators):
+        for found in [False, True]:
+            self.assertEqual(self.count(found, *migrators), (LOOKUPS[type], WRITES[type]))
+
+    def test_directory(self):
+        directory = FakeResource(name=u'users', description=u'', status='ENABLED', provider={'provider_id': 'stormpath'}, custom_data={}, account_creation_policy=Stub(), password_policy=Stub())
+
+        self.assertCounts('directory',
+            lambda: DirectoryMigrator(destination_client=Stub(), source_directory=directory),
+            lambda: DirectoryWorkflowMigrator(destination_directory=Stub(), source_directory=directory),
+        )
+
+    def test_mirror_directory(self):
+        # Mirror Directories have no Strength or Workflows of their own to
+        # copy.
+        directory = FakeResource(name=u'ldap', description=u'', status='ENABLED', provider=SnapshotResource({'provider_id': 'ldap', 'agent': {'config': {'account_config': {}, 'group_config': {}}}}), custom_data={})
+        self.assertCounts('mirror_directory', lambda: DirectoryMigrator(destination_client=Stub(), source_directory=directory))
+
+    def test_saml_directory(self):
+        directory = FakeResource(name=u'saml', description=u'', status='ENABLED', provider=SnapshotResource({'provider_id': 'saml', 'service_provider_metadata': {}}), custom_data={}, account_creation_policy=Stub(), password_policy=Stub())
+
+        self.assertCounts('directory',
+            lambda: DirectoryMigrator(destination_client=Stub(), source_directory=directory),
+            lambda: DirectoryWorkflowMigrator(destination_directory=Stub(), source_directory=directory),
+        )
+
+    def test_group(self):
+        group = FakeResource(name=u'admins', description=u'', status='ENABLED', custom_data={})
+        self.assertCounts('group', lambda: GroupMigrator(destination_directory=Stub(), source_group=group))
+
+    def test_account(self):
+        account = FakeResource(username=u'jdoe', email=u'jdoe@example.com', given_name=u'J', middle_name=None, surname=u'Doe', status='ENABLED', provider_data={'provider_id': 'stormpath'}, custom_data={})
+
+        for found in [False, True]:
+            index = FakeResource(get=lambda **kwargs: Stub() if found else None, add=lambda account: None)
+            migrator = lambda: AccountMigrator(destination_directory=Stub(), source_account=account, source_password='hash', account_index=index, expanded=True)
+
+            self.assertEqual(self.count(found, migrator), (LOOKUPS['account'], WRITES['account']))
+
+    def test_group_membership(self):
+        membership = FakeResource(account=FakeResource(username=u'jdoe', directory=FakeResource(name=u'users')), group=FakeResource(name=u'admins', directory=FakeResource(href='directories/a', name=u'users')))
+        cache = FakeResource(fetch=lambda key, load: Stub())
+        index = FakeResource(get=lambda **kwargs: Stub())
+
+        # Directory and Group lookups are shared through the cache.
+        lookups, writes = self.count(True, lambda: GroupMembershipMigrator(destination_client=Stub(), source_group_membership=membership, account_index=index, cache=cache, existing_memberships={}))
+        self.assertEqual(writes, WRITES['group_membership'])
+
+    def test_organization(self):
+        organization = FakeResource(name=u'acme', name_key='acme', description=u'', status='ENABLED', custom_data={})
+        self.assertCounts('organization', lambda: OrganizationMigrator(destination_client=Stub(), source_organization=organization))
+
+    def test_application(self):
+        application = FakeResource(name=u'app', description=u'', status='ENABLED', custom_data={}, oauth_policy=FakeResource(access_token_ttl='PT1H', refresh_token_ttl='P1D'))
+        self.assertCounts('application', lambda: ApplicationMigrator(destination_client=Stub(), source_application=application))
+
+    def test_account_store_mapping(self):
+        mapping = FakeResource(account_store=Directory(name=u'users'), list_index=0, is_default_account_store=True, is_default_group_store=False)
+        lookups, writes = self.count(True, lambda: ApplicationAccountStoreMappingMigrator(destination_application=Stub(), source_account_store_mapping=mapping, existing_mappings={}))
+
+        self.assertEqual((lookups, writes), (LOOKUPS['account_store_mapping'], WRITES['account_store_mapping']))
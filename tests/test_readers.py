@@ -0,0 +1,100 @@
+"""Our reader tests."""
+
+
+from unittest import TestCase
+
+from stormpath.error import Error as StormpathError
+
+from migrate import readers
+from migrate.readers import SourceReader
+from migrate.retry import RetryPolicy
+
+from fakes import FakeCollection, FakeResource
+
+
+class InterruptedCollection(FakeCollection):
+    """
+    A FakeCollection whose first walk fails (with a 503) after `after`
+    resources.
+    """
+    def __init__(self, items, after):
+        super(InterruptedCollection, self).__init__(items)
+        self.after = after
+
+    def query(self, **kwargs):
+        self.params = kwargs
+        after, self.after = self.after, None
+
+        return self.interrupted(after) if after is not None else iter(self[kwargs.get('offset', 0):])
+
+    def interrupted(self, after):
+        for item in self[:after]:
+            yield item
+
+        raise StormpathError({'status': 503, 'message': 'Unavailable.'})
+
+
+class SourceReaderTest(TestCase):
+    def setUp(self):
+        self.directory = FakeResource(accounts=FakeCollection(), groups=FakeCollection())
+        self.client = FakeResource(directories=FakeCollection(), applications=FakeCollection())
+
+    def test_expands_linked_resources(self):
+        reader = SourceReader(self.client)
+        list(reader.accounts(self.directory))
+
+        self.assertEqual(self.directory.accounts.params, {'expand': 'customData,providerData'})
+
+    def test_filters_by_date(self):
+        reader = SourceReader(self.client, from_date='2010-01-03')
+        list(reader.groups(self.directory))
+        list(reader.applications())
+
+        self.assertEqual(self.directory.groups.params, {'expand': 'customData', 'createdAt': '[2010-01-03,]'})
+        self.assertEqual(self.client.applications.params, {'expand': 'customData', 'createdAt': '[2010-01-03,]'})
+
+    def test_does_not_filter_directories_by_default(self):
+        reader = SourceReader(self.client, from_date='2010-01-03')
+
+        list(reader.directories())
+        self.assertEqual(self.client.directories.params, {'expand': 'customData'})
+
+        list(reader.directories(created_since='2010-01-03'))
+        self.assertEqual(self.client.directories.params, {'expand': 'customData', 'createdAt': '[2010-01-03,]'})
+
+    def test_page_size(self):
+        reader = SourceReader(self.client, page_size=500)
+        self.directory.accounts.extend(range(150))
+
+        self.assertEqual(len(list(reader.accounts(self.directory))), 150)
+        self.assertEqual(self.directory.accounts.params['limit'], 100)
+        self.assertEqual(reader.pages['accounts'], 2)
+
+    def test_estimates_pages(self):
+        reader = SourceReader(self.client, page_size=50)
+        self.directory.accounts.extend(range(100))
+
+        list(reader.accounts(self.directory))
+        list(reader.groups(self.directory))
+
+        self.assertEqual(reader.pages['accounts'], 2)
+        self.assertEqual(reader.pages['groups'], 1)
+
+    def test_unfiltered_shares_page_counts(self):
+        reader = SourceReader(self.client, from_date='2010-01-03')
+        unfiltered = reader.unfiltered()
+        list(unfiltered.groups(self.directory))
+
+        self.assertEqual(self.directory.groups.params, {'expand': 'customData'})
+        self.assertEqual(reader.pages['groups'], 1)
+
+    def test_resumes_interrupted_walks(self):
+        original = readers.policy
+        readers.policy = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0)
+        self.addCleanup(setattr, readers, 'policy', original)
+
+        self.directory.accounts = InterruptedCollection(range(5), after=3)
+        reader = SourceReader(self.client)
+
+        self.assertEqual(list(reader.accounts(self.directory)), range(5))
+        self.assertEqual(self.directory.accounts.params, {'expand': 'customData,providerData', 'offset': 3})
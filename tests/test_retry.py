@@ -0,0 +1,113 @@
+"""Our retry policy tests."""
+
+
+from unittest import TestCase
+
+from stormpath.error import Error as StormpathError
+
+from migrate.retry import RetryError, RetryPolicy, get_retry_after, responses
+
+
+def fail(status, times):
+    """Build a function that fails with the given status a number of times."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= times:
+            raise StormpathError({'status': status, 'message': 'Failed.'})
+
+        return 'ok'
+
+    return func, calls
+
+
+def interrupt(items, failures):
+    """Build a query function whose walks fail part way through a number of times."""
+    offsets = []
+
+    def query(offset):
+        offsets.append(offset)
+
+        for item in items[offset:offset + 2]:
+            yield item
+
+        if len(offsets) <= failures:
+            raise StormpathError({'status': 503, 'message': 'Failed.'})
+
+        for item in items[offset + 2:]:
+            yield item
+
+    return query, offsets
+
+
+class RetryPolicyTest(TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+    def tearDown(self):
+        responses.retry_after = None
+
+    def test_retries_throttling(self):
+        func, calls = fail(429, 2)
+
+        self.assertEqual(self.policy.call(func, 'Failed to test'), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.policy.retries, 2)
+
+    def test_gives_up_after_max_attempts(self):
+        func, calls = fail(503, 5)
+
+        with self.assertRaises(RetryError):
+            self.policy.call(func, 'Failed to test')
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(self.policy.dead_letters), 1)
+
+    def test_dead_letters_client_errors(self):
+        func, calls = fail(400, 1)
+
+        with self.assertRaises(RetryError):
+            self.policy.call(func, 'Failed to test')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.policy.dead_letters[0][0], 'Failed to test')
+
+    def test_delay_is_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        err = StormpathError({'status': 500, 'message': 'Failed.'})
+
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.get_delay(err, attempt) <= 5)
+
+    def test_honours_retry_after(self):
+        err = StormpathError({'status': 429, 'message': 'Failed.'})
+        responses.retry_after = '7'
+
+        self.assertEqual(get_retry_after(err), 7.0)
+        self.assertEqual(self.policy.get_delay(err, 1), 7.0)
+
+    def test_ignores_retry_after_for_other_errors(self):
+        err = StormpathError({'status': 500, 'message': 'Failed.'})
+        responses.retry_after = '7'
+
+        self.assertEqual(get_retry_after(err), None)
+
+    def test_walk_resumes_where_it_failed(self):
+        query, offsets = interrupt(range(5), 2)
+
+        self.assertEqual(list(self.policy.walk(query, 'Failed to walk')), range(5))
+        self.assertEqual(offsets, [0, 2, 4])
+        self.assertEqual(self.policy.retries, 2)
+
+    def test_walk_gives_up(self):
+        query, offsets = interrupt(range(5), 5)
+        items = []
+
+        with self.assertRaises(RetryError):
+            for item in self.policy.walk(query, 'Failed to walk'):
+                items.append(item)
+
+        # Progress resets the attempts, so only consecutive failures count.
+        self.assertEqual(items, range(5))
+        self.assertEqual(offsets, [0, 2, 4, 5, 5])
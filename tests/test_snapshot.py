@@ -0,0 +1,129 @@
+"""Our snapshot tests."""
+
+
+from gzip import open as gzip_open
+from json import load, loads
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from migrate.snapshot import MANIFEST_FILE, SnapshotReader, SnapshotWriter
+
+
+class SnapshotWriterTest(TestCase):
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def test_writes_chunks_and_manifest(self):
+        snapshot = SnapshotWriter(self.path, base_url='https://api.stormpath.com/v1', chunk_size=2)
+        snapshot.write('directories', {'href': 'directories/a'})
+
+        for i in range(3):
+            snapshot.write('accounts', {'href': 'accounts/{}'.format(i), 'directory': 'directories/a'}, 'directories/a')
+
+        snapshot.write('accounts', {'href': 'accounts/3', 'directory': 'directories/b'}, 'directories/b')
+        snapshot.close()
+
+        with open(join(self.path, MANIFEST_FILE)) as f:
+            manifest = load(f)
+
+        self.assertEqual(manifest['base_url'], 'https://api.stormpath.com/v1')
+        self.assertEqual(manifest['collections']['groups'], [])
+        self.assertEqual(manifest['collections']['accounts'], [
+            {'file': 'accounts-0000.ndjson.gz', 'count': 2, 'parents': ['directories/a']},
+            {'file': 'accounts-0001.ndjson.gz', 'count': 2, 'parents': ['directories/a', 'directories/b']},
+        ])
+
+        with gzip_open(join(self.path, 'accounts-0001.ndjson.gz')) as f:
+            self.assertEqual([loads(line)['href'] for line in f], ['accounts/2', 'accounts/3'])
+
+    def test_clears_existing_snapshot(self):
+        snapshot = SnapshotWriter(self.path, chunk_size=1)
+        snapshot.write('accounts', {'href': 'accounts/a'})
+        snapshot.write('accounts', {'href': 'accounts/b'})
+        snapshot.close()
+
+        # Re-exporting starts from scratch: until it's finished, there's no
+        # manifest (so nothing can read a mix of old and new chunks).
+        SnapshotWriter(self.path, chunk_size=1)
+
+        self.assertFalse(exists(join(self.path, MANIFEST_FILE)))
+        self.assertFalse(exists(join(self.path, 'accounts-0001.ndjson.gz')))
+
+
+class SnapshotReaderTest(TestCase):
+    def setUp(self):
+        self.path = mkdtemp()
+
+        snapshot = SnapshotWriter(self.path, chunk_size=1)
+        snapshot.write('directories', {'href': 'directories/a', 'name': 'a', 'created_at': '2015-01-01T00:00:00', 'provider': {'provider_id': 'stormpath'}})
+        snapshot.write('directories', {'href': 'directories/b', 'name': 'b', 'created_at': '2016-06-01T00:00:00', 'provider': {'provider_id': 'stormpath'}})
+        snapshot.write('groups', {'href': 'groups/a', 'directory': 'directories/a', 'name': 'admins', 'created_at': '2015-01-01T00:00:00'}, 'directories/a')
+        snapshot.write('accounts', {
+            'href': 'accounts/a',
+            'directory': 'directories/a',
+            'username': 'a',
+            'created_at': '2016-06-01T00:00:00',
+            'custom_data': {'favorite': {'color': 'blue'}},
+            'group_memberships': [{'href': 'groupMemberships/a', 'group': 'groups/a'}],
+        }, 'directories/a')
+        snapshot.write('accounts', {'href': 'accounts/b', 'directory': 'directories/b', 'username': 'b', 'created_at': '2015-01-01T00:00:00', 'group_memberships': []}, 'directories/b')
+        snapshot.write('applications', {
+            'href': 'applications/a',
+            'name': 'app',
+            'created_at': '2015-01-01T00:00:00',
+            'account_store_mappings': [{'href': 'accountStoreMappings/a', 'account_store': {'href': 'groups/a', 'type': 'Group', 'name': 'admins'}, 'list_index': 0}],
+        })
+        snapshot.close()
+
+        self.reader = SnapshotReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        rmtree(self.path)
+
+    def test_requires_manifest(self):
+        path = mkdtemp()
+
+        with self.assertRaises(ValueError):
+            SnapshotReader(path)
+
+        rmtree(path)
+
+    def test_walks_like_a_source_reader(self):
+        directory = list(self.reader.directories())[0]
+        account = list(self.reader.accounts(directory))[0]
+
+        self.assertEqual(dict(directory.provider).get('provider_id'), 'stormpath')
+        self.assertEqual([group.name for group in self.reader.groups(directory)], ['admins'])
+        self.assertEqual(account.username, 'a')
+        self.assertEqual(account.custom_data.favorite.color, 'blue')
+        self.assertEqual(account.directory.name, 'a')
+        self.assertEqual(self.reader.records['accounts'], 1)
+
+    def test_resolves_links(self):
+        directory = self.reader.get_directory('directories/a')
+        account = list(self.reader.accounts(directory))[0]
+        membership = list(self.reader.group_memberships(account))[0]
+
+        self.assertTrue(membership.account is account)
+        self.assertEqual(membership.group.name, 'admins')
+        self.assertEqual(membership.group.directory.name, 'a')
+
+        application = list(self.reader.applications())[0]
+        mapping = list(self.reader.account_store_mappings(application))[0]
+
+        self.assertEqual(mapping.account_store.__class__.__name__, 'Group')
+        self.assertEqual(mapping.list_index, 0)
+
+    def test_filters_by_date(self):
+        reader = SnapshotReader(self.path, from_date='2016-01-01')
+
+        self.assertEqual([d.name for d in reader.directories(created_since='2016-01-01')], ['b'])
+        self.assertEqual([a.username for d in reader.directories() for a in reader.accounts(d)], ['a'])
+        self.assertEqual(list(reader.groups()), [])
+        self.assertEqual(len(list(reader.unfiltered().groups())), 1)
@@ -0,0 +1,100 @@
+"""Our transport tests."""
+
+
+from time import time
+from unittest import TestCase
+
+from requests import Session
+
+from migrate.retry import responses
+from migrate.transport import ConnectionPool, TokenBucket, read_only, throttle, track_retry_after
+
+from fakes import FakeResource
+
+
+class TokenBucketTest(TestCase):
+    def test_allows_bursts(self):
+        bucket = TokenBucket(rate=10, burst=5)
+
+        for _ in range(5):
+            self.assertEqual(bucket.acquire(), 0.0)
+
+    def test_limits_rate(self):
+        bucket = TokenBucket(rate=50, burst=1)
+
+        start = time()
+        for _ in range(11):
+            bucket.acquire()
+
+        self.assertTrue(time() - start >= 0.19)
+        self.assertEqual(bucket.requests, 11)
+
+
+class ThrottleTest(TestCase):
+    def test_throttles_requests(self):
+        executor = FakeResource(request=lambda method, url: (method, url))
+        client = FakeResource(data_store=FakeResource(executor=executor))
+        bucket = TokenBucket(rate=100)
+
+        throttle(client, bucket)
+
+        self.assertEqual(executor.request('GET', '/tenants/current'), ('GET', '/tenants/current'))
+        self.assertEqual(bucket.requests, 1)
+
+
+class ReadOnlyTest(TestCase):
+    def test_refuses_writes(self):
+        executor = FakeResource(request=lambda method, url: (method, url))
+        client = FakeResource(data_store=FakeResource(executor=executor))
+
+        read_only(client)
+
+        self.assertEqual(executor.request('GET', '/tenants/current'), ('GET', '/tenants/current'))
+        with self.assertRaises(RuntimeError):
+            executor.request('POST', '/accounts')
+
+
+class ConnectionPoolTest(TestCase):
+    def make_client(self):
+        executor = FakeResource(session=Session())
+        return FakeResource(data_store=FakeResource(executor=executor))
+
+    def test_pool_per_client(self):
+        pool = ConnectionPool(max_connections=4)
+        src = pool.mount(self.make_client())
+        dst = pool.mount(self.make_client())
+
+        src_adapter = src.data_store.executor.session.get_adapter('https://api.stormpath.com/v1')
+        dst_adapter = dst.data_store.executor.session.get_adapter('https://api.stormpath.com/v1')
+
+        self.assertEqual(pool.adapters, [src_adapter, dst_adapter])
+        self.assertEqual(src_adapter._pool_maxsize, 4)
+        self.assertTrue(src_adapter._pool_block)
+
+    def test_options(self):
+        pool = ConnectionPool(keep_alive=False, timeout=5, compression=False)
+        client = self.make_client()
+        session = client.data_store.executor.session
+        calls = []
+
+        session.request = lambda *args, **kwargs: calls.append(kwargs)
+        pool.mount(client)
+        session.request('GET', 'https://api.stormpath.com/v1/tenants/current')
+
+        self.assertEqual(session.headers['Connection'], 'close')
+        self.assertEqual(session.headers['Accept-Encoding'], 'identity')
+        self.assertEqual(calls, [{'timeout': 5}])
+
+
+class TrackRetryAfterTest(TestCase):
+    def test_records_retry_after(self):
+        session = Session()
+        client = FakeResource(data_store=FakeResource(executor=FakeResource(session=session)))
+
+        track_retry_after(client)
+        session.hooks['response'][0](FakeResource(headers={'Retry-After': '3'}))
+
+        self.assertEqual(responses.retry_after, '3')
+
+        session.hooks['response'][0](FakeResource(headers={}))
+        self.assertEqual(responses.retry_after, None)
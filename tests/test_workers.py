@@ -0,0 +1,59 @@
+"""Our worker pool tests."""
+
+
+from threading import Event, Thread, current_thread
+from time import sleep
+from unittest import TestCase
+
+from migrate.workers import WorkerPool
+
+
+class WorkerPoolTest(TestCase):
+    def test_single_worker_runs_inline(self):
+        threads = []
+
+        with WorkerPool(1) as pool:
+            pool.submit(lambda: threads.append(current_thread()))
+
+        self.assertEqual(threads, [current_thread()])
+
+    def test_runs_all_work(self):
+        results = []
+
+        with WorkerPool(4) as pool:
+            for i in range(100):
+                pool.submit(results.append, i)
+
+        self.assertEqual(sorted(results), list(range(100)))
+
+    def test_submit_blocks_when_backlog_is_full(self):
+        release = Event()
+        submitted = []
+
+        pool = WorkerPool(2, backlog=2)
+
+        def produce():
+            for i in range(10):
+                pool.submit(release.wait)
+                submitted.append(i)
+
+        producer = Thread(target=produce)
+        producer.start()
+        sleep(0.2)
+
+        # Two items are being worked on, and two more are queued.
+        self.assertEqual(len(submitted), 4)
+
+        release.set()
+        producer.join()
+        pool.join()
+
+        self.assertEqual(len(submitted), 10)
+
+    def test_raises_worker_errors(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            with WorkerPool(2) as pool:
+                pool.submit(fail)